@@ -0,0 +1,65 @@
+"""add conversations summary table
+
+Revision ID: 3f1a9c2d7b10
+Revises:
+Create Date: 2026-10-18 10:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1a9c2d7b10'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'conversations',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('partner_id', sa.Integer(), nullable=False),
+        sa.Column('last_message_id', sa.Integer(), nullable=False),
+        sa.Column('last_message_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('unread_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.ForeignKeyConstraint(['partner_id'], ['users.id']),
+        sa.ForeignKeyConstraint(['last_message_id'], ['messages.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'partner_id', name='uq_conversations_user_partner'),
+    )
+    op.create_index(op.f('ix_conversations_id'), 'conversations', ['id'], unique=False)
+    op.create_index('ix_conversations_user_last_message_at', 'conversations', ['user_id', 'last_message_at'], unique=False)
+
+    # backfill from existing messages
+    op.execute("""
+        INSERT INTO conversations (user_id, partner_id, last_message_id, last_message_at, unread_count)
+        SELECT p.user_id, p.partner_id, m.id, m.timestamp, p.unread_count
+        FROM (
+            SELECT d.user_id, d.partner_id, MAX(d.id) AS last_id, SUM(d.unread) AS unread_count
+            FROM (
+                SELECT sender_id AS user_id, receiver_id AS partner_id, id, 0 AS unread
+                FROM messages
+                UNION ALL
+                SELECT receiver_id AS user_id, sender_id AS partner_id, id,
+                    CASE WHEN is_read THEN 0 ELSE 1 END AS unread
+                FROM messages
+                WHERE receiver_id <> sender_id
+            ) d
+            GROUP BY d.user_id, d.partner_id
+        ) p
+        JOIN messages m ON m.id = p.last_id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_conversations_user_last_message_at', table_name='conversations')
+    op.drop_index(op.f('ix_conversations_id'), table_name='conversations')
+    op.drop_table('conversations')
@@ -0,0 +1,42 @@
+"""add messages.conversation_key with composite history index
+
+Revision ID: 8b2e4f6a1c3d
+Revises: 3f1a9c2d7b10
+Create Date: 2026-10-18 10:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2e4f6a1c3d'
+down_revision: Union[str, None] = '3f1a9c2d7b10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('messages', sa.Column('conversation_key', sa.String(), nullable=True))
+    op.execute("""
+        UPDATE messages SET conversation_key = CASE
+            WHEN sender_id <= receiver_id
+                THEN CAST(sender_id AS VARCHAR) || ':' || CAST(receiver_id AS VARCHAR)
+            ELSE CAST(receiver_id AS VARCHAR) || ':' || CAST(sender_id AS VARCHAR)
+        END
+    """)
+    op.create_index(
+        'ix_messages_conversation_key_timestamp_id',
+        'messages',
+        ['conversation_key', 'timestamp', 'id'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_messages_conversation_key_timestamp_id', table_name='messages')
+    op.drop_column('messages', 'conversation_key')
@@ -0,0 +1,82 @@
+"""add groups, group_members, group_messages and per-member payloads
+
+Revision ID: a7c9e1f3b5d8
+Revises: f2b4d6e8a0c1
+Create Date: 2026-10-18 17:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c9e1f3b5d8'
+down_revision: Union[str, None] = 'f2b4d6e8a0c1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'groups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('created_by', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['created_by'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_groups_id'), 'groups', ['id'], unique=False)
+    op.create_table(
+        'group_members',
+        sa.Column('group_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('role', sa.String(), nullable=False),
+        sa.Column('joined_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['group_id'], ['groups.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('group_id', 'user_id'),
+    )
+    op.create_index(op.f('ix_group_members_user_id'), 'group_members', ['user_id'], unique=False)
+    op.create_table(
+        'group_messages',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('group_id', sa.Integer(), nullable=False),
+        sa.Column('sender_id', sa.Integer(), nullable=False),
+        sa.Column('message_type', sa.String(), nullable=True),
+        sa.Column('timestamp', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['group_id'], ['groups.id']),
+        sa.ForeignKeyConstraint(['sender_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_group_messages_id'), 'group_messages', ['id'], unique=False)
+    op.create_index(
+        'ix_group_messages_group_id_timestamp_id',
+        'group_messages',
+        ['group_id', 'timestamp', 'id'],
+        unique=False,
+    )
+    op.create_table(
+        'group_message_payloads',
+        sa.Column('message_id', sa.Integer(), nullable=False),
+        sa.Column('recipient_id', sa.Integer(), nullable=False),
+        sa.Column('content', sa.String(), nullable=False),
+        sa.ForeignKeyConstraint(['message_id'], ['group_messages.id']),
+        sa.ForeignKeyConstraint(['recipient_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('message_id', 'recipient_id'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('group_message_payloads')
+    op.drop_index('ix_group_messages_group_id_timestamp_id', table_name='group_messages')
+    op.drop_index(op.f('ix_group_messages_id'), table_name='group_messages')
+    op.drop_table('group_messages')
+    op.drop_index(op.f('ix_group_members_user_id'), table_name='group_members')
+    op.drop_table('group_members')
+    op.drop_index(op.f('ix_groups_id'), table_name='groups')
+    op.drop_table('groups')
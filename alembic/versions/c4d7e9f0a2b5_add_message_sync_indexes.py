@@ -0,0 +1,30 @@
+"""add sender/receiver (timestamp, id) indexes for reconnect sync
+
+Revision ID: c4d7e9f0a2b5
+Revises: 8b2e4f6a1c3d
+Create Date: 2026-10-18 10:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d7e9f0a2b5'
+down_revision: Union[str, None] = '8b2e4f6a1c3d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_messages_sender_id_timestamp_id', 'messages', ['sender_id', 'timestamp', 'id'], unique=False)
+    op.create_index('ix_messages_receiver_id_timestamp_id', 'messages', ['receiver_id', 'timestamp', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_messages_receiver_id_timestamp_id', table_name='messages')
+    op.drop_index('ix_messages_sender_id_timestamp_id', table_name='messages')
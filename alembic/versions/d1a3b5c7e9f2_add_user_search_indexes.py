@@ -0,0 +1,38 @@
+"""add user search indexes
+
+Revision ID: d1a3b5c7e9f2
+Revises: c4d7e9f0a2b5
+Create Date: 2026-10-18 10:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd1a3b5c7e9f2'
+down_revision: Union[str, None] = 'c4d7e9f0a2b5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        # other backends search through the in-memory prefix index
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # keyset order on (lower(user_name), id)
+    op.execute('CREATE INDEX ix_users_user_name_lower ON users (lower(user_name), id)')
+    # prefix and substring LIKE matches
+    op.execute('CREATE INDEX ix_users_user_name_trgm ON users USING gin (lower(user_name) gin_trgm_ops)')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('DROP INDEX IF EXISTS ix_users_user_name_trgm')
+    op.execute('DROP INDEX IF EXISTS ix_users_user_name_lower')
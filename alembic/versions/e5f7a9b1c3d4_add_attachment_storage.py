@@ -0,0 +1,43 @@
+"""add attachment storage columns and messages.has_attachment
+
+Revision ID: e5f7a9b1c3d4
+Revises: d1a3b5c7e9f2
+Create Date: 2026-10-18 14:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5f7a9b1c3d4'
+down_revision: Union[str, None] = 'd1a3b5c7e9f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('attachments', sa.Column('uploader_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=True))
+    op.add_column('attachments', sa.Column('storage_key', sa.String(), nullable=True))
+    op.add_column('attachments', sa.Column('size', sa.BigInteger(), nullable=True))
+    op.add_column('attachments', sa.Column('created_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index('ix_attachments_message_id', 'attachments', ['message_id'], unique=False)
+
+    op.add_column('messages', sa.Column('has_attachment', sa.Boolean(), server_default=sa.false(), nullable=False))
+    op.execute("""
+        UPDATE messages SET has_attachment = TRUE
+        WHERE id IN (SELECT message_id FROM attachments WHERE message_id IS NOT NULL)
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('messages', 'has_attachment')
+    op.drop_index('ix_attachments_message_id', table_name='attachments')
+    op.drop_column('attachments', 'created_at')
+    op.drop_column('attachments', 'size')
+    op.drop_column('attachments', 'storage_key')
+    op.drop_column('attachments', 'uploader_id')
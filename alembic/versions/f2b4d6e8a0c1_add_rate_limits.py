@@ -0,0 +1,34 @@
+"""add rate_limits for shared WebSocket token buckets
+
+Revision ID: f2b4d6e8a0c1
+Revises: e5f7a9b1c3d4
+Create Date: 2026-10-18 15:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b4d6e8a0c1'
+down_revision: Union[str, None] = 'e5f7a9b1c3d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'rate_limits',
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('tokens', sa.Float(), nullable=False),
+        sa.Column('updated_at', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('key'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('rate_limits')
@@ -0,0 +1,90 @@
+# Benchmark: draining an offline outbox one frame per message vs in batches.
+#
+#   python -m benchmarks.bulk_send --messages 500 --batch 100
+#
+# The same outbox is sent three ways against the real app: one WebSocket frame per
+# message (waiting for each echo, as clients do today), array frames of --batch
+# messages (waiting for each ack), and POST /chat/messages/bulk. The rate limiter is
+# off so only the write path is measured.
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks import harness
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--output")
+    return parser.parse_args()
+
+args = parse_args()
+harness.configure(CHAT_RATE_LIMIT=0, CHAT_SEND_BATCH_MAX=args.batch)
+
+import httpx
+from websockets.asyncio.client import connect
+
+def outbox(receiver_id: int, label: str) -> list[dict]:
+    return [
+        {
+            "client_id": f"{label}-{n}",
+            "receiverID": receiver_id,
+            "receiver_encrypted": harness.ciphertext(f"receiver-cipher-{n:08d}" * 8),
+            "sender_encrypted": harness.ciphertext(f"sender-cipher-{n:08d}" * 8),
+            "messageType": "text",
+        } for n in range(args.messages)
+    ]
+
+def chunks(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def summary(seconds: float, round_trips: int, sent: int) -> dict:
+    return {
+        "seconds": round(seconds, 3),
+        "round_trips": round_trips,
+        "sent": sent,
+        "messages_per_sec": round(sent / seconds, 1),
+    }
+
+async def main():
+    await harness.create_schema()
+    (sender_id, sender), (receiver_id, _) = await harness.seed_users(2)
+    token = harness.token_for(sender_id, sender)
+    report = {"environment": harness.environment(), "messages": args.messages, "batch": args.batch}
+
+    async with harness.serve() as base_url:
+        ws_url = base_url.replace("http", "ws", 1) + f"/chat/ws?token={token}"
+        async with connect(ws_url, max_queue=None) as ws:
+            started = time.perf_counter()
+            for item in outbox(receiver_id, "single"):
+                await ws.send(json.dumps(item))
+                await ws.recv()
+            report["single_frames"] = summary(time.perf_counter() - started, args.messages, args.messages)
+
+            sent = round_trips = 0
+            started = time.perf_counter()
+            for batch in chunks(outbox(receiver_id, "ws"), args.batch):
+                await ws.send(json.dumps(batch))
+                round_trips += 1
+                while (frame := json.loads(await ws.recv())).get("type") != "ack":
+                    pass
+                sent += sum(ack["status"] == "sent" for ack in frame["results"])
+            report["batched_frames"] = summary(time.perf_counter() - started, round_trips, sent)
+
+        async with httpx.AsyncClient(base_url=base_url, headers={"Authorization": f"Bearer {token}"}) as client:
+            sent = round_trips = 0
+            started = time.perf_counter()
+            for batch in chunks(outbox(receiver_id, "rest"), args.batch):
+                response = await client.post("/chat/messages/bulk", json=batch)
+                response.raise_for_status()
+                round_trips += 1
+                sent += sum(ack["status"] == "sent" for ack in response.json()["results"])
+            report["rest_bulk"] = summary(time.perf_counter() - started, round_trips, sent)
+
+    harness.write_report(report, args.output)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+# Benchmark: NDJSON export throughput and memory.
+#
+#   python -m benchmarks.export_stream --messages 200000
+#
+# Seeds one long conversation in a throwaway SQLite file, streams /chat/export over
+# a real HTTP connection and reports rows/sec plus how much the process's peak RSS
+# grew while streaming (it should stay roughly flat as --messages grows).
+import argparse
+import asyncio
+import resource
+import time
+
+from benchmarks import harness
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--output")
+    return parser.parse_args()
+
+args = parse_args()
+harness.configure()
+
+import httpx
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+async def main():
+    from database import engine
+    await harness.create_schema()
+    (alice_id, alice), (bob_id, _) = await harness.seed_users(2)
+    await harness.seed_history(alice_id, [bob_id], args.messages)
+
+    rss_before = peak_rss_mb()
+    rows = 0
+    body_bytes = 0
+    async with harness.serve() as base_url:
+        started = time.perf_counter()
+        async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+            async with client.stream(
+                "GET",
+                "/chat/export",
+                params={"partnerID": bob_id},
+                headers={"Authorization": f"Bearer {harness.token_for(alice_id, alice)}"},
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if line:
+                        rows += 1
+                        body_bytes += len(line) + 1
+        elapsed = time.perf_counter() - started
+    await engine.dispose()
+
+    harness.write_report({
+        "environment": harness.environment(),
+        "rows": rows,
+        "seconds": round(elapsed, 2),
+        "rows_per_sec": round(rows / elapsed, 1),
+        "megabytes_streamed": round(body_bytes / 1024 / 1024, 1),
+        "peak_rss_before_mb": round(rss_before, 1),
+        "peak_rss_growth_mb": round(peak_rss_mb() - rss_before, 1),
+    }, args.output)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+# Benchmark: group message fan-out latency against group size.
+#
+#   python -m benchmarks.group_fanout --sizes 10,50,200,500 --messages 20
+#
+# For each size, creates a group, connects every member over /chat/ws and has one
+# member send --messages group messages (one ciphertext per member, as clients do).
+# Latency is from the send until the last member has its frame; the report also
+# shows how many SQL statements each message cost, which should stay flat as the
+# group grows since membership is one query per message, not one per member.
+import argparse
+import asyncio
+import json
+import re
+import time
+
+from benchmarks import harness
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10,50,200,500")
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--payload-bytes", type=int, default=256)
+    parser.add_argument("--output")
+    return parser.parse_args()
+
+args = parse_args()
+sizes = [int(size) for size in args.sizes.split(",")]
+harness.configure(CHAT_RATE_LIMIT=0, GROUP_MAX_MEMBERS=max(sizes), CHAT_SEND_QUEUE_SIZE=100000)
+
+import httpx
+from websockets.asyncio.client import connect
+
+def sql_statements(metrics: str) -> float:
+    match = re.search(r"^db_statements_total (\S+)$", metrics, re.M)
+    return float(match.group(1)) if match else 0.0
+
+async def ready(ws):
+    await ws.send(json.dumps({"type": "ping"}))
+    while json.loads(await ws.recv()).get("type") != "pong":
+        pass
+
+async def run_size(base_url: str, users: list[tuple[int, str]]) -> dict:
+    sender = users[0]
+    member_ids = [user_id for user_id, _ in users]
+    headers = {"Authorization": f"Bearer {harness.token_for(*sender)}"}
+    async with httpx.AsyncClient(base_url=base_url, headers=headers) as client:
+        response = await client.post("/groups", json={"name": f"bench-{len(users)}", "memberIDs": member_ids})
+        response.raise_for_status()
+        group_id = response.json()["id"]
+
+        ws_url = base_url.replace("http", "ws", 1) + "/chat/ws?token="
+        sockets = await asyncio.gather(*(connect(ws_url + harness.token_for(*user), max_queue=None) for user in users))
+        # the server registers a socket after the handshake; a ping round trip means it is live
+        await asyncio.gather(*(ready(ws) for ws in sockets))
+        payload = "x" * args.payload_bytes
+        latencies = []
+        queries_before = sql_statements((await client.get("/metrics", headers=harness.metrics_headers())).text)
+        try:
+            for n in range(args.messages):
+                frame = json.dumps({
+                    "type": "group_message",
+                    "groupID": group_id,
+                    "payloads": {str(user_id): payload for user_id in member_ids},
+                })
+                started = time.perf_counter()
+                await sockets[0].send(frame)
+
+                async def receive(ws):
+                    while json.loads(await ws.recv()).get("type") != "group_message":
+                        pass
+                await asyncio.gather(*(receive(ws) for ws in sockets))
+                latencies.append(time.perf_counter() - started)
+        finally:
+            await asyncio.gather(*(ws.close() for ws in sockets))
+        queries = sql_statements((await client.get("/metrics", headers=harness.metrics_headers())).text) - queries_before
+
+    return {
+        "members": len(users),
+        "messages": args.messages,
+        **harness.latency_summary(latencies),
+        "per_member_us": round(harness.percentile(latencies, 50) / len(users) * 1e6, 1),
+        "sql_per_message": round(queries / args.messages, 1),
+    }
+
+async def main():
+    await harness.create_schema()
+    users = await harness.seed_users(max(sizes))
+    report = {"environment": harness.environment(), "payload_bytes": args.payload_bytes, "sizes": []}
+    async with harness.serve() as base_url:
+        for size in sizes:
+            report["sizes"].append(await run_size(base_url, users[:size]))
+    harness.write_report(report, args.output)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,127 @@
+# Shared setup for the offline benchmarks: a throwaway SQLite database, seeding
+# helpers, the real app under uvicorn on a free port, and JSON reports.
+#
+# configure() must run before anything imports `database` or `main`, since those
+# read their settings from the environment at import time.
+import base64
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+def configure(**env) -> str:
+    workdir = tempfile.mkdtemp(prefix="fluent-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{workdir}/bench.db"
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+    os.environ.setdefault("METRICS_TOKEN", "benchmark-metrics")
+    os.environ.setdefault("ATTACHMENT_STORAGE_DIR", os.path.join(workdir, "attachments"))
+    for name, value in env.items():
+        os.environ.setdefault(name, str(value))
+    return workdir
+
+async def create_schema():
+    from database import Base, engine
+    import models  # noqa: F401
+    engine.echo = False
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+async def seed_users(count: int, prefix: str = "user", password_hash: str = "x") -> list[tuple[int, str]]:
+    import models
+    from database import async_session
+    async with async_session() as db:
+        users = [
+            models.User(user_name=f"{prefix}{i}", email=f"{prefix}{i}@bench.local", password=password_hash, public_key=f"pk-{prefix}{i}")
+            for i in range(count)
+        ]
+        db.add_all(users)
+        await db.commit()
+        return [(u.id, u.user_name) for u in users]
+
+# `count` messages between `user_id` and its partners, round-robin, then the
+# conversations table rebuilt from them the way the backfill migration does
+async def seed_history(user_id: int, partner_ids: list[int], count: int, chunk: int = 5000):
+    from sqlalchemy import insert
+    import models
+    from database import async_session
+    from crud.ConversationCrud import rebuild_conversations
+    async with async_session() as db:
+        for start in range(0, count, chunk):
+            await db.execute(insert(models.Message), [
+                {
+                    "sender_id": user_id if n % 2 else partner_ids[n % len(partner_ids)],
+                    "receiver_id": partner_ids[n % len(partner_ids)] if n % 2 else user_id,
+                    "sender_encrypted": ciphertext(f"sender-cipher-{n:08d}" * 8),
+                    "receiver_encrypted": ciphertext(f"receiver-cipher-{n:08d}" * 8),
+                    "message_type": "text",
+                } for n in range(start, min(start + chunk, count))
+            ])
+        await db.commit()
+        await rebuild_conversations(db)
+
+# placeholder ciphertext in the base64 form clients send and the server stores
+def ciphertext(text: str) -> str:
+    return base64.b64encode(text.encode()).decode()
+
+# for GET /metrics
+def metrics_headers() -> dict:
+    return {"Authorization": f"Bearer {os.environ['METRICS_TOKEN']}"}
+
+def token_for(user_id: int, user_name: str) -> str:
+    from core.encryption import create_access_token
+    return create_access_token({"sub": user_name, "user_id": user_id})
+
+# runs the app on an OS-assigned port and yields its base http url
+@contextlib.asynccontextmanager
+async def serve():
+    import asyncio
+    import uvicorn
+    from main import app
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning", lifespan="on"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        if server_task.done():
+            server_task.result()
+        await asyncio.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        await server_task
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+def latency_summary(seconds: list[float]) -> dict:
+    return {
+        "p50_ms": round(percentile(seconds, 50) * 1000, 2),
+        "p99_ms": round(percentile(seconds, 99) * 1000, 2),
+        "max_ms": round(max(seconds, default=0) * 1000, 2),
+    }
+
+def environment() -> dict:
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        revision = None
+    return {
+        "git_revision": revision,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+
+def write_report(report: dict, output: str = None):
+    text = json.dumps(report, indent=2)
+    print(text)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
@@ -0,0 +1,69 @@
+# Benchmark: event-loop lag while many logins verify bcrypt hashes at once.
+#
+#   python -m benchmarks.login_loop_lag --logins 32
+#
+# A probe task asks to wake every 5 ms and records how late it actually wakes;
+# that lateness is what every WebSocket on the worker sees. Compares verifying
+# inline on the loop with the bounded hashing pool in core.encryption. No server
+# or database is involved; the harness only supplies settings and the report.
+import argparse
+import asyncio
+import time
+
+from benchmarks import harness
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--output")
+    return parser.parse_args()
+
+args = parse_args()
+# admit the whole burst so both runs verify the same number of hashes
+harness.configure(PASSWORD_HASH_MAX_PENDING=args.logins, PASSWORD_HASH_TIMEOUT=600)
+
+from core import encryption
+
+PROBE_INTERVAL = 0.005
+
+async def probe(lags: list[float], stop: asyncio.Event):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(time.perf_counter() - started - PROBE_INTERVAL)
+
+async def inline_verify(plain: str, hashed: str):
+    return encryption.verify_password(plain, hashed)
+
+async def run(verify, hashed: str) -> dict:
+    lags: list[float] = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(lags, stop))
+    await asyncio.sleep(PROBE_INTERVAL * 2)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(verify("password", hashed) for _ in range(args.logins)), return_exceptions=True)
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await probe_task
+    return {
+        "logins_ok": sum(1 for r in results if r is True),
+        "logins_rejected": sum(1 for r in results if isinstance(r, Exception)),
+        "logins_per_sec": round(args.logins / elapsed, 1),
+        "loop_lag": harness.latency_summary(lags),
+    }
+
+async def main():
+    hashed = encryption.hash_password("password")
+    report = {
+        "environment": harness.environment(),
+        "logins": args.logins,
+        "hash_workers": encryption.PASSWORD_HASH_WORKERS,
+        "inline": await run(inline_verify, hashed),
+        "hashing_pool": await run(encryption.verify_password_async, hashed),
+    }
+    harness.write_report(report, args.output)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+# Benchmark: per-message create_message vs. the group-commit MessageBatcher.
+#
+#   python -m benchmarks.message_writes --senders 20 --messages 25
+#
+# Each sender task stores its messages one after another, the way a socket's
+# receive loop does; all senders run concurrently against a throwaway SQLite file.
+# SQLite serializes writers, so keep --senders modest or the per-message path spends
+# most of its time in lock waits.
+import argparse
+import asyncio
+import time
+
+from benchmarks import harness
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--senders", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=25, help="messages per sender")
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--window-ms", type=float, default=5)
+    parser.add_argument("--output")
+    return parser.parse_args()
+
+args = parse_args()
+harness.configure(DB_POOL_SIZE=args.senders)
+
+from database import async_session, engine
+from crud.MessageCrud import create_message
+from core.messageBatcher import MessageBatcher
+from schemas.MessageSchema import MessageCreate
+
+def payload(receiver_id: int, n: int) -> MessageCreate:
+    return MessageCreate(
+        receiverID=receiver_id,
+        receiver_encrypted=harness.ciphertext(f"receiver-cipher-{n}"),
+        sender_encrypted=harness.ciphertext(f"sender-cipher-{n}"),
+        messageType="text",
+    )
+
+async def drive(store, user_ids: list[int]) -> dict:
+    latencies: list[float] = []
+
+    async def sender(i: int):
+        sender_id = user_ids[i]
+        receiver_id = user_ids[(i + 1) % len(user_ids)]
+        for n in range(args.messages):
+            started = time.perf_counter()
+            await store(payload(receiver_id, n), sender_id)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(sender(i) for i in range(args.senders)))
+    elapsed = time.perf_counter() - started
+    return {
+        "messages": len(latencies),
+        "messages_per_sec": round(len(latencies) / elapsed, 1),
+        "latency": harness.latency_summary(latencies),
+    }
+
+async def per_message(message: MessageCreate, sender_id: int):
+    async with async_session() as db:
+        return await create_message(db, message, sender_id)
+
+async def main():
+    await harness.create_schema()
+    user_ids = [uid for uid, _ in await harness.seed_users(args.senders)]
+
+    report = {"environment": harness.environment(), "senders": args.senders, "messages_per_sender": args.messages}
+    report["per_message"] = await drive(per_message, user_ids)
+
+    batcher = MessageBatcher(async_session, max_batch=args.batch_size, window=args.window_ms / 1000)
+    await batcher.start()
+    report["group_commit"] = await drive(batcher.submit, user_ids)
+    await batcher.stop()
+
+    report["speedup"] = round(report["group_commit"]["messages_per_sec"] / report["per_message"]["messages_per_sec"], 2)
+    await engine.dispose()
+    harness.write_report(report, args.output)
+
+if __name__ == "__main__":
+    asyncio.run(main())
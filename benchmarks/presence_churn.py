@@ -0,0 +1,99 @@
+# Check + benchmark: presence traffic under reconnect churn.
+#
+#   python -m benchmarks.presence_churn --partners 50 --flaps 10
+#
+# One watcher shares a conversation with --partners users. Each partner reconnects
+# --flaps times in quick succession (well inside the offline grace period) and stays
+# connected, then all go away, then all leave. The watcher should see one change per
+# partner per phase, in a handful of batched frames, however many sockets churned.
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks import harness
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--partners", type=int, default=50)
+    parser.add_argument("--flaps", type=int, default=10)
+    parser.add_argument("--flush-interval", type=float, default=0.2)
+    parser.add_argument("--grace", type=float, default=1.0)
+    parser.add_argument("--output")
+    return parser.parse_args()
+
+args = parse_args()
+harness.configure(CHAT_RATE_LIMIT=0, PRESENCE_FLUSH_INTERVAL=args.flush_interval, PRESENCE_OFFLINE_GRACE=args.grace)
+
+from websockets.asyncio.client import connect
+
+async def main():
+    await harness.create_schema()
+    users = await harness.seed_users(args.partners + 1)
+    watcher, partners = users[0], users[1:]
+    await harness.seed_history(watcher[0], [user_id for user_id, _ in partners], args.partners)
+
+    async with harness.serve() as base_url:
+        ws_url = base_url.replace("http", "ws", 1) + "/chat/ws?token="
+        frames, states = [], {}
+
+        async with connect(ws_url + harness.token_for(*watcher) + "&features=presence") as watcher_ws:
+            async def watch():
+                async for raw in watcher_ws:
+                    frame = json.loads(raw)
+                    if frame.get("type") == "presence" and not frame.get("snapshot"):
+                        frames.append(frame)
+                        for entry in frame["users"]:
+                            states[entry["user_id"]] = entry["state"]
+            watcher_task = asyncio.create_task(watch())
+            settle = args.flush_interval * 3
+
+            async def phase(name: str, expected: str, action) -> dict:
+                before_frames = len(frames)
+                before_entries = sum(len(frame["users"]) for frame in frames)
+                started = time.perf_counter()
+                socket_events = await action()
+                await asyncio.sleep(settle)
+                reached = sum(states.get(user_id) == expected for user_id, _ in partners)
+                return {
+                    "socket_events": socket_events,
+                    "presence_frames": len(frames) - before_frames,
+                    "presence_entries": sum(len(frame["users"]) for frame in frames) - before_entries,
+                    "partners_reported_" + expected: reached,
+                    "seconds": round(time.perf_counter() - started, 2),
+                }
+
+            sockets = []
+
+            async def churn():
+                async def one(user):
+                    for _ in range(args.flaps):
+                        ws = await connect(ws_url + harness.token_for(*user))
+                        await ws.close()
+                    sockets.append(await connect(ws_url + harness.token_for(*user)))
+                await asyncio.gather(*(one(user) for user in partners))
+                return len(partners) * (args.flaps * 2 + 1)
+
+            async def go_away():
+                await asyncio.gather(*(ws.send(json.dumps({"type": "presence", "state": "away"})) for ws in sockets))
+                return len(sockets)
+
+            async def leave():
+                await asyncio.gather(*(ws.close() for ws in sockets))
+                await asyncio.sleep(args.grace)
+                return len(sockets)
+
+            report = {
+                "environment": harness.environment(),
+                "partners": args.partners,
+                "flaps": args.flaps,
+                "churn_then_online": await phase("online", "online", churn),
+                "away": await phase("away", "away", go_away),
+                "offline": await phase("offline", "offline", leave),
+            }
+            watcher_task.cancel()
+
+    harness.write_report(report, args.output)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,71 @@
+# Check: read-replica routing with read-your-writes, using two SQLite files.
+#
+#   python -m benchmarks.replica_routing
+#
+# The replica is a copy of the primary taken after seeding and never updated, so
+# whatever a read returns shows which database served it. Alice sends a message over
+# the WebSocket; her own chat list must come from the primary right away, Bob's from
+# the (stale) replica, and Alice's from the replica again once the window passes.
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+
+from benchmarks import harness
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--window", type=float, default=1.0, help="DB_READ_YOUR_WRITES_WINDOW seconds")
+    return parser.parse_args()
+
+args = parse_args()
+workdir = harness.configure(DB_READ_YOUR_WRITES_WINDOW=args.window)
+os.environ["DATABASE_REPLICA_URL"] = f"sqlite+aiosqlite:///{workdir}/replica.db"
+
+import httpx
+from sqlalchemy import event
+from websockets.asyncio.client import connect
+
+async def main():
+    from database import engine, engines
+    statements = {role: 0 for role in engines()}
+    for role, db_engine in engines().items():
+        def count(*_, role=role):
+            statements[role] += 1
+        event.listen(db_engine.sync_engine, "before_cursor_execute", count)
+
+    await harness.create_schema()
+    (alice, bob) = await harness.seed_users(2)
+    await engine.dispose()
+    shutil.copy(f"{workdir}/bench.db", f"{workdir}/replica.db")
+
+    def headers(user):
+        return {"Authorization": f"Bearer {harness.token_for(*user)}"}
+
+    async with harness.serve() as base_url:
+        async with httpx.AsyncClient(base_url=base_url) as client:
+            ws_url = base_url.replace("http", "ws", 1) + f"/chat/ws?token={harness.token_for(*alice)}"
+            async with connect(ws_url) as ws:
+                await ws.send(json.dumps({"receiverID": bob[0], "receiver_encrypted": harness.ciphertext("r"), "sender_encrypted": harness.ciphertext("s"), "messageType": "text"}))
+                await ws.recv()
+
+            before = dict(statements)
+            own_read = (await client.get("/chat/chat_list", headers=headers(alice))).json()
+            other_read = (await client.get("/chat/chat_list", headers=headers(bob))).json()
+            await asyncio.sleep(args.window + 0.2)
+            later_read = (await client.get("/chat/chat_list", headers=headers(alice))).json()
+            reads = {role: statements[role] - before[role] for role in statements}
+
+    report = {
+        "sender_sees_own_message": len(own_read) == 1,
+        "other_user_read_from_replica": len(other_read) == 0,
+        "sender_back_on_replica_after_window": len(later_read) == 0,
+        "read_statements": reads,
+    }
+    harness.write_report(report)
+    sys.exit(0 if all(value for key, value in report.items() if key != "read_statements") else 1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
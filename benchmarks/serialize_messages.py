@@ -0,0 +1,118 @@
+# Microbenchmark: per-row cost of encoding message list responses.
+#
+#   python -m benchmarks.serialize_messages --rows 100 --iterations 200
+#
+# "pydantic" is the previous route body: a MessageResponse / MessageChatList per row,
+# then FastAPI's response_model validation and JSONResponse encoding (the real
+# serialize_response for the route). "orjson" is core.messageSerializer. Both outputs
+# are compared byte for byte before timing.
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks import harness
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--output")
+    return parser.parse_args()
+
+args = parse_args()
+harness.configure()
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute, serialize_response
+from sqlalchemy.orm.attributes import set_committed_value
+import models
+from core.messageSerializer import serialize_chat_list, serialize_messages
+from schemas.MessageSchema import MessageChatList, MessageResponse
+from schemas.PartnerSchema import PartnerInfoResponse
+from main import app
+
+USER_ID = 1
+
+def route_field(path: str):
+    route = next(route for route in app.routes if isinstance(route, APIRoute) and route.path == path)
+    return route.response_field
+
+def make_rows(count: int):
+    started = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    messages, chat_rows = [], []
+    for n in range(count):
+        msg = models.Message(
+            id=n + 1,
+            sender_id=USER_ID if n % 2 else n + 2,
+            receiver_id=n + 2 if n % 2 else USER_ID,
+            sender_encrypted=f"sender-cipher-{n:08d}" * 8,
+            receiver_encrypted=f"receiver-cipher-{n:08d}" * 8,
+            message_type="text",
+            timestamp=started + timedelta(seconds=n, microseconds=n * 7),
+        )
+        attachment = models.Attachment(id=n) if n % 10 == 0 else None
+        set_committed_value(msg, "attachment", attachment)
+        messages.append(msg)
+        partner = models.User(id=n + 2, user_name=f"user{n}", public_key=f"pk-{n}" * 10)
+        chat_rows.append((partner, msg, n % 5))
+    return messages, chat_rows
+
+def pydantic_messages(messages):
+    return [
+        MessageResponse(
+            sender_id=msg.sender_id,
+            receiver_id=msg.receiver_id,
+            content=msg.sender_encrypted if msg.sender_id == USER_ID else msg.receiver_encrypted,
+            message_type=msg.message_type,
+            attachment_id=msg.attachment.id if msg.attachment else None,
+            timestamp=msg.timestamp,
+        ) for msg in messages
+    ]
+
+def pydantic_chat_list(rows):
+    return [
+        MessageChatList(
+            partner=PartnerInfoResponse(id=partner.id, user_name=partner.user_name, public_key=partner.public_key),
+            message=pydantic_messages([msg])[0],
+            unread_count=unread_count,
+        ) for partner, msg, unread_count in rows
+    ]
+
+async def old_path(field, build, rows) -> bytes:
+    content = await serialize_response(field=field, response_content=build(rows), is_coroutine=True)
+    return JSONResponse(content).body
+
+async def time_per_row(encode, iterations: int, rows: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await encode()
+    return (time.perf_counter() - started) / (iterations * rows) * 1e6
+
+async def main():
+    messages, chat_rows = make_rows(args.rows)
+    results = {}
+    cases = {
+        "all_messages": (route_field("/chat/all_messages"), pydantic_messages, messages, serialize_messages),
+        "chat_list": (route_field("/chat/chat_list"), pydantic_chat_list, chat_rows, serialize_chat_list),
+    }
+    for name, (field, build, rows, fast) in cases.items():
+        before = await old_path(field, build, rows)
+        after = fast(rows, USER_ID)
+        assert before == after, f"{name}: output differs"
+
+        async def new_path():
+            return fast(rows, USER_ID)
+
+        old_us = await time_per_row(lambda: old_path(field, build, rows), args.iterations, args.rows)
+        new_us = await time_per_row(new_path, args.iterations, args.rows)
+        results[name] = {
+            "byte_identical": True,
+            "pydantic_us_per_row": round(old_us, 2),
+            "orjson_us_per_row": round(new_us, 2),
+            "speedup": round(old_us / new_us, 1),
+        }
+    harness.write_report({"environment": harness.environment(), "rows": args.rows, "iterations": args.iterations, **results}, args.output)
+
+if __name__ == "__main__":
+    asyncio.run(main())
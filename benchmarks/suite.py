@@ -0,0 +1,174 @@
+# Offline benchmark suite for the REST and WebSocket paths.
+#
+#   python -m benchmarks.suite --output run.json
+#   python -m benchmarks.suite --only ws chat_list --baseline run.json
+#
+# Everything runs against a throwaway SQLite file and the real app under uvicorn:
+#   ws         concurrent /chat/ws senders and receivers: messages/sec and
+#              send -> receiver delivery latency (fan-out p50/p99)
+#   chat_list  /chat/chat_list latency for users with growing message histories
+#   login      /auth/login throughput with real bcrypt hashes
+# The report is JSON; --baseline prints each numeric metric next to an older run.
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks import harness
+
+SCENARIOS = ("ws", "chat_list", "login")
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--only", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--pairs", type=int, default=20, help="ws sender/receiver pairs")
+    parser.add_argument("--messages", type=int, default=50, help="ws messages per sender")
+    parser.add_argument("--history-sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--partners", type=int, default=20, help="chat_list partners per user")
+    parser.add_argument("--requests", type=int, default=100, help="chat_list requests per history size")
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--login-concurrency", type=int, default=8)
+    parser.add_argument("--output", help="also write the JSON report here")
+    parser.add_argument("--baseline", help="JSON report from an earlier run to compare against")
+    return parser.parse_args()
+
+args = parse_args()
+harness.configure(
+    # the ws phase sends far more than one burst per socket
+    CHAT_RATE_LIMIT=0,
+    DB_POOL_SIZE=max(args.pairs, args.login_concurrency) + 5,
+    PASSWORD_HASH_MAX_PENDING=args.logins,
+    PASSWORD_HASH_TIMEOUT=600,
+)
+
+import httpx
+from websockets.asyncio.client import connect
+
+async def bench_ws(base_url: str) -> dict:
+    senders = await harness.seed_users(args.pairs, prefix="sender")
+    receivers = await harness.seed_users(args.pairs, prefix="receiver")
+    ws_url = base_url.replace("http", "ws", 1) + "/chat/ws"
+    sent_at: dict[str, float] = {}
+    latencies: list[float] = []
+    expected = args.pairs * args.messages
+
+    async def open_socket(user_id: int, name: str):
+        return await connect(f"{ws_url}?token={harness.token_for(user_id, name)}", max_queue=None)
+
+    async def receive(ws):
+        for _ in range(args.messages):
+            frame = json.loads(await ws.recv())
+            latencies.append(time.perf_counter() - sent_at[frame["content"]])
+
+    # each sender waits for its own echo before the next send, like a client
+    # waiting for the ack, so latency is per message rather than queueing time
+    async def send(ws, receiver_id: int, tag: str):
+        for n in range(args.messages):
+            key = harness.ciphertext(f"{tag}:{n}")
+            sent_at[key] = time.perf_counter()
+            await ws.send(json.dumps({
+                "receiverID": receiver_id,
+                "receiver_encrypted": key,
+                "sender_encrypted": key,
+                "messageType": "text",
+            }))
+            await ws.recv()
+
+    receiver_sockets = [await open_socket(uid, name) for uid, name in receivers]
+    sender_sockets = [await open_socket(uid, name) for uid, name in senders]
+    started = time.perf_counter()
+    await asyncio.wait_for(asyncio.gather(
+        *(receive(ws) for ws in receiver_sockets),
+        *(send(ws, receivers[i][0], senders[i][1]) for i, ws in enumerate(sender_sockets)),
+    ), timeout=300)
+    elapsed = time.perf_counter() - started
+    await asyncio.gather(*(ws.close() for ws in receiver_sockets + sender_sockets))
+
+    return {
+        "pairs": args.pairs,
+        "messages": expected,
+        "delivered": len(latencies),
+        "seconds": round(elapsed, 3),
+        "messages_per_sec": round(len(latencies) / elapsed, 1),
+        "fanout_latency": harness.latency_summary(latencies),
+    }
+
+async def bench_chat_list(base_url: str) -> dict:
+    results = {}
+    async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+        for size in args.history_sizes:
+            (reader, *_), partners = await harness.seed_users(1, prefix=f"reader{size}-"), await harness.seed_users(args.partners, prefix=f"partner{size}-")
+            await harness.seed_history(reader[0], [uid for uid, _ in partners], size)
+            headers = {"Authorization": f"Bearer {harness.token_for(*reader)}"}
+            await client.get("/chat/chat_list", headers=headers)
+            latencies = []
+            for _ in range(args.requests):
+                started = time.perf_counter()
+                response = await client.get("/chat/chat_list", headers=headers)
+                latencies.append(time.perf_counter() - started)
+                response.raise_for_status()
+            results[str(size)] = {"conversations": len(response.json()), **harness.latency_summary(latencies)}
+    return {"partners": args.partners, "requests": args.requests, "by_history_size": results}
+
+async def bench_login(base_url: str) -> dict:
+    from core.encryption import hash_password
+    users = await harness.seed_users(args.logins, prefix="login", password_hash=hash_password("benchmark-password"))
+    gate = asyncio.Semaphore(args.login_concurrency)
+    latencies, failures = [], 0
+
+    async def login(client: httpx.AsyncClient, name: str):
+        nonlocal failures
+        async with gate:
+            started = time.perf_counter()
+            response = await client.post("/auth/login", json={"username": name, "password": "benchmark-password"})
+            latencies.append(time.perf_counter() - started)
+            failures += response.status_code != 200
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(login(client, name) for _, name in users))
+        elapsed = time.perf_counter() - started
+    return {
+        "logins": args.logins,
+        "concurrency": args.login_concurrency,
+        "failures": failures,
+        "logins_per_sec": round(args.logins / elapsed, 2),
+        "latency": harness.latency_summary(latencies),
+    }
+
+def flatten(report: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in report.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+def compare(report: dict, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = flatten(json.load(f)["results"])
+    current = flatten(report["results"])
+    print(f"{'metric':<48} {'baseline':>12} {'current':>12} {'ratio':>8}")
+    for metric, value in current.items():
+        if metric in baseline:
+            ratio = f"{value / baseline[metric]:.2f}" if baseline[metric] else "-"
+            print(f"{metric:<48} {baseline[metric]:>12} {value:>12} {ratio:>8}")
+
+async def main():
+    from database import engine
+    await harness.create_schema()
+    scenarios = {"ws": bench_ws, "chat_list": bench_chat_list, "login": bench_login}
+    results = {}
+    async with harness.serve() as base_url:
+        for name in args.only:
+            results[name] = await scenarios[name](base_url)
+    await engine.dispose()
+
+    report = {"environment": harness.environment(), "parameters": vars(args), "results": results}
+    harness.write_report(report, args.output)
+    if args.baseline:
+        compare(report, args.baseline)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+# Benchmark: unread badges from the conversation counters vs counting messages.
+#
+#   python -m benchmarks.unread_badges --messages 200000 --partners 50
+#
+# Seeds one user's history, then times the badge query both ways (the maintained
+# conversations.unread_count rows vs a GROUP BY over messages), checks they agree,
+# and times marking one conversation read with mark_read, checking both again.
+import argparse
+import asyncio
+import time
+from datetime import datetime, timezone
+
+from benchmarks import harness
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--partners", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--output")
+    return parser.parse_args()
+
+args = parse_args()
+harness.configure()
+
+from sqlalchemy import func, select
+from database import async_session, close_db
+from core.messageCursor import MAX_MESSAGE_ID
+from crud.ConversationCrud import get_unread_counts
+from crud.MessageCrud import mark_read
+from models.Message import Message
+
+# every message there is
+EVERYTHING = (datetime(2100, 1, 1, tzinfo=timezone.utc), MAX_MESSAGE_ID)
+
+async def scan_counts(db, user_id: int) -> list[tuple[int, int]]:
+    result = await db.execute(
+        select(Message.sender_id, func.count())
+        .where(Message.receiver_id == user_id, Message.sender_id != user_id, Message.is_read.is_not(True))
+        .group_by(Message.sender_id)
+    )
+    return [tuple(row) for row in result.all()]
+
+async def timed(fn, iterations: int) -> tuple[float, object]:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        value = await fn()
+    return (time.perf_counter() - started) / iterations, value
+
+async def main():
+    await harness.create_schema()
+    users = await harness.seed_users(args.partners + 1)
+    user_id, partner_ids = users[0][0], [partner_id for partner_id, _ in users[1:]]
+    await harness.seed_history(user_id, partner_ids, args.messages)
+
+    async with async_session() as db:
+        counter_s, counters = await timed(lambda: get_unread_counts(db, user_id), args.iterations)
+        scan_s, scanned = await timed(lambda: scan_counts(db, user_id), max(1, args.iterations // 20))
+        assert sorted(counters) == sorted(scanned), (counters, scanned)
+
+        target = max(counters, key=lambda row: row[1])
+        started = time.perf_counter()
+        marked, left = await mark_read(db, user_id, target[0], EVERYTHING)
+        mark_s = time.perf_counter() - started
+        assert marked == target[1] and left == 0
+        assert sorted(await get_unread_counts(db, user_id)) == sorted(await scan_counts(db, user_id))
+    await close_db()
+
+    harness.write_report({
+        "environment": harness.environment(),
+        "messages": args.messages,
+        "partners": args.partners,
+        "unread_total": sum(count for _, count in counters),
+        "badges_from_counters_ms": round(counter_s * 1000, 3),
+        "badges_from_scan_ms": round(scan_s * 1000, 3),
+        "mark_read_messages": marked,
+        "mark_read_ms": round(mark_s * 1000, 2),
+    }, args.output)
+
+if __name__ == "__main__":
+    asyncio.run(main())
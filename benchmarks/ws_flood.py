@@ -0,0 +1,104 @@
+# Load test: one client flooding /chat/ws next to well-behaved ones.
+#
+#   python -m benchmarks.ws_flood --frames 2000 --backend local
+#   python -m benchmarks.ws_flood --frames 2000 --rate 0      # limiter off, for comparison
+#
+# The flooder sends --frames messages as fast as the socket accepts them; each normal
+# client sends one message every 200 ms and times its own echo. Reports how many of
+# the flood were stored, throttled or still unread (backed up in the socket while
+# the server paused reading) and the normal clients' round-trip latency.
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks import harness
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=2000)
+    parser.add_argument("--normal", type=int, default=5, help="well-behaved clients")
+    parser.add_argument("--normal-messages", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=5)
+    parser.add_argument("--burst", type=float, default=20)
+    parser.add_argument("--backend", choices=["local", "database"], default="local")
+    return parser.parse_args()
+
+args = parse_args()
+harness.configure(
+    CHAT_RATE_LIMIT=args.rate,
+    CHAT_RATE_BURST=args.burst,
+    CHAT_RATE_LIMIT_BACKEND=args.backend,
+    CHAT_SEND_QUEUE_SIZE=100000,
+)
+
+from websockets.asyncio.client import connect
+
+def frame(receiver_id: int, text: str) -> str:
+    content = harness.ciphertext(text)
+    return json.dumps({"receiverID": receiver_id, "receiver_encrypted": content, "sender_encrypted": content, "messageType": "text"})
+
+async def main():
+    await harness.create_schema()
+    users = await harness.seed_users(args.normal + 2)
+    flooder, sink, normals = users[0], users[1], users[2:]
+
+    async with harness.serve() as base_url:
+        ws_url = base_url.replace("http", "ws", 1) + "/chat/ws?token="
+        flood_ws = await connect(ws_url + harness.token_for(*flooder), max_queue=None)
+        counts = {"stored": 0, "throttled": 0, "errors": 0}
+        flood_done = asyncio.Event()
+
+        async def flood_reader():
+            async for raw in flood_ws:
+                kind = json.loads(raw).get("type") if raw.startswith("{") else "error"
+                if kind == "throttled":
+                    counts["throttled"] += 1
+                elif kind == "error":
+                    counts["errors"] += 1
+                else:
+                    counts["stored"] += 1
+
+        async def flood():
+            for n in range(args.frames):
+                await flood_ws.send(frame(sink[0], f"flood-{n}"))
+            flood_done.set()
+
+        latencies = []
+
+        async def normal_client(user):
+            async with connect(ws_url + harness.token_for(*user)) as ws:
+                for n in range(args.normal_messages):
+                    started = time.perf_counter()
+                    await ws.send(frame(sink[0], f"normal-{n}"))
+                    while json.loads(await ws.recv()).get("type") == "throttled":
+                        pass
+                    latencies.append(time.perf_counter() - started)
+                    await asyncio.sleep(0.2)
+
+        reader = asyncio.create_task(flood_reader())
+        started = time.perf_counter()
+        await asyncio.gather(flood(), *(normal_client(user) for user in normals))
+        elapsed = time.perf_counter() - started
+        # whatever the server has not read yet is still backed up in the socket
+        measured = dict(counts)
+        reader.cancel()
+        flood_ws.transport.abort()
+        await asyncio.gather(reader, return_exceptions=True)
+
+    harness.write_report({
+        "backend": args.backend,
+        "rate": args.rate,
+        "burst": args.burst,
+        "flood_frames": args.frames,
+        "flood_stored": measured["stored"],
+        "flood_throttled": measured["throttled"],
+        "flood_unread": args.frames - measured["stored"] - measured["throttled"] - measured["errors"],
+        "seconds": round(elapsed, 2),
+        "flood_stored_per_sec": round(measured["stored"] / elapsed, 1),
+        "normal_clients": args.normal,
+        "normal_round_trip": harness.latency_summary(latencies),
+    })
+
+if __name__ == "__main__":
+    asyncio.run(main())
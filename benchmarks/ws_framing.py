@@ -0,0 +1,171 @@
+# Benchmark: bytes and CPU per message for the JSON and binary WebSocket protocols.
+#
+#   python -m benchmarks.ws_framing --sizes 64,256,1024,4096 --iterations 20000
+#
+# First checks interop against the real app: a binary client and a JSON client message
+# each other and each must get the other's ciphertext back intact. Then, per ciphertext
+# size, times every encode/decode step a message goes through in each mode (client
+# encode, server decode + validation, hub encode, client decode) and reports frame
+# sizes on the wire, raw and after deflate (what permessage-deflate would send).
+import argparse
+import asyncio
+import base64
+import json
+import os
+import time
+import zlib
+
+from benchmarks import harness
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="64,256,1024,4096", help="ciphertext bytes, comma separated")
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--output")
+    return parser.parse_args()
+
+args = parse_args()
+harness.configure()
+
+import orjson
+from websockets.asyncio.client import connect
+from core.binaryFrames import SUBPROTOCOL, binary_frame, pack_send, to_binary, unpack_message, unpack_send
+from schemas.MessageSchema import MessageCreate
+
+TIMESTAMP = "2026-10-18T10:00:00.123456"
+
+async def check_interop():
+    await harness.create_schema()
+    (alice_id, alice), (bob_id, bob) = await harness.seed_users(2)
+    secret_for_bob, secret_for_alice = os.urandom(200), os.urandom(200)
+    async with harness.serve() as base_url:
+        ws_url = base_url.replace("http", "ws", 1) + "/chat/ws?token="
+        async with connect(ws_url + harness.token_for(alice_id, alice), subprotocols=[SUBPROTOCOL]) as alice_ws, \
+                connect(ws_url + harness.token_for(bob_id, bob)) as bob_ws:
+            assert alice_ws.subprotocol == SUBPROTOCOL and bob_ws.subprotocol is None
+
+            await alice_ws.send(pack_send(bob_id, secret_for_bob, b"alice-copy", "text"))
+            echo = unpack_message(await alice_ws.recv())
+            received = json.loads(await bob_ws.recv())
+            assert echo["content"] == b"alice-copy" and echo["id"] == received["id"]
+            assert base64.b64decode(received["content"]) == secret_for_bob
+
+            await bob_ws.send(json.dumps({
+                "receiverID": alice_id,
+                "receiver_encrypted": base64.b64encode(secret_for_alice).decode(),
+                "sender_encrypted": base64.b64encode(b"bob-copy").decode(),
+                "messageType": "text",
+            }))
+            json.loads(await bob_ws.recv())
+            frame = await alice_ws.recv()
+            assert isinstance(frame, bytes) and unpack_message(frame)["content"] == secret_for_alice
+    return "ok"
+
+def per_message_us(fn, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return round((time.perf_counter() - started) / iterations * 1e6, 2)
+
+def deflated(frame) -> int:
+    data = frame.encode() if isinstance(frame, str) else frame
+    compressor = zlib.compressobj(wbits=-15)
+    return len(compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+
+# the frame ChatHub.send_to gets for a direct message
+def delivered(receiver_encrypted: str) -> dict:
+    return {
+        "id": 1,
+        "sender_id": 1,
+        "receiver_id": 2,
+        "content": receiver_encrypted,
+        "message_type": "text",
+        "attachment_id": None,
+        "timestamp": TIMESTAMP,
+    }
+
+def measure(size: int) -> dict:
+    receiver_ct, sender_ct = os.urandom(size), os.urandom(size)
+
+    def json_client_encode():
+        return json.dumps({
+            "receiverID": 2,
+            "receiver_encrypted": base64.b64encode(receiver_ct).decode(),
+            "sender_encrypted": base64.b64encode(sender_ct).decode(),
+            "messageType": "text",
+        })
+
+    def json_server_decode():
+        return MessageCreate(**json.loads(json_in))
+
+    def json_hub_encode():
+        return orjson.dumps(delivered(message.receiver_encrypted)).decode()
+
+    def json_client_decode():
+        return base64.b64decode(json.loads(json_out)["content"])
+
+    def binary_client_encode():
+        return pack_send(2, receiver_ct, sender_ct, "text")
+
+    def binary_server_decode():
+        return MessageCreate(**unpack_send(binary_in))
+
+    # packed from the dict once per send, before fan-out
+    def binary_hub_encode():
+        return binary_frame(delivered(message.receiver_encrypted))
+
+    # what a worker does for a payload another worker published over NOTIFY
+    def binary_remote_encode():
+        return to_binary(json_out)
+
+    def binary_client_decode():
+        return unpack_message(binary_out)["content"]
+
+    json_in, binary_in = json_client_encode(), binary_client_encode()
+    message = json_server_decode()
+    assert binary_server_decode() == message
+    json_out, binary_out = json_hub_encode(), binary_hub_encode()
+    assert binary_remote_encode() == binary_out
+    assert json_client_decode() == binary_client_decode() == receiver_ct
+
+    n = args.iterations
+    report = {}
+    for mode, steps, frames in (
+        ("json", (json_client_encode, json_server_decode, json_hub_encode, json_client_decode), (json_in, json_out)),
+        ("binary", (binary_client_encode, binary_server_decode, binary_hub_encode, binary_client_decode), (binary_in, binary_out)),
+    ):
+        client_encode, server_decode, hub_encode, client_decode = (per_message_us(step, n) for step in steps)
+        inbound, outbound = frames
+        report[mode] = {
+            "bytes_in": len(inbound.encode() if isinstance(inbound, str) else inbound),
+            "bytes_out": len(outbound.encode() if isinstance(outbound, str) else outbound),
+            "deflated_in": deflated(inbound),
+            "deflated_out": deflated(outbound),
+            "server_us": round(server_decode + hub_encode, 2),
+            "client_us": round(client_encode + client_decode, 2),
+            "steps_us": {
+                "client_encode": client_encode,
+                "server_decode": server_decode,
+                "hub_encode": hub_encode,
+                "client_decode": client_decode,
+            },
+        }
+    report["binary"]["steps_us"]["remote_hub_encode"] = per_message_us(binary_remote_encode, n)
+    report["bytes_saved_pct"] = round(
+        100 * (1 - (report["binary"]["bytes_in"] + report["binary"]["bytes_out"]) / (report["json"]["bytes_in"] + report["json"]["bytes_out"])), 1
+    )
+    return report
+
+def main():
+    report = {
+        "environment": harness.environment(),
+        "iterations": args.iterations,
+        "interop": asyncio.run(check_interop()),
+        "sizes": {},
+    }
+    for size in (int(value) for value in args.sizes.split(",")):
+        report["sizes"][str(size)] = measure(size)
+    harness.write_report(report, args.output)
+
+if __name__ == "__main__":
+    main()
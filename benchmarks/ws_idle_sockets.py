@@ -0,0 +1,74 @@
+# Load test: hundreds of idle /chat/ws sockets next to a tiny connection pool.
+#
+#   python -m benchmarks.ws_idle_sockets --sockets 300 --pool-size 2
+#
+# Runs the real app under uvicorn against a throwaway SQLite file, opens one socket
+# per seeded user, checks that no pooled connection is held while they sit idle and
+# that a message still goes through end to end.
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from benchmarks import harness
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sockets", type=int, default=300)
+    parser.add_argument("--pool-size", type=int, default=2)
+    parser.add_argument("--max-overflow", type=int, default=0)
+    parser.add_argument("--output")
+    return parser.parse_args()
+
+args = parse_args()
+harness.configure(DB_POOL_SIZE=args.pool_size, DB_MAX_OVERFLOW=args.max_overflow)
+
+from websockets.asyncio.client import connect
+
+async def main():
+    from database import engine
+    await harness.create_schema()
+    users = await harness.seed_users(args.sockets)
+
+    async with harness.serve() as base_url:
+        url = base_url.replace("http", "ws", 1) + "/chat/ws"
+        started = time.perf_counter()
+        sockets = await asyncio.gather(*(connect(f"{url}?token={harness.token_for(uid, name)}") for uid, name in users))
+        connect_seconds = time.perf_counter() - started
+        # past the first presence flush, which looks up the new sockets' partners
+        await asyncio.sleep(1.5)
+        checked_out_idle = engine.pool.checkedout()
+
+        # one real message while every other socket stays open
+        (sender_id, _), (receiver_id, _) = users[0], users[1]
+        started = time.perf_counter()
+        await sockets[0].send(json.dumps({
+            "receiverID": receiver_id,
+            "receiver_encrypted": harness.ciphertext("cipher-for-receiver"),
+            "sender_encrypted": harness.ciphertext("cipher-for-sender"),
+            "messageType": "text",
+        }))
+        delivered = json.loads(await asyncio.wait_for(sockets[1].recv(), timeout=10))
+        round_trip_ms = (time.perf_counter() - started) * 1000
+        sockets_open = sum(1 for ws in sockets if ws.state.name == "OPEN")
+        await asyncio.gather(*(ws.close() for ws in sockets))
+    await engine.dispose()
+
+    report = {
+        "environment": harness.environment(),
+        "sockets_open": sockets_open,
+        "pool_size": args.pool_size,
+        "max_overflow": args.max_overflow,
+        "pool_checked_out_while_idle": checked_out_idle,
+        "connect_all_seconds": round(connect_seconds, 3),
+        "message_round_trip_ms": round(round_trip_ms, 2),
+        "delivered_to_receiver": delivered.get("sender_id") == sender_id,
+    }
+    harness.write_report(report, args.output)
+
+    ok = sockets_open == args.sockets and checked_out_idle == 0 and report["delivered_to_receiver"]
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+# Check: heartbeat sockets that go silent are reaped and their memory released.
+#
+#   python -m benchmarks.ws_reaper --sockets 200
+#
+# Opens --sockets heartbeat sockets (features=heartbeat) whose clients never answer
+# the server's ping frames, plus one that does and one legacy socket without
+# heartbeats. With short intervals the silent ones must be reaped, and the hub must
+# be back to the two live sockets with no leftover writer tasks.
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from benchmarks import harness
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sockets", type=int, default=200)
+    parser.add_argument("--heartbeat", type=float, default=0.5)
+    parser.add_argument("--idle-timeout", type=float, default=1.5)
+    parser.add_argument("--half-open", action="store_true", help="silent clients also stop reading, so closes never complete")
+    return parser.parse_args()
+
+args = parse_args()
+harness.configure(
+    CHAT_HEARTBEAT_INTERVAL=args.heartbeat,
+    CHAT_IDLE_TIMEOUT=args.idle_timeout,
+    CHAT_REAP_INTERVAL=args.heartbeat / 4,
+    CHAT_SEND_TIMEOUT=2,
+)
+
+from websockets.asyncio.client import connect
+
+async def answer_pings(ws):
+    async for raw in ws:
+        if json.loads(raw).get("type") == "ping":
+            await ws.send(json.dumps({"type": "pong"}))
+
+async def main():
+    from core.chatHub import chatHub
+    await harness.create_schema()
+    users = await harness.seed_users(args.sockets + 2)
+    silent_users, (live_user, legacy_user) = users[:-2], users[-2:]
+
+    async with harness.serve() as base_url:
+        ws_url = base_url.replace("http", "ws", 1) + "/chat/ws"
+        silent = [await connect(f"{ws_url}?token={harness.token_for(*user)}&features=heartbeat") for user in silent_users]
+        if args.half_open:
+            for ws in silent:
+                ws.transport.pause_reading()
+        live = await connect(f"{ws_url}?token={harness.token_for(*live_user)}&features=heartbeat")
+        legacy = await connect(f"{ws_url}?token={harness.token_for(*legacy_user)}")
+        answering = asyncio.create_task(answer_pings(live))
+        await asyncio.sleep(0.2)
+        sockets_before = sum(len(conns) for conns in chatHub.active_connections.values())
+
+        started = time.perf_counter()
+        deadline = started + args.idle_timeout * 4 + 5
+        while sum(len(conns) for conns in chatHub.active_connections.values()) > 2 and time.perf_counter() < deadline:
+            await asyncio.sleep(0.1)
+        reap_seconds = time.perf_counter() - started
+        # let the close tasks (and, for half-open peers, the handler cancellation) finish
+        await asyncio.sleep(0.5 if not args.half_open else 2 * 2 + 1)
+
+        report = {
+            "sockets_before": sockets_before,
+            "sockets_after": sum(len(conns) for conns in chatHub.active_connections.values()),
+            "reaped": dict(chatHub.reaped),
+            "seconds_to_reap": round(reap_seconds, 2),
+            "writer_tasks_left": sum(1 for task in asyncio.all_tasks() if "_write_loop" in repr(task.get_coro())),
+            "handler_tasks_left": sum(1 for task in asyncio.all_tasks() if "run_asgi" in repr(task.get_coro())),
+            "live_socket_kept": live_user[0] in chatHub.active_connections,
+            "legacy_socket_kept": legacy_user[0] in chatHub.active_connections,
+        }
+        answering.cancel()
+        await asyncio.gather(*(ws.close() for ws in [*silent, live, legacy]), return_exceptions=True)
+
+    harness.write_report(report)
+    ok = (
+        report["sockets_after"] == 2
+        and report["reaped"].get("idle") == args.sockets
+        and report["writer_tasks_left"] == 2
+        and report["handler_tasks_left"] == 2
+    )
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,73 @@
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+import os
+import time
+
+# bounded LRU whose entries also expire at a wall-clock deadline
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.time():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    # `expires_at` (epoch seconds) can only shorten the default ttl
+    def set(self, key: Hashable, value: Any, expires_at: Optional[float] = None):
+        deadline = time.time() + self.ttl
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+        self._data[key] = (deadline, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+# verified access token -> (user_id, username), never kept past the token's exp
+token_cache = TTLCache(
+    maxsize=int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("AUTH_TOKEN_CACHE_TTL", "300")),
+)
+
+# user id -> detached User row
+user_cache = TTLCache(
+    maxsize=int(os.getenv("AUTH_USER_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("AUTH_USER_CACHE_TTL", "60")),
+)
+
+# user id -> PartnerInfoResponse, what clients need to encrypt for that user. Other
+# workers hear about key changes through USER_CHANGED; the short ttl bounds how long a
+# missed broadcast (e.g. while a listener reconnects) can serve a rotated key
+public_key_cache = TTLCache(
+    maxsize=int(os.getenv("PUBLIC_KEY_CACHE_SIZE", "50000")),
+    ttl=float(os.getenv("PUBLIC_KEY_CACHE_TTL", "30")),
+)
+
+# broadcast topic, data {"user_id": ...}
+USER_CHANGED = "user_changed"
+
+# call after anything that changes a users row, then broadcast USER_CHANGED so the
+# other workers drop their copies too
+def invalidate_user(user_id: int):
+    user_cache.pop(user_id)
+    public_key_cache.pop(user_id)
+
+def on_user_changed(data: dict):
+    invalidate_user(data["user_id"])
@@ -6,6 +6,7 @@ from sqlalchemy.future import select
 from models.User import User
 from schemas import UserSchema
 from core import encryption
+from core.authCache import token_cache, user_cache
 import logging
 from database import get_db
 from typing import Annotated
@@ -15,8 +16,8 @@ logger = logging.getLogger(__name__)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 async def create_new_user(db:Annotated[AsyncSession, Depends(get_db)], user_data:UserSchema.UserCreate):
+    hash_password = await encryption.hash_password_async(user_data.password)
     try:
-        hash_password = encryption.hash_password(user_data.password)
         user = User(
             user_name = user_data.username,
             email = user_data.email,
@@ -45,18 +46,28 @@ async def get_current_user(db:Annotated[AsyncSession, Depends(get_db)], token:An
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = encryption.decode_jwt_token(token)
-        username = payload.get("sub")
-        if username is None:
+    # a token that verified once is trusted until it expires, skipping the signature check
+    identity = token_cache.get(token)
+    if identity is None:
+        try:
+            payload = encryption.decode_jwt_token(token)
+            username = payload.get("sub")
+            if username is None:
+                raise credentials_exception
+        except JWTError:
+            logger.error(f"Error fetching user by username: {JWTError}")
             raise credentials_exception
-    except JWTError:
-        logger.error(f"Error fetching user by username: {JWTError}")
-        raise credentials_exception
-    except Exception as e:
-        logger.error(f"Error fetching user by username: {e}")
-        raise credentials_exception
-    user = await get_user_by_username(db, username)
+        except Exception as e:
+            logger.error(f"Error fetching user by username: {e}")
+            raise credentials_exception
+        identity = (payload.get("user_id"), username)
+        token_cache.set(token, identity, expires_at=payload.get("exp"))
+
+    user_id, username = identity
+    user = user_cache.get(user_id) if user_id is not None else None
     if user is None:
-        raise credentials_exception
+        user = await get_user_by_username(db, username)
+        if user is None:
+            raise credentials_exception
+        user_cache.set(user.id, user)
     return user
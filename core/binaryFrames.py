@@ -0,0 +1,170 @@
+from datetime import datetime, timezone
+from typing import Optional, Union
+import binascii
+import orjson
+import struct
+
+# Compact framing for clients that offer this WebSocket subprotocol. Ciphertext travels
+# as raw bytes instead of base64 inside JSON; everything else (ping/pong, throttled,
+# sync, errors) stays a JSON text frame in either mode.
+SUBPROTOCOL = "fluent.binary.v1"
+
+# All integers are big-endian, attachment id 0 means none.
+#   SEND    (client -> server): kind u8, receiver u32, attachment u32, type_len u16, type,
+#                               receiver_len u32, receiver ciphertext, sender_len u32, sender ciphertext
+#   MESSAGE (server -> client): kind u8, message id u32, sender u32, receiver u32, attachment u32,
+#                               timestamp i64 (microseconds since the epoch, UTC), type_len u16, type,
+#                               content_len u32, content ciphertext
+# A frame holding several records back to back is a batch (SEND) or a grouped delivery (MESSAGE).
+SEND = 0x01
+MESSAGE = 0x02
+
+_SEND_HEAD = struct.Struct("!BIIH")
+_MESSAGE_HEAD = struct.Struct("!BIIIIqH")
+_LENGTH = struct.Struct("!I")
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+class BinaryFrameError(Exception):
+    pass
+
+def _take(view: memoryview, offset: int) -> tuple[memoryview, int]:
+    (length,) = _LENGTH.unpack_from(view, offset)
+    offset += _LENGTH.size
+    if offset + length > len(view):
+        raise BinaryFrameError("truncated frame")
+    return view[offset:offset + length], offset + length
+
+# the database keeps ciphertext as base64 text, so JSON clients read the same rows.
+# JSON clients may store anything, so only strict base64 is packed as bytes; see binary_frame
+def _to_text(raw) -> str:
+    return binascii.b2a_base64(raw, newline=False).decode("ascii")
+
+def _to_bytes(text: str) -> bytes:
+    return binascii.a2b_base64(text, strict_mode=True)
+
+def _timestamp_us(timestamp: Union[datetime, str]) -> int:
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    delta = timestamp - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+def pack_send(receiver_id: int, receiver_encrypted: bytes, sender_encrypted: bytes, message_type: str, attachment_id: Optional[int] = None) -> bytes:
+    kind = message_type.encode()
+    return b"".join((
+        _SEND_HEAD.pack(SEND, receiver_id, attachment_id or 0, len(kind)), kind,
+        _LENGTH.pack(len(receiver_encrypted)), receiver_encrypted,
+        _LENGTH.pack(len(sender_encrypted)), sender_encrypted,
+    ))
+
+def _unpack_send_at(view: memoryview, offset: int) -> tuple[dict, int]:
+    try:
+        kind, receiver_id, attachment_id, type_length = _SEND_HEAD.unpack_from(view, offset)
+        if kind != SEND:
+            raise BinaryFrameError(f"unexpected frame kind {kind}")
+        start = offset + _SEND_HEAD.size
+        offset = start + type_length
+        message_type = bytes(view[start:offset]).decode()
+        receiver_encrypted, offset = _take(view, offset)
+        sender_encrypted, offset = _take(view, offset)
+    except (struct.error, UnicodeDecodeError) as e:
+        raise BinaryFrameError(str(e))
+    return {
+        "receiverID": receiver_id,
+        "receiver_encrypted": _to_text(receiver_encrypted),
+        "sender_encrypted": _to_text(sender_encrypted),
+        "messageType": message_type,
+        "attachmentID": attachment_id or None,
+    }, offset
+
+# returns MessageCreate fields with the ciphertexts in their stored base64 form
+def unpack_send(frame: bytes) -> dict:
+    view = memoryview(frame)
+    fields, offset = _unpack_send_at(view, 0)
+    if offset != len(view):
+        raise BinaryFrameError("trailing bytes")
+    return fields
+
+# a frame may hold several SEND records back to back, the binary form of a batch
+def unpack_sends(frame: bytes) -> list[dict]:
+    view = memoryview(frame)
+    items, offset = [], 0
+    while offset < len(view):
+        fields, offset = _unpack_send_at(view, offset)
+        items.append(fields)
+    if not items:
+        raise BinaryFrameError("empty frame")
+    return items
+
+def pack_message(message_id: int, sender_id: int, receiver_id: int, content: bytes, message_type: str, attachment_id: Optional[int], timestamp: Union[datetime, str]) -> bytes:
+    kind = message_type.encode()
+    return b"".join((
+        _MESSAGE_HEAD.pack(MESSAGE, message_id, sender_id, receiver_id, attachment_id or 0, _timestamp_us(timestamp), len(kind)), kind,
+        _LENGTH.pack(len(content)), content,
+    ))
+
+def _unpack_message_at(view: memoryview, offset: int) -> tuple[dict, int]:
+    try:
+        kind, message_id, sender_id, receiver_id, attachment_id, timestamp, type_length = _MESSAGE_HEAD.unpack_from(view, offset)
+        if kind != MESSAGE:
+            raise BinaryFrameError(f"unexpected frame kind {kind}")
+        start = offset + _MESSAGE_HEAD.size
+        offset = start + type_length
+        message_type = bytes(view[start:offset]).decode()
+        content, offset = _take(view, offset)
+    except (struct.error, UnicodeDecodeError) as e:
+        raise BinaryFrameError(str(e))
+    return {
+        "id": message_id,
+        "sender_id": sender_id,
+        "receiver_id": receiver_id,
+        "content": bytes(content),
+        "message_type": message_type,
+        "attachment_id": attachment_id or None,
+        "timestamp": timestamp,
+    }, offset
+
+def unpack_message(frame: bytes) -> dict:
+    return _unpack_message_at(memoryview(frame), 0)[0]
+
+# grouped deliveries are MESSAGE records back to back
+def unpack_messages(frame: bytes) -> list[dict]:
+    view = memoryview(frame)
+    messages, offset = [], 0
+    while offset < len(view):
+        message, offset = _unpack_message_at(view, offset)
+        messages.append(message)
+    return messages
+
+def _pack_delivered(data: dict) -> bytes:
+    return pack_message(
+        data["id"],
+        data["sender_id"],
+        data["receiver_id"],
+        _to_bytes(data["content"]),
+        data["message_type"],
+        data.get("attachment_id"),
+        data["timestamp"],
+    )
+
+# what binary sockets get for a frame ChatHub is sending: message frames (and grouped
+# "messages" frames) as MESSAGE records, None for any other "type" and for ciphertext
+# that is not strict base64 (e.g. line-wrapped, from an older JSON client), which go
+# out as the JSON text unchanged
+def binary_frame(data: dict) -> Optional[bytes]:
+    try:
+        if "type" not in data:
+            return _pack_delivered(data)
+        if data["type"] == "messages":
+            return b"".join(_pack_delivered(message) for message in data["messages"])
+    except binascii.Error:
+        return None
+    return None
+
+# the same from the encoded JSON, for payloads that arrive from another worker
+def to_binary(payload: str) -> Union[str, bytes]:
+    data = orjson.loads(payload)
+    if not isinstance(data, dict):
+        return payload
+    return binary_frame(data) or payload
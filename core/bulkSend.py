@@ -0,0 +1,50 @@
+from typing import Any
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.chatHub import ChatHub
+from core.messageSerializer import live_frame
+from crud.MessageCrud import create_messages_bulk
+from schemas.MessageSchema import MessageCreate
+import os
+
+MAX_SEND_BATCH = int(os.getenv("CHAT_SEND_BATCH_MAX", "100"))
+
+# items may carry a "client_id"; it is only echoed back so the client can match acks
+# to its outbox entries
+def _ack(index: int, item: Any, **fields) -> dict:
+    ack = {"index": index}
+    if isinstance(item, dict) and "client_id" in item:
+        ack["client_id"] = item["client_id"]
+    ack.update(fields)
+    return ack
+
+# validates every item, stores the valid ones in one transaction and fans out once
+# per recipient; returns one ack per item, in order, so a bad item never sinks the rest
+async def send_batch(db: AsyncSession, chat_hub: ChatHub, user_id: int, items: list[Any]) -> list[dict]:
+    acks: list[dict] = [None] * len(items)
+    valid: list[tuple[int, MessageCreate]] = []
+    for i, item in enumerate(items):
+        try:
+            valid.append((i, MessageCreate.model_validate(item)))
+        except ValidationError as ve:
+            acks[i] = _ack(i, item, status="error", error="validation error",
+                           details=ve.errors(include_url=False, include_context=False, include_input=False))
+    if not valid:
+        return acks
+
+    results = await create_messages_bulk(db, [(payload, user_id) for _, payload in valid])
+    frames: dict[int, list[dict]] = {}
+    for (i, payload), result in zip(valid, results):
+        if isinstance(result, HTTPException):
+            acks[i] = _ack(i, items[i], status="error", error=result.detail["message"])
+            continue
+        acks[i] = _ack(i, items[i], status="sent", id=result.id, timestamp=result.timestamp.isoformat())
+        frames.setdefault(result.receiver_id, []).append(live_frame(result, result.receiver_encrypted, payload.attachmentID))
+        frames.setdefault(user_id, []).append(live_frame(result, result.sender_encrypted, payload.attachmentID))
+
+    # a lone message keeps the usual frame; several for one recipient share a frame, which
+    # ChatHub splits again for sockets that did not opt into grouped frames
+    for recipient, messages in frames.items():
+        await chat_hub.send_to(recipient, messages[0] if len(messages) == 1 else {"type": "messages", "messages": messages})
+    return acks
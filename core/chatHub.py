@@ -1,27 +1,300 @@
-from typing import Dict, Set
-from fastapi import WebSocket
+from typing import Dict, Optional, Set, Union
+from fastapi import WebSocket, status
+from starlette.websockets import WebSocketState
+from core.binaryFrames import binary_frame, to_binary
+from core.fanoutBackend import FanoutBackend, create_fanout_backend
+from core.metrics import ws_delivery_failures, ws_frames_out, ws_reaped
+from core.profiling import section
+import asyncio
 import logging
+import orjson
+import os
+import time
 logger = logging.getLogger(__name__)
 
+SEND_QUEUE_SIZE = int(os.getenv("CHAT_SEND_QUEUE_SIZE", "256"))
+SEND_TIMEOUT = float(os.getenv("CHAT_SEND_TIMEOUT", "10"))
+# sockets that opted into heartbeats get a ping frame after this long without
+# hearing from the client, and are reaped after CHAT_IDLE_TIMEOUT of silence
+HEARTBEAT_INTERVAL = float(os.getenv("CHAT_HEARTBEAT_INTERVAL", "25"))
+IDLE_TIMEOUT = float(os.getenv("CHAT_IDLE_TIMEOUT", "75"))
+# same for clients without heartbeats, which may legitimately stay silent; 0 = never
+LEGACY_IDLE_TIMEOUT = float(os.getenv("CHAT_LEGACY_IDLE_TIMEOUT", "0"))
+REAP_INTERVAL = float(os.getenv("CHAT_REAP_INTERVAL", "5"))
+PING_FRAME = orjson.dumps({"type": "ping"}).decode()
+# every {"type": "messages", ...} frame starts like this, orjson keeps key order
+GROUPED_PREFIX = '{"type":"messages"'
+# read receipts and badge counts, only for sockets that asked for them
+RECEIPT_PREFIXES = ('{"type":"read"', '{"type":"unread"')
+
+# one socket plus its bounded outbound queue; a dedicated writer task drains it
+# so a stalled client only ever blocks itself
+class Connection:
+    def __init__(self, websocket: WebSocket, user_id: int, queue_size: int, heartbeat: bool = False, binary: bool = False, wants_presence: bool = False, grouped: bool = False, receipts: bool = False) -> None:
+        self.websocket = websocket
+        self.user_id = user_id
+        self.queue: asyncio.Queue[Union[str, bytes]] = asyncio.Queue(maxsize=queue_size)
+        # negotiated the binary subprotocol: message frames go out as bytes
+        self.binary = binary
+        self.writer: Optional[asyncio.Task] = None
+        self.heartbeat = heartbeat
+        self.last_seen = time.monotonic()
+        self.last_ping = 0.0
+        # the core_chatting task reading this socket, cancelled if reaping cannot close it
+        self.handler: Optional[asyncio.Task] = asyncio.current_task()
+        self.reaped: Optional[str] = None
+        # "online" or "away", as last reported by the client; only sockets that
+        # asked for it are sent partners' presence
+        self.presence = "online"
+        self.wants_presence = wants_presence
+        # understands {"type": "messages"} frames; everyone else gets them one message a frame
+        self.grouped = grouped
+        # gets {"type": "read"} / {"type": "unread"} frames
+        self.receipts = receipts
+
 class ChatHub:
-    def __init__(self) -> None:
-        self.active_connections: Dict[int, Set[WebSocket]] = {}
+    def __init__(
+        self,
+        backend: Optional[FanoutBackend] = None,
+        queue_size: int = SEND_QUEUE_SIZE,
+        send_timeout: float = SEND_TIMEOUT,
+        heartbeat_interval: float = HEARTBEAT_INTERVAL,
+        idle_timeout: float = IDLE_TIMEOUT,
+        legacy_idle_timeout: float = LEGACY_IDLE_TIMEOUT,
+        reap_interval: float = REAP_INTERVAL,
+    ) -> None:
+        self.active_connections: Dict[int, Dict[WebSocket, Connection]] = {}
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_timeout = idle_timeout
+        self.legacy_idle_timeout = legacy_idle_timeout
+        self.reap_interval = reap_interval
+        self.evicted = 0
+        self.reaped: Dict[str, int] = {}
+        self._background: Set[asyncio.Task] = set()
+        self._reaper: Optional[asyncio.Task] = None
+        self._listeners: list = []
+        self.backend = backend or create_fanout_backend()
+        self.backend.attach(self.deliver_local)
+
+    async def start(self):
+        await self.backend.start()
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap_loop())
+
+    async def stop(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+            try:
+                await self._reaper
+            except asyncio.CancelledError:
+                pass
+            self._reaper = None
+        await self.backend.stop()
+
+    # worker-wide events such as cache invalidations, see FanoutBackend.broadcast
+    def subscribe(self, topic: str, handler):
+        self.backend.subscribe(topic, handler)
+
+    async def broadcast(self, topic: str, data: dict):
+        await self.backend.broadcast(topic, data)
 
-    async def connect(self, websocket: WebSocket, user_id: int):
+    # listeners get connected(conn) / disconnected(conn) for every socket that joins
+    # or leaves this worker, however it leaves
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    # a paused connection buffers frames in its queue until resume() starts the writer
+    async def connect(self, websocket: WebSocket, user_id: int, paused: bool = False, heartbeat: bool = False, binary: bool = False, wants_presence: bool = False, grouped: bool = False, receipts: bool = False) -> Connection:
         # await websocket.accept()
-        if user_id not in self.active_connections:
-            self.active_connections[user_id] = set()
-        self.active_connections[user_id].add(websocket)
+        conn = Connection(websocket, user_id, self.queue_size, heartbeat, binary, wants_presence, grouped, receipts)
+        if not paused:
+            conn.writer = asyncio.create_task(self._write_loop(conn))
+        self.active_connections.setdefault(user_id, {})[websocket] = conn
+        for listener in self._listeners:
+            listener.connected(conn)
+        return conn
+
+    # any frame from the client counts as a sign of life
+    def touch(self, conn: Connection):
+        conn.last_seen = time.monotonic()
+
+    async def resume(self, websocket: WebSocket, user_id: int):
+        conn = self.active_connections.get(user_id, {}).get(websocket)
+        if conn is not None and conn.writer is None:
+            conn.writer = asyncio.create_task(self._write_loop(conn))
 
     async def disconnect(self, websocket: WebSocket, user_id: int):
-        self.active_connections[user_id].discard(websocket)
-        if not self.active_connections[user_id]:
+        conn = self._remove(websocket, user_id)
+        if conn is not None and conn.writer is not None:
+            conn.writer.cancel()
+
+    def _remove(self, websocket: WebSocket, user_id: int) -> Optional[Connection]:
+        conns = self.active_connections.get(user_id)
+        if conns is None:
+            return None
+        conn = conns.pop(websocket, None)
+        if not conns:
             del self.active_connections[user_id]
+        if conn is not None:
+            for listener in self._listeners:
+                listener.disconnected(conn)
+        return conn
 
+    # reaches the user's sockets on every worker; the payload is encoded once here
+    # and the same text frame is reused for each socket
     async def send_to(self, user_id: int, data: dict):
         logger.debug(f"Sending to {user_id}: {data}")
-        for ws in self.active_connections.get(user_id, set()):
-            await ws.send_json(data)
+        with section("serialization"):
+            payload = orjson.dumps(data).decode()
+            binary = self._binary_for(user_id, data, payload)
+        await self.backend.publish(user_id, payload, binary)
+
+    # the frame binary sockets on this worker get, packed straight from the dict rather
+    # than re-parsed from the JSON; None when the user has no binary socket here
+    def _binary_for(self, user_id: int, data: dict, payload: str) -> Optional[Union[str, bytes]]:
+        if not any(conn.binary for conn in self.active_connections.get(user_id, {}).values()):
+            return None
+        return binary_frame(data) or payload
+
+    # a different frame per user (e.g. each group member's own ciphertext), each encoded
+    # once; when nothing outside this worker can be reached, users without a socket here
+    # are skipped before encoding. Local delivery only queues, so every member's writer
+    # task sends concurrently; remote publishes run concurrently too
+    async def send_many(self, frames: Dict[int, dict]):
+        with section("serialization"):
+            payloads = []
+            for user_id, data in frames.items():
+                if not self.backend.local_only or user_id in self.active_connections:
+                    payload = orjson.dumps(data).decode()
+                    payloads.append((user_id, payload, self._binary_for(user_id, data, payload)))
+        if self.backend.local_only:
+            for user_id, payload, binary in payloads:
+                await self.deliver_local(user_id, payload, binary)
+        else:
+            await asyncio.gather(*(self.backend.publish(user_id, payload, binary) for user_id, payload, binary in payloads))
+
+    # only the sockets connected to this worker; never waits on the network
+    async def deliver_local(self, user_id: int, payload: str, binary: Optional[Union[str, bytes]] = None):
+        singles = None
+        receipt = payload.startswith(RECEIPT_PREFIXES)
+        for conn in list(self.active_connections.get(user_id, {}).values()):
+            if receipt and not conn.receipts:
+                continue
+            if not conn.grouped and payload.startswith(GROUPED_PREFIX):
+                # split at most once per payload, however many sockets need it
+                if singles is None:
+                    with section("serialization"):
+                        singles = self._split(payload)
+                for text, packed in singles:
+                    self._enqueue(conn, packed if conn.binary else text)
+                continue
+            frame = payload
+            if conn.binary:
+                # a payload from another worker (or a socket that arrived since send_to
+                # looked) is re-encoded at most once, however many binary sockets
+                if binary is None:
+                    with section("serialization"):
+                        binary = to_binary(payload)
+                frame = binary
+            self._enqueue(conn, frame)
+
+    # (JSON text, binary frame) per message of a grouped frame
+    def _split(self, payload: str) -> list[tuple[str, Union[str, bytes]]]:
+        singles = []
+        for message in orjson.loads(payload)["messages"]:
+            text = orjson.dumps(message).decode()
+            singles.append((text, binary_frame(message) or text))
+        return singles
+
+    # one socket on this worker only, e.g. state that only the new socket is missing
+    def send_to_connection(self, conn: Connection, data: dict):
+        self._enqueue(conn, orjson.dumps(data).decode())
+
+    def _enqueue(self, conn: Connection, frame: Union[str, bytes]):
+        try:
+            conn.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            logger.warning(f"Outbound queue full for user {conn.user_id}, dropping socket")
+            ws_delivery_failures.inc("queue_full")
+            self._evict(conn)
+
+    async def _write_loop(self, conn: Connection):
+        while True:
+            payload = await conn.queue.get()
+            send = conn.websocket.send_bytes(payload) if isinstance(payload, bytes) else conn.websocket.send_text(payload)
+            try:
+                await asyncio.wait_for(send, timeout=self.send_timeout)
+                ws_frames_out.inc()
+            except asyncio.TimeoutError:
+                logger.warning(f"Send to user {conn.user_id} blocked for {self.send_timeout}s, dropping socket")
+                ws_delivery_failures.inc("send_timeout")
+                self._evict(conn)
+                return
+            except Exception as e:
+                logger.error(f"Send to user {conn.user_id} failed: {e}")
+                ws_delivery_failures.inc("send_error")
+                self._evict(conn)
+                return
+
+    def _evict(self, conn: Connection, code: int = status.WS_1013_TRY_AGAIN_LATER, reason: str = "slow consumer") -> bool:
+        if self._remove(conn.websocket, conn.user_id) is None:
+            return False
+        self.evicted += 1
+        if conn.writer is not None and conn.writer is not asyncio.current_task():
+            conn.writer.cancel()
+        task = asyncio.create_task(self._close(conn, code, reason))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return True
+
+    async def _close(self, conn: Connection, code: int, reason: str):
+        # the server may hold the close open until its own handshake timeout, which
+        # can outlast ours, so wait on it without cancelling it
+        closing = asyncio.ensure_future(conn.websocket.close(code=code, reason=reason))
+        closing.add_done_callback(lambda task: task.cancelled() or task.exception())
+        await asyncio.wait({closing}, timeout=self.send_timeout)
+        # a half-open peer never answers the close, so the handler would sit in
+        # receive until the server gives up; stop it now
+        if conn.reaped is not None and conn.handler is not None and not conn.handler.done():
+            conn.handler.cancel()
+
+    def _reap(self, conn: Connection, reason: str):
+        conn.reaped = reason
+        if self._evict(conn, status.WS_1001_GOING_AWAY, reason):
+            self.reaped[reason] = self.reaped.get(reason, 0) + 1
+            ws_reaped.inc(reason)
+
+    # pings heartbeat sockets that have gone quiet and reaps the ones that stay quiet,
+    # plus any socket the server already considers closed
+    def sweep(self, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        for conns in list(self.active_connections.values()):
+            for conn in list(conns.values()):
+                idle = now - conn.last_seen
+                timeout = self.idle_timeout if conn.heartbeat else self.legacy_idle_timeout
+                if WebSocketState.DISCONNECTED in (conn.websocket.client_state, conn.websocket.application_state):
+                    self._reap(conn, "disconnected")
+                elif conn.handler is not None and conn.handler.done():
+                    self._reap(conn, "handler_gone")
+                elif timeout and idle > timeout:
+                    self._reap(conn, "idle")
+                elif conn.heartbeat and idle >= self.heartbeat_interval and now - conn.last_ping >= self.heartbeat_interval:
+                    conn.last_ping = now
+                    try:
+                        conn.queue.put_nowait(PING_FRAME)
+                    except asyncio.QueueFull:
+                        ws_delivery_failures.inc("queue_full")
+                        self._evict(conn)
+
+    async def _reap_loop(self):
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Reaper sweep failed: {e}")
 
 chatHub = ChatHub()
 
@@ -10,6 +10,9 @@ from dotenv import load_dotenv
 from datetime import datetime, timedelta, timezone
 from enum import Enum
 from fastapi import HTTPException, status
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+from core.profiling import section
 
 load_dotenv()
 
@@ -17,6 +20,16 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated = "auto")
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 
+# bcrypt releases the GIL, so a small thread pool keeps hashing off the event loop
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+# hashes allowed to wait for a worker before new ones are rejected outright
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+# longest a hash may take, queueing included, before the request is rejected
+PASSWORD_HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", "5"))
+
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_hash_in_flight = 0
+
 class ExpireDates(Enum):
     ACCESS_TOKEN_EXPIRE_MINUTES = 60
     REFRESH_TOKEN_EXPIRE_DAYS = 7
@@ -29,6 +42,41 @@ def hash_password(password:str):
 def verify_password(plain:str, hashed:str):
     return pwd_context.verify(plain, hashed)
 
+def _hashing_overloaded():
+    return HTTPException(
+        status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many concurrent logins, retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
+def _hash_done():
+    global _hash_in_flight
+    _hash_in_flight -= 1
+
+async def _run_hashing(fn, *args):
+    global _hash_in_flight
+    if _hash_in_flight >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_PENDING:
+        raise _hashing_overloaded()
+    _hash_in_flight += 1
+    loop = asyncio.get_running_loop()
+    future = _hash_executor.submit(fn, *args)
+    # a timed-out hash keeps its worker until bcrypt returns, so it stays counted until
+    # then; the callback runs on the pool thread and hands the decrement to the loop
+    future.add_done_callback(lambda _: loop.call_soon_threadsafe(_hash_done))
+    try:
+        with section("crypto"):
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=PASSWORD_HASH_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise _hashing_overloaded()
+
+# hash_password on the hashing pool
+async def hash_password_async(password:str):
+    return await _run_hashing(hash_password, password)
+
+# verify_password on the hashing pool
+async def verify_password_async(plain:str, hashed:str):
+    return await _run_hashing(verify_password, plain, hashed)
+
 # generate access token
 def create_access_token(data:dict, expires_minutes:int=ExpireDates.ACCESS_TOKEN_EXPIRE_MINUTES.value):
     to_encode = data.copy()
@@ -48,7 +96,8 @@ def create_refresh_token(data:dict, expires_day:int=ExpireDates.REFRESH_TOKEN_EX
 # decode refresh token
 def decode_jwt_token(token:str):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        with section("crypto"):
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         return payload
     except JWTError:
         raise HTTPException(status.HTTP_400_BAD_REQUEST, detail="Invalid Refresh Token")
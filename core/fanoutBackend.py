@@ -0,0 +1,191 @@
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Union
+from sqlalchemy.engine import make_url
+from core.frameReferences import frame_reference, load_frame
+from core.metrics import ws_delivery_failures
+import asyncio
+import json
+import logging
+import os
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# (user_id, already-encoded JSON text frame, frame for binary sockets if already built)
+Deliver = Callable[[int, str, Optional[Union[str, bytes]]], Awaitable[None]]
+# gets the data of a broadcast; runs on the event loop, so keep it quick
+Handler = Callable[[dict], None]
+
+# moves a payload from the worker that produced it to every worker that might
+# hold one of the target user's sockets; ChatHub only ever delivers locally
+class FanoutBackend(ABC):
+    # every socket a publish can reach is on this worker
+    local_only = False
+
+    def __init__(self) -> None:
+        self._deliver: Optional[Deliver] = None
+        self._handlers: Dict[str, List[Handler]] = {}
+
+    def attach(self, deliver: Deliver):
+        self._deliver = deliver
+
+    def subscribe(self, topic: str, handler: Handler):
+        self._handlers.setdefault(topic, []).append(handler)
+
+    def _dispatch(self, topic: str, data: dict):
+        for handler in self._handlers.get(topic, ()):
+            try:
+                handler(data)
+            except Exception as e:
+                logger.error(f"Fan-out handler for {topic} failed: {e}")
+
+    # worker-wide events such as cache invalidations: runs the topic's handlers on
+    # every other worker, the caller has already dealt with its own state
+    async def broadcast(self, topic: str, data: dict):
+        pass
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    # binary is only good for this worker's sockets, other workers get the JSON
+    @abstractmethod
+    async def publish(self, user_id: int, payload: str, binary: Optional[Union[str, bytes]] = None):
+        ...
+
+# single process: publishing is just local delivery and there is no one to broadcast to
+class LocalFanout(FanoutBackend):
+    local_only = True
+
+    async def publish(self, user_id: int, payload: str, binary: Optional[Union[str, bytes]] = None):
+        await self._deliver(user_id, payload, binary)
+
+# multiple uvicorn workers sharing one Postgres: every worker LISTENs on the same
+# channel, the publisher delivers to its own sockets directly and NOTIFYs the rest.
+# Message frames over MAX_PAYLOAD are sent as a reference and loaded by the receiver,
+# see core.frameReferences
+class PostgresFanout(FanoutBackend):
+    CHANNEL = "chat_fanout"
+    # NOTIFY payloads must stay below 8000 bytes
+    MAX_PAYLOAD = 7900
+    RECONNECT_DELAY = 1.0
+
+    def __init__(self, database_url: str) -> None:
+        super().__init__()
+        self.dsn = make_url(database_url).set(drivername="postgresql").render_as_string(hide_password=False)
+        self.worker_id = uuid.uuid4().hex
+        self._listen_conn = None
+        self._pool = None
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._stopping = False
+        # deliveries started from NOTIFY callbacks, kept so they are not collected mid-send
+        self._pending: Set[asyncio.Task] = set()
+
+    async def start(self):
+        import asyncpg
+
+        self._stopping = False
+        self._pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=4)
+        await self._listen()
+
+    async def _listen(self):
+        import asyncpg
+
+        self._listen_conn = await asyncpg.connect(self.dsn)
+        self._listen_conn.add_termination_listener(self._on_terminated)
+        await self._listen_conn.add_listener(self.CHANNEL, self._on_notify)
+
+    def _on_terminated(self, conn):
+        if self._stopping:
+            return
+        logger.error("Fan-out listener connection lost, reconnecting")
+        self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        while not self._stopping:
+            try:
+                await self._listen()
+                return
+            except Exception as e:
+                logger.error(f"Fan-out listener reconnect failed: {e}")
+                await asyncio.sleep(self.RECONNECT_DELAY)
+
+    async def stop(self):
+        self._stopping = True
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+        if self._listen_conn is not None:
+            await self._listen_conn.close()
+        if self._pool is not None:
+            await self._pool.close()
+
+    def _on_notify(self, conn, pid, channel, payload: str):
+        try:
+            message = json.loads(payload)
+        except json.JSONDecodeError:
+            logger.error("Dropping malformed fan-out payload")
+            return
+        if message.get("origin") == self.worker_id:
+            return
+        if "topic" in message:
+            self._dispatch(message["topic"], message["data"])
+            return
+        if "ref" in message:
+            task = asyncio.create_task(self._deliver_reference(message["user_id"], message["ref"]))
+        else:
+            task = asyncio.create_task(self._deliver(message["user_id"], message["data"]))
+        self._pending.add(task)
+        task.add_done_callback(self._delivered)
+
+    async def _deliver_reference(self, user_id: int, reference: dict):
+        payload = await load_frame(user_id, reference)
+        if payload is None:
+            logger.warning(f"Fan-out reference for {user_id} did not resolve: {reference}")
+            ws_delivery_failures.inc("reference_missing")
+            return
+        await self._deliver(user_id, payload)
+
+    def _delivered(self, task: asyncio.Task):
+        self._pending.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Fan-out delivery failed: {task.exception()}")
+            ws_delivery_failures.inc("deliver_error")
+
+    async def publish(self, user_id: int, payload: str, binary: Optional[Union[str, bytes]] = None):
+        await self._deliver(user_id, payload, binary)
+
+        notification = json.dumps({"origin": self.worker_id, "user_id": user_id, "data": payload}, separators=(",", ":"))
+        if len(notification.encode()) > self.MAX_PAYLOAD:
+            reference = frame_reference(payload)
+            if reference is None:
+                logger.warning(f"Fan-out payload for {user_id} too large for NOTIFY, delivered locally only")
+                ws_delivery_failures.inc("notify_too_large")
+                return
+            notification = json.dumps({"origin": self.worker_id, "user_id": user_id, "ref": reference}, separators=(",", ":"))
+        try:
+            async with self._pool.acquire() as conn:
+                await conn.execute("SELECT pg_notify($1, $2)", self.CHANNEL, notification)
+        except Exception as e:
+            logger.error(f"Fan-out publish failed: {e}")
+            ws_delivery_failures.inc("publish_error")
+
+    async def broadcast(self, topic: str, data: dict):
+        notification = json.dumps({"origin": self.worker_id, "topic": topic, "data": data}, separators=(",", ":"))
+        try:
+            async with self._pool.acquire() as conn:
+                await conn.execute("SELECT pg_notify($1, $2)", self.CHANNEL, notification)
+        except Exception as e:
+            logger.error(f"Fan-out broadcast of {topic} failed: {e}")
+
+def create_fanout_backend() -> FanoutBackend:
+    kind = os.getenv("CHAT_FANOUT_BACKEND", "local")
+    if kind == "local":
+        return LocalFanout()
+    if kind == "postgres":
+        url = os.getenv("CHAT_FANOUT_URL") or os.getenv("DATABASE_URL")
+        if url is None:
+            raise ValueError("CHAT_FANOUT_URL or DATABASE_URL must be set for the postgres fan-out backend")
+        return PostgresFanout(url)
+    raise ValueError(f"Unknown CHAT_FANOUT_BACKEND: {kind}")
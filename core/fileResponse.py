@@ -0,0 +1,34 @@
+from starlette.responses import FileResponse
+from starlette.types import Receive, Scope, Send
+
+# FileResponse (which already handles Range/If-Range and HEAD) that hands the file
+# descriptor to the server for sendfile when it offers the zerocopysend extension,
+# instead of reading the file through Python in 64 KiB chunks
+class ZeroCopyFileResponse(FileResponse):
+    zerocopy = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.zerocopy = "http.response.zerocopysend" in (scope.get("extensions") or {})
+        await super().__call__(scope, receive, send)
+
+    async def _handle_simple(self, send: Send, send_header_only: bool) -> None:
+        if not self.zerocopy or send_header_only:
+            return await super()._handle_simple(send, send_header_only)
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        with open(self.path, "rb") as file:
+            await send({"type": "http.response.zerocopysend", "file": file, "more_body": False})
+
+    async def _handle_single_range(self, send: Send, start: int, end: int, file_size: int, send_header_only: bool) -> None:
+        if not self.zerocopy or send_header_only:
+            return await super()._handle_single_range(send, start, end, file_size, send_header_only)
+        self.headers["content-range"] = f"bytes {start}-{end - 1}/{file_size}"
+        self.headers["content-length"] = str(end - start)
+        await send({"type": "http.response.start", "status": 206, "headers": self.raw_headers})
+        with open(self.path, "rb") as file:
+            await send({
+                "type": "http.response.zerocopysend",
+                "file": file,
+                "offset": start,
+                "count": end - start,
+                "more_body": False,
+            })
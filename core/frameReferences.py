@@ -0,0 +1,39 @@
+from typing import Optional
+from core.messageSerializer import group_frame, live_frame
+from crud.GroupCrud import get_group_message_copy
+from crud.MessageCrud import get_messages_by_id
+from database import async_session
+import orjson
+
+# Frames too large for a NOTIFY cross workers as a reference to the rows they were
+# built from; the receiving worker loads those rows from the primary (the publisher
+# has committed before it publishes) and builds the same frame for the same user.
+
+# None for frames that are not built from stored messages
+def frame_reference(payload: str) -> Optional[dict]:
+    data = orjson.loads(payload)
+    kind = data.get("type")
+    if kind is None and "id" in data:
+        return {"messages": [data["id"]]}
+    if kind == "messages":
+        return {"messages": [message["id"] for message in data["messages"]], "grouped": True}
+    if kind == "group_message":
+        return {"group_message": data["id"]}
+    return None
+
+# the JSON text frame `user_id` was sent, or None if the rows are not there for them
+async def load_frame(user_id: int, reference: dict) -> Optional[str]:
+    async with async_session() as db:
+        if "group_message" in reference:
+            found = await get_group_message_copy(db, reference["group_message"], user_id)
+            return orjson.dumps(group_frame(*found)).decode() if found else None
+        messages = [
+            live_frame(msg, msg.sender_encrypted if msg.sender_id == user_id else msg.receiver_encrypted, msg.attachment.id if msg.attachment else None)
+            for msg in await get_messages_by_id(db, reference["messages"])
+            if user_id in (msg.sender_id, msg.receiver_id)
+        ]
+    if not messages:
+        return None
+    if reference.get("grouped"):
+        return orjson.dumps({"type": "messages", "messages": messages}).decode()
+    return orjson.dumps(messages[0]).decode()
@@ -0,0 +1,43 @@
+from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.chatHub import ChatHub
+from crud.GroupCrud import create_group_message, get_member_role, get_members, lock_group
+from core.messageSerializer import group_frame
+from models.GroupMessage import GroupMessage
+from schemas.GroupSchema import GroupMessageCreate
+import os
+
+GROUP_MAX_MEMBERS = int(os.getenv("GROUP_MAX_MEMBERS", "512"))
+
+# Membership is read from the primary on every write and history read, never from a
+# per-worker cache: a removed member must lose access at once on every worker. It is
+# one indexed lookup per request whatever the group size.
+
+# the caller's role; non-members get the same 404 as a group that does not exist
+async def require_member(db: AsyncSession, group_id: int, user_id: int) -> str:
+    role = await get_member_role(db, group_id, user_id)
+    if role is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail={"message": "group not found"})
+    return role
+
+# stores the message once with a payload per member, then hands every member their
+# own frame in a single fan-out. The member list is read under a share lock on the
+# group (see lock_group) and held until the insert commits, so a sender working from
+# a stale list gets a 409 and a member removed concurrently either is not in the list
+# or is removed only after this message, which they were still a member for.
+async def send_group_message(db: AsyncSession, chat_hub: ChatHub, group_id: int, sender_id: int, payload: GroupMessageCreate) -> GroupMessage:
+    members = await get_members(db, group_id) if await lock_group(db, group_id) else {}
+    if sender_id not in members:
+        await db.rollback()
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail={"message": "group not found"})
+    if set(payload.payloads) != set(members):
+        await db.rollback()
+        raise HTTPException(
+            status.HTTP_409_CONFLICT,
+            detail={"message": "payloads must cover exactly the current members", "member_ids": sorted(members)},
+        )
+    message = await create_group_message(db, group_id, sender_id, payload.payloads, payload.messageType)
+    await chat_hub.send_many({
+        user_id: group_frame(message, content) for user_id, content in payload.payloads.items()
+    })
+    return message
@@ -0,0 +1,102 @@
+from typing import Optional
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from database import async_session
+from models.Message import Message
+from schemas.MessageSchema import MessageCreate
+from crud.MessageCrud import create_messages_bulk
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+WRITE_BATCH_SIZE = int(os.getenv("CHAT_WRITE_BATCH_SIZE", "128"))
+WRITE_BATCH_WINDOW = float(os.getenv("CHAT_WRITE_BATCH_WINDOW_MS", "5")) / 1000
+
+# group commit for WebSocket sends: messages from every socket are collected for at
+# most `window` seconds (or until `max_batch` are waiting) and stored in one
+# transaction; each submitter is resumed with its own Message or error
+class MessageBatcher:
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        max_batch: int = WRITE_BATCH_SIZE,
+        window: float = WRITE_BATCH_WINDOW,
+    ) -> None:
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.window = window
+        self._pending: list[tuple[MessageCreate, int, asyncio.Future]] = []
+        self._has_items = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._pending:
+            await self._flush(self._take())
+
+    async def submit(self, payload: MessageCreate, senderID: int) -> Message:
+        await self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((payload, senderID, future))
+        self._has_items.set()
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+        return await future
+
+    def _take(self) -> list[tuple[MessageCreate, int, asyncio.Future]]:
+        batch = self._pending[:self.max_batch]
+        self._pending = self._pending[self.max_batch:]
+        if not self._pending:
+            self._has_items.clear()
+        if len(self._pending) < self.max_batch:
+            self._full.clear()
+        return batch
+
+    async def _run(self):
+        while True:
+            await self._has_items.wait()
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.window)
+            except asyncio.TimeoutError:
+                pass
+            await self._flush(self._take())
+
+    async def _flush(self, batch: list[tuple[MessageCreate, int, asyncio.Future]]):
+        if not batch:
+            return
+        results = None
+        try:
+            async with self.session_factory() as db:
+                results = await create_messages_bulk(db, [(payload, senderID) for payload, senderID, _ in batch])
+        except Exception as e:
+            logger.error(f"Batched message write failed: {e}")
+            results = [e] * len(batch)
+        finally:
+            # cancelled mid-write by stop(): whether it committed is unknown, but the
+            # submitters must not wait forever
+            if results is None:
+                results = [RuntimeError("message batcher stopped before the write finished")] * len(batch)
+            for (_, _, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+messageBatcher = MessageBatcher(async_session)
+
+def get_messageBatcher():
+    return messageBatcher
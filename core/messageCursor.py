@@ -0,0 +1,48 @@
+from fastapi import HTTPException, status
+from datetime import datetime, timezone
+from typing import Optional
+import base64
+
+# stored timestamps are UTC; SQLite hands them back naive
+def _as_utc(timestamp: datetime) -> datetime:
+    return timestamp if timestamp.tzinfo else timestamp.replace(tzinfo=timezone.utc)
+
+# opaque keyset cursor over (timestamp, id): stable under concurrent inserts,
+# unlike offsets or bare timestamps
+def encode_cursor(timestamp: datetime, message_id: int) -> str:
+    raw = f"{timestamp.isoformat()}|{message_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: Optional[str]) -> Optional[tuple[datetime, int]]:
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, message_id = raw.rsplit("|", 1)
+        return _as_utc(datetime.fromisoformat(timestamp)), int(message_id)
+    except Exception:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail={"message": "invalid cursor"})
+
+# largest value of the int4 id column
+MAX_MESSAGE_ID = 2**31 - 1
+
+# inclusive upper bound for mark-as-read: a cursor, or a timestamp meaning every
+# message up to and including that instant
+def decode_until(until: str) -> tuple[datetime, int]:
+    try:
+        return _as_utc(datetime.fromisoformat(until)), MAX_MESSAGE_ID
+    except ValueError:
+        cursor = decode_cursor(until)
+        if cursor is None:
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, detail={"message": "invalid cursor"})
+        return cursor
+
+# reconnecting clients may also send the timestamp of the last live frame they saw;
+# that message is then replayed once rather than risking a gap
+def decode_since(since: Optional[str]) -> Optional[tuple[datetime, int]]:
+    if not since:
+        return None
+    try:
+        return _as_utc(datetime.fromisoformat(since)), 0
+    except ValueError:
+        return decode_cursor(since)
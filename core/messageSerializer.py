@@ -0,0 +1,68 @@
+from fastapi import Response
+from typing import Optional
+from models.GroupMessage import GroupMessage
+from models.Message import Message
+from models.User import User
+import orjson
+
+# Rows go straight to JSON bytes instead of through a pydantic model per row plus
+# FastAPI's response_model re-validation and stdlib encoder. Key order follows the
+# MessageResponse / MessageChatList aliases, and OPT_UTC_Z matches pydantic's
+# datetime format, so the bytes are the same as the response_model path.
+JSON_OPTIONS = orjson.OPT_UTC_Z
+
+def message_row(msg: Message, user_id: int) -> dict:
+    return {
+        "sender_id": msg.sender_id,
+        "receiver_id": msg.receiver_id,
+        "content": msg.sender_encrypted if msg.sender_id == user_id else msg.receiver_encrypted,
+        "message_type": msg.message_type,
+        "attachment_id": msg.attachment.id if msg.attachment else None,
+        "timestamp": msg.timestamp,
+    }
+
+# what ChatHub delivers for one message; `content` is the recipient's ciphertext.
+# `id` matches the one in sync frames, so a message that lands while a reconnect is
+# syncing (and so arrives both ways) can be dropped by the client
+def live_frame(msg: Message, content: str, attachment_id: Optional[int]) -> dict:
+    return {
+        "id": msg.id,
+        "sender_id": msg.sender_id,
+        "receiver_id": msg.receiver_id,
+        "content": content,
+        "message_type": msg.message_type,
+        "attachment_id": attachment_id,
+        "timestamp": msg.timestamp.isoformat(),
+    }
+
+def group_frame(message: GroupMessage, content: str) -> dict:
+    return {
+        "type": "group_message",
+        "id": message.id,
+        "group_id": message.group_id,
+        "sender_id": message.sender_id,
+        "content": content,
+        "message_type": message.message_type,
+        "timestamp": message.timestamp.isoformat(),
+    }
+
+def serialize_messages(messages: list[Message], user_id: int) -> bytes:
+    return orjson.dumps([message_row(msg, user_id) for msg in messages], option=JSON_OPTIONS)
+
+def serialize_chat_list(rows: list[tuple[User, Message, int]], user_id: int) -> bytes:
+    return orjson.dumps([
+        {
+            "partner": {
+                "id": partner.id,
+                "user_name": partner.user_name,
+                "public_key": partner.public_key,
+            },
+            "message": message_row(msg, user_id),
+            "unread_count": unread_count,
+        } for partner, msg, unread_count in rows
+    ], option=JSON_OPTIONS)
+
+# already-encoded JSON; returning a Response skips response_model validation,
+# while the route's response_model still documents the shape
+class RawJSONResponse(Response):
+    media_type = "application/json"
@@ -0,0 +1,191 @@
+from contextvars import ContextVar
+from typing import Callable, Iterable, Optional
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import bisect
+import hmac
+import os
+import time
+
+# Small in-process Prometheus text-format metrics. Everything runs on the event loop,
+# so recording is a dict lookup and an add, with no locks; series are per worker.
+
+# scrapers send "Authorization: Bearer $METRICS_TOKEN"; with no token set /metrics stays closed
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        self.name, self.help, self.labels = name, help, labels
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}"
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+# read at scrape time, for values something else already tracks (pool, hub);
+# with labels the callback returns {label values: value}
+class CallbackGauge:
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, callback: Callable[[], object], labels: tuple[str, ...] = ()) -> None:
+        self.name, self.help, self.callback, self.labels = name, help, callback, labels
+
+    def samples(self) -> Iterable[str]:
+        if not self.labels:
+            yield f"{self.name} {_format_value(self.callback())}"
+            return
+        for labels, value in self.callback().items():
+            yield f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}"
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.name, self.help, self.labels = name, help, labels
+        self.buckets = tuple(buckets)
+        # per label set: [per-bucket counts (non-cumulative, +Inf last), sum]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def samples(self) -> Iterable[str]:
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                yield f"{self.name}_bucket{_format_labels(self.labels, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labels, labels)} {cumulative}"
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: list = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+http_requests = registry.register(Counter("http_requests_total", "HTTP requests served", ("method", "route", "status")))
+http_latency = registry.register(Histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route")))
+http_in_flight = registry.register(Gauge("http_requests_in_flight", "HTTP requests currently being served"))
+db_queries = registry.register(Histogram("http_request_db_queries", "SQL statements executed per HTTP request", ("method", "route"), QUERY_BUCKETS))
+db_statements = registry.register(Counter("db_statements_total", "SQL statements executed by this worker, HTTP or not"))
+ws_messages_in = registry.register(Counter("ws_messages_received_total", "Chat messages received over WebSockets"))
+ws_frames_out = registry.register(Counter("ws_frames_sent_total", "Frames written to WebSockets by this worker"))
+ws_throttled = registry.register(Counter("ws_throttled_total", "Inbound WebSocket frames dropped by the rate limiter"))
+ws_reaped = registry.register(Counter("ws_reaped_total", "Sockets reaped by the ChatHub sweeper", ("reason",)))
+ws_delivery_failures = registry.register(Counter("ws_delivery_failures_total", "Frames that could not be delivered, by reason", ("reason",)))
+presence_changes = registry.register(Counter("presence_changes_total", "Presence changes broadcast, by new state", ("state",)))
+presence_frames = registry.register(Counter("presence_frames_published_total", "Batched presence frames published to partners"))
+
+# a one-element list per request so statements run in SQLAlchemy's greenlets,
+# which share the request task's context, can bump it in place
+_query_counter: ContextVar[Optional[list]] = ContextVar("query_counter", default=None)
+
+def count_query(*_):
+    db_statements.inc()
+    counter = _query_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+# engines by role, e.g. {"primary": engine, "replica": read_engine}
+def instrument_engines(engines: dict):
+    from sqlalchemy import event
+    for engine in engines.values():
+        event.listen(engine.sync_engine, "before_cursor_execute", count_query)
+
+    def pool_gauge(read):
+        return lambda: {(role,): read(engine.pool) for role, engine in engines.items()}
+
+    registry.register(CallbackGauge("db_pool_checked_out", "Pooled connections currently checked out", pool_gauge(lambda pool: pool.checkedout()), ("engine",)))
+    registry.register(CallbackGauge("db_pool_overflow", "Connections open beyond pool_size", pool_gauge(lambda pool: max(pool.overflow(), 0)), ("engine",)))
+    registry.register(CallbackGauge("db_pool_size", "Configured pool size", pool_gauge(lambda pool: pool.size()), ("engine",)))
+
+def instrument_chat_hub(hub):
+    registry.register(CallbackGauge("ws_connected_users", "Users with at least one socket on this worker", lambda: len(hub.active_connections)))
+    registry.register(CallbackGauge("ws_connected_sockets", "Open chat sockets on this worker", lambda: sum(len(conns) for conns in hub.active_connections.values())))
+    registry.register(CallbackGauge("ws_queued_frames", "Frames waiting in per-socket outbound queues", lambda: sum(conn.queue.qsize() for conns in hub.active_connections.values() for conn in conns.values())))
+
+# labels by route template (scope["route"] is set once routing has matched), so
+# path parameters never turn into new series
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status_code = 500
+        counter = [0]
+        token = _query_counter.set(counter)
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_in_flight.dec()
+            _query_counter.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            http_requests.inc(method, path, status_code)
+            http_latency.observe(elapsed, method, path)
+            db_queries.observe(counter[0], method, path)
+
+def is_metrics_scraper(authorization: Optional[str]) -> bool:
+    if not METRICS_TOKEN or not authorization:
+        return False
+    scheme, _, token = authorization.partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(token.strip().encode(), METRICS_TOKEN.encode())
+
+def render_metrics() -> str:
+    return registry.render()
@@ -0,0 +1,257 @@
+from typing import Dict, Iterable, Optional, Set
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from core.authCache import TTLCache
+from core.chatHub import ChatHub, Connection, chatHub
+from core.metrics import presence_changes, presence_frames
+from crud.ConversationCrud import get_partner_ids
+from database import read_session
+import asyncio
+import logging
+import os
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# changes are collected and broadcast once per interval; a user whose last socket
+# closes is only reported offline if they stay away for the grace period
+PRESENCE_FLUSH_INTERVAL = float(os.getenv("PRESENCE_FLUSH_INTERVAL", "1"))
+PRESENCE_OFFLINE_GRACE = float(os.getenv("PRESENCE_OFFLINE_GRACE", "5"))
+PRESENCE_AUDIENCE_TTL = float(os.getenv("PRESENCE_AUDIENCE_TTL", "60"))
+PRESENCE_AUDIENCE_CACHE_SIZE = int(os.getenv("PRESENCE_AUDIENCE_CACHE_SIZE", "50000"))
+# how often a worker re-announces everyone connected to it; another worker's states
+# expire after three intervals without hearing from it, e.g. after it crashed
+PRESENCE_ANNOUNCE_INTERVAL = float(os.getenv("PRESENCE_ANNOUNCE_INTERVAL", "30"))
+
+# broadcast topic, data {"worker", "states": {user_id: state}}
+PRESENCE_CHANGED = "presence_changed"
+# users per broadcast, keeps NOTIFY payloads well under their 8000 byte limit
+ANNOUNCE_CHUNK = 200
+
+ONLINE = "online"
+AWAY = "away"
+OFFLINE = "offline"
+
+# Online if any socket is online, away if every socket reported away, offline with
+# no sockets. Partners (users sharing a conversation) whose sockets opted in get one
+# {"type": "presence", "users": [{"user_id", "state"}, ...]} frame per flush listing
+# only states that differ from what they were last told, so flaps inside the grace
+# period or a single interval cost nothing. Each worker announces the states of its
+# own sockets to the others over the fan-out backend and merges theirs in, then
+# delivers to the partners connected to it.
+class PresenceService:
+    def __init__(
+        self,
+        hub: ChatHub,
+        session_factory: async_sessionmaker,
+        flush_interval: float = PRESENCE_FLUSH_INTERVAL,
+        offline_grace: float = PRESENCE_OFFLINE_GRACE,
+        audience_ttl: float = PRESENCE_AUDIENCE_TTL,
+        announce_interval: float = PRESENCE_ANNOUNCE_INTERVAL,
+    ) -> None:
+        self.hub = hub
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.offline_grace = offline_grace
+        self.announce_interval = announce_interval
+        self.worker_id = uuid.uuid4().hex
+        self.audiences = TTLCache(maxsize=PRESENCE_AUDIENCE_CACHE_SIZE, ttl=audience_ttl)
+        # what partners were last told; missing means offline
+        self.published: Dict[int, str] = {}
+        # this worker's own states as last announced to the others; missing means offline
+        self.announced: Dict[int, str] = {}
+        # user id -> worker id -> (state, expires at) for sockets on other workers
+        self.remote: Dict[int, Dict[str, tuple[str, float]]] = {}
+        self._next_announce = 0.0
+        self._dirty: Set[int] = set()
+        self._left_at: Dict[int, float] = {}
+        self._snapshots: list[Connection] = []
+        self._task: Optional[asyncio.Task] = None
+        hub.add_listener(self)
+        hub.subscribe(PRESENCE_CHANGED, self._on_remote)
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # spare the other workers the expiry wait
+        if self.announced:
+            await self._announce({user_id: OFFLINE for user_id in self.announced})
+            self.announced.clear()
+
+    def connected(self, conn: Connection):
+        self._left_at.pop(conn.user_id, None)
+        self._dirty.add(conn.user_id)
+        # a new socket has missed every earlier broadcast
+        self._snapshots.append(conn)
+
+    def disconnected(self, conn: Connection):
+        if conn.user_id not in self.hub.active_connections:
+            self._left_at[conn.user_id] = time.monotonic()
+        self._dirty.add(conn.user_id)
+
+    def set_state(self, conn: Connection, state: str):
+        conn.presence = state
+        self._dirty.add(conn.user_id)
+
+    def local_state(self, user_id: int) -> str:
+        conns = self.hub.active_connections.get(user_id)
+        if not conns:
+            return OFFLINE
+        return ONLINE if any(conn.presence == ONLINE for conn in conns.values()) else AWAY
+
+    # merged over every worker holding one of the user's sockets
+    def current(self, user_id: int) -> str:
+        states = {self.local_state(user_id)}
+        states.update(state for state, _ in self.remote.get(user_id, {}).values())
+        if ONLINE in states:
+            return ONLINE
+        return AWAY if AWAY in states else OFFLINE
+
+    def _on_remote(self, data: dict):
+        worker = data["worker"]
+        if worker == self.worker_id:
+            return
+        expires_at = time.monotonic() + 3 * self.announce_interval
+        for key, state in data["states"].items():
+            user_id = int(key)
+            workers = self.remote.setdefault(user_id, {})
+            if state == OFFLINE:
+                workers.pop(worker, None)
+                if not workers:
+                    del self.remote[user_id]
+            else:
+                workers[worker] = (state, expires_at)
+            self._dirty.add(user_id)
+
+    def _expire(self, now: float):
+        for user_id in list(self.remote):
+            workers = self.remote[user_id]
+            for worker in [worker for worker, (_, expires_at) in workers.items() if expires_at <= now]:
+                del workers[worker]
+                self._dirty.add(user_id)
+            if not workers:
+                del self.remote[user_id]
+
+    async def _announce(self, states: dict[int, str]):
+        items = list(states.items())
+        for start in range(0, len(items), ANNOUNCE_CHUNK):
+            await self.hub.broadcast(PRESENCE_CHANGED, {"worker": self.worker_id, "states": dict(items[start:start + ANNOUNCE_CHUNK])})
+
+    def state_of(self, user_id: int) -> str:
+        return self.published.get(user_id, OFFLINE)
+
+    def _subscribers(self, user_id: int) -> list[Connection]:
+        return [conn for conn in self.hub.active_connections.get(user_id, {}).values() if conn.wants_presence]
+
+    async def partners_of(self, user_ids: Iterable[int]) -> dict[int, list[int]]:
+        found, missing = {}, []
+        for user_id in user_ids:
+            partners = self.audiences.get(user_id)
+            if partners is None:
+                missing.append(user_id)
+            else:
+                found[user_id] = partners
+        if missing:
+            async with self.session_factory() as db:
+                loaded = await get_partner_ids(db, missing)
+            for user_id in missing:
+                found[user_id] = loaded.get(user_id, [])
+                self.audiences.set(user_id, found[user_id])
+        return found
+
+    # (merged changes to publish, this worker's own changes to announce)
+    def _collect(self, now: float) -> tuple[dict[int, str], dict[int, str]]:
+        changes, local_changes, waiting = {}, {}, set()
+        for user_id in self._dirty:
+            local = self.local_state(user_id)
+            left_at = self._left_at.get(user_id)
+            if local == OFFLINE and left_at is not None:
+                if now - left_at < self.offline_grace:
+                    waiting.add(user_id)
+                    continue
+                del self._left_at[user_id]
+            if local != self.announced.get(user_id, OFFLINE):
+                local_changes[user_id] = local
+            state = self.current(user_id)
+            if state != self.state_of(user_id):
+                changes[user_id] = state
+        self._dirty = waiting
+        return changes, local_changes
+
+    async def flush(self, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        full = now >= self._next_announce
+        if full:
+            self._next_announce = now + self.announce_interval
+            self._expire(now)
+        changes, local_changes = self._collect(now)
+        for user_id, state in local_changes.items():
+            if state == OFFLINE:
+                self.announced.pop(user_id, None)
+            else:
+                self.announced[user_id] = state
+        # a full announce refreshes the other workers' expiry for everyone still here
+        outgoing_states = {**self.announced, **local_changes} if full else local_changes
+        if outgoing_states:
+            await self._announce(outgoing_states)
+
+        snapshots, self._snapshots = self._snapshots, []
+        snapshots = [conn for conn in snapshots if conn.wants_presence and conn.websocket in self.hub.active_connections.get(conn.user_id, {})]
+        if not changes and not snapshots:
+            return
+        try:
+            audiences = await self.partners_of(set(changes) | {conn.user_id for conn in snapshots})
+        except Exception:
+            # try again next interval
+            self._dirty.update(changes)
+            self._snapshots = snapshots + self._snapshots
+            raise
+
+        outgoing: dict[int, list[dict]] = {}
+        for user_id, state in changes.items():
+            if state == OFFLINE:
+                self.published.pop(user_id, None)
+            else:
+                self.published[user_id] = state
+            presence_changes.inc(state)
+            for partner_id in audiences[user_id]:
+                outgoing.setdefault(partner_id, []).append({"user_id": user_id, "state": state})
+
+        for partner_id, users in outgoing.items():
+            for conn in self._subscribers(partner_id):
+                self.hub.send_to_connection(conn, {"type": "presence", "users": users})
+                presence_frames.inc()
+
+        # everything a new socket needs in one frame; partners not listed are offline
+        for conn in snapshots:
+            self.hub.send_to_connection(conn, {
+                "type": "presence",
+                "snapshot": True,
+                "users": [
+                    {"user_id": partner_id, "state": self.state_of(partner_id)}
+                    for partner_id in audiences[conn.user_id]
+                    if self.state_of(partner_id) != OFFLINE
+                ],
+            })
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Presence flush failed: {e}")
+
+presenceService = PresenceService(chatHub, read_session)
+
+def get_presenceService():
+    return presenceService
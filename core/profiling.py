@@ -0,0 +1,191 @@
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Optional
+from starlette.types import ASGIApp, Receive, Scope, Send
+import heapq
+import hmac
+import itertools
+import os
+import random
+import time
+
+# Opt-in per-request profiles. With PROFILE_ENABLED off the middleware and admin
+# routes are not installed and section()/profiled() hand back a shared no-op
+# context manager, so instrumented code pays one global lookup.
+PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "false").lower() == "true"
+# fraction of requests / WebSocket messages profiled without being asked
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# sent as X-Profile-Token to force a profile and to read /admin/profiles
+PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN")
+PROFILE_HEADER = "x-profile-token"
+# recent durations kept per route for percentiles
+PROFILE_HISTORY = int(os.getenv("PROFILE_HISTORY", "1000"))
+PROFILE_SLOWEST = int(os.getenv("PROFILE_SLOWEST", "20"))
+
+SECTIONS = ("db", "serialization", "crypto")
+
+class Profile:
+    __slots__ = ("name", "sections", "queries")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.sections = dict.fromkeys(SECTIONS, 0.0)
+        self.queries = 0
+
+_current: ContextVar[Optional[Profile]] = ContextVar("profile", default=None)
+_noop = nullcontext()
+
+class _Section:
+    __slots__ = ("name", "profile", "started")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self):
+        self.profile = _current.get()
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        if self.profile is not None:
+            self.profile.sections[self.name] += time.perf_counter() - self.started
+
+# time spent inside the block is charged to `name` on the current profile, if any
+def section(name: str):
+    if not PROFILE_ENABLED:
+        return _noop
+    return _Section(name)
+
+def is_profile_admin(token: Optional[str]) -> bool:
+    return bool(PROFILE_ADMIN_TOKEN and token and hmac.compare_digest(token, PROFILE_ADMIN_TOKEN))
+
+def _should_sample(forced: bool) -> bool:
+    return forced or (PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE)
+
+class _RouteStats:
+    def __init__(self, history: int) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.queries = 0
+        self.sections = dict.fromkeys(SECTIONS, 0.0)
+        self.durations: deque[float] = deque(maxlen=history)
+
+class ProfileStore:
+    def __init__(self, history: int = PROFILE_HISTORY, slowest: int = PROFILE_SLOWEST) -> None:
+        self.history = history
+        self.slowest_size = slowest
+        self.reset()
+
+    def reset(self):
+        self.routes: dict[str, _RouteStats] = {}
+        self.slowest: list[tuple[float, int, dict]] = []
+        self._seq = itertools.count()
+
+    def record(self, profile: Profile, elapsed: float):
+        stats = self.routes.get(profile.name)
+        if stats is None:
+            stats = self.routes[profile.name] = _RouteStats(self.history)
+        stats.count += 1
+        stats.total += elapsed
+        stats.queries += profile.queries
+        stats.durations.append(elapsed)
+        for name, spent in profile.sections.items():
+            stats.sections[name] += spent
+
+        sample = (elapsed, next(self._seq), {"name": profile.name, "queries": profile.queries, **_breakdown_ms(profile.sections, elapsed)})
+        if len(self.slowest) < self.slowest_size:
+            heapq.heappush(self.slowest, sample)
+        elif elapsed > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, sample)
+
+    # routes ordered by total time spent, i.e. hottest first
+    def report(self) -> dict:
+        routes = []
+        for name, stats in sorted(self.routes.items(), key=lambda item: item[1].total, reverse=True):
+            durations = sorted(stats.durations)
+            routes.append({
+                "name": name,
+                "count": stats.count,
+                "total_ms": round(stats.total * 1000, 2),
+                "mean_ms": round(stats.total / stats.count * 1000, 3),
+                "p50_ms": round(durations[len(durations) // 2] * 1000, 3),
+                "p99_ms": round(durations[min(len(durations) - 1, int(len(durations) * 0.99))] * 1000, 3),
+                "queries_per_call": round(stats.queries / stats.count, 2),
+                "mean_breakdown_ms": {
+                    key: round(value / stats.count, 3)
+                    for key, value in _breakdown_ms(stats.sections, stats.total).items()
+                },
+                "share_pct": {
+                    key: round(value / (stats.total * 1000) * 100, 1) if stats.total else 0.0
+                    for key, value in _breakdown_ms(stats.sections, stats.total).items()
+                    if key != "total"
+                },
+            })
+        slowest = [sample for _, _, sample in sorted(self.slowest, reverse=True)]
+        return {"sample_rate": PROFILE_SAMPLE_RATE, "routes": routes, "slowest": slowest}
+
+# whatever is not db, serialization or crypto is charged to the handler itself
+def _breakdown_ms(sections: dict[str, float], elapsed: float) -> dict[str, float]:
+    breakdown = {name: spent * 1000 for name, spent in sections.items()}
+    breakdown["handler"] = max(elapsed * 1000 - sum(breakdown.values()), 0.0)
+    breakdown["total"] = elapsed * 1000
+    return {key: round(value, 3) for key, value in breakdown.items()}
+
+profile_store = ProfileStore()
+
+@contextmanager
+def _profiled(name: str):
+    profile = Profile(name)
+    token = _current.set(profile)
+    started = time.perf_counter()
+    try:
+        yield profile
+    finally:
+        _current.reset(token)
+        profile_store.record(profile, time.perf_counter() - started)
+
+# profiles the block when sampled (or forced by an admin); used per WebSocket message
+def profiled(name: str, forced: bool = False):
+    if not PROFILE_ENABLED or not _should_sample(forced):
+        return _noop
+    return _profiled(name)
+
+# statement execution, driver awaits included, is charged to "db"
+def instrument_engines(engines: dict):
+    from sqlalchemy import event
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["profile_started"].pop()
+        profile = _current.get()
+        if profile is not None:
+            profile.sections["db"] += time.perf_counter() - started
+            profile.queries += 1
+
+    for engine in engines.values():
+        event.listen(engine.sync_engine, "before_cursor_execute", before)
+        event.listen(engine.sync_engine, "after_cursor_execute", after)
+
+class ProfilingMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        token = next((value.decode() for key, value in scope["headers"] if key == PROFILE_HEADER.encode()), None)
+        if not _should_sample(is_profile_admin(token)):
+            return await self.app(scope, receive, send)
+
+        profile = Profile("unmatched")
+        context_token = _current.set(profile)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current.reset(context_token)
+            route = scope.get("route")
+            profile.name = f'{scope["method"]} {getattr(route, "path", "unmatched")}'
+            profile_store.record(profile, time.perf_counter() - started)
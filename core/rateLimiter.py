@@ -0,0 +1,142 @@
+from abc import ABC, abstractmethod
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from database import async_session
+from crud.RateLimitCrud import get_bucket, prune_buckets, take_tokens
+from typing import Optional
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# sustained messages per second per user, and how many may arrive back to back; 0 disables
+CHAT_RATE_LIMIT = float(os.getenv("CHAT_RATE_LIMIT", "5"))
+CHAT_RATE_BURST = float(os.getenv("CHAT_RATE_BURST", "20"))
+# "local" keeps buckets per worker, "database" shares them through the rate_limits table
+CHAT_RATE_LIMIT_BACKEND = os.getenv("CHAT_RATE_LIMIT_BACKEND", "local")
+# seconds between sweeps of full buckets out of the rate_limits table
+CHAT_RATE_PRUNE_INTERVAL = float(os.getenv("CHAT_RATE_PRUNE_INTERVAL", "60"))
+
+# token bucket per user; acquire() returns 0 when the frame may go ahead, otherwise
+# how many seconds until `cost` tokens will be available
+class RateLimiter(ABC):
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    @abstractmethod
+    async def acquire(self, user_id: int, cost: float = 1) -> float:
+        ...
+
+    # a batch pays per message, capped at the burst so that any batch can get through
+    # once the bucket is full
+    def batch_cost(self, count: int) -> float:
+        return min(count, self.burst)
+
+    def _retry_after(self, tokens: float, cost: float) -> float:
+        return max(cost - tokens, 0) / self.rate
+
+class LocalRateLimiter(RateLimiter):
+    def __init__(self, rate: float, burst: float, max_users: int = 100000) -> None:
+        super().__init__(rate, burst)
+        self.max_users = max_users
+        self._buckets: dict[int, tuple[float, float]] = {}
+
+    async def acquire(self, user_id: int, cost: float = 1) -> float:
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(user_id, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+        if tokens >= cost:
+            self._buckets[user_id] = (tokens - cost, now)
+            if len(self._buckets) > self.max_users:
+                self._prune(now)
+            return 0.0
+        self._buckets[user_id] = (tokens, now)
+        return self._retry_after(tokens, cost)
+
+    # a bucket that has refilled completely is the same as no bucket at all
+    def _prune(self, now: float):
+        self._buckets = {
+            user_id: (tokens, updated_at)
+            for user_id, (tokens, updated_at) in self._buckets.items()
+            if tokens + (now - updated_at) * self.rate < self.burst
+        }
+
+# one upsert per frame against the primary; fails open so a database hiccup
+# slows nobody down more than it already does. Every worker deletes full buckets
+# every `prune_interval` seconds, so the table only holds recently active users
+class DatabaseRateLimiter(RateLimiter):
+    def __init__(self, session_factory: async_sessionmaker, rate: float, burst: float, prune_interval: float = CHAT_RATE_PRUNE_INTERVAL) -> None:
+        super().__init__(rate, burst)
+        self.session_factory = session_factory
+        self.prune_interval = prune_interval
+        self._pruner: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self.rate > 0 and (self._pruner is None or self._pruner.done()):
+            self._pruner = asyncio.create_task(self._prune_loop())
+
+    async def stop(self):
+        if self._pruner is not None:
+            self._pruner.cancel()
+            try:
+                await self._pruner
+            except asyncio.CancelledError:
+                pass
+            self._pruner = None
+
+    async def _prune_loop(self):
+        while True:
+            await asyncio.sleep(self.prune_interval)
+            await self.prune()
+
+    async def prune(self) -> int:
+        try:
+            async with self.session_factory() as db:
+                pruned = await prune_buckets(db, self.rate, self.burst, time.time())
+                await db.commit()
+                return pruned
+        except Exception as e:
+            logger.error(f"Pruning rate limit buckets failed: {e}")
+            return 0
+
+    async def acquire(self, user_id: int, cost: float = 1) -> float:
+        if self.rate <= 0:
+            return 0.0
+        key = f"ws:{user_id}"
+        now = time.time()
+        try:
+            async with self.session_factory() as db:
+                left = await take_tokens(db, key, self.rate, self.burst, cost, now)
+                await db.commit()
+                if left is not None:
+                    return 0.0
+                bucket = await get_bucket(db, key)
+        except Exception as e:
+            logger.error(f"Rate limiter unavailable, letting frame through: {e}")
+            return 0.0
+        if bucket is None:
+            return 0.0
+        tokens, updated_at = bucket
+        return self._retry_after(min(self.burst, tokens + (now - updated_at) * self.rate), cost)
+
+def create_rate_limiter() -> RateLimiter:
+    if CHAT_RATE_LIMIT_BACKEND == "local":
+        return LocalRateLimiter(CHAT_RATE_LIMIT, CHAT_RATE_BURST)
+    if CHAT_RATE_LIMIT_BACKEND == "database":
+        return DatabaseRateLimiter(async_session, CHAT_RATE_LIMIT, CHAT_RATE_BURST)
+    raise ValueError(f"Unknown CHAT_RATE_LIMIT_BACKEND: {CHAT_RATE_LIMIT_BACKEND}")
+
+rateLimiter = create_rate_limiter()
+
+def get_rateLimiter():
+    return rateLimiter
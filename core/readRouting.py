@@ -0,0 +1,36 @@
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncIterator, Annotated, Iterable
+from core.authCache import TTLCache
+from core.authentication import get_current_user
+from database import async_session, read_session, session_scope
+from models.User import User
+import os
+
+# how long after writing a user's reads stay on the primary; should cover replica lag
+READ_YOUR_WRITES_WINDOW = float(os.getenv("DB_READ_YOUR_WRITES_WINDOW", "5"))
+
+# user id -> True while that user's own writes may not have reached the replica.
+# Per worker: a read landing on another worker inside the window can still lag.
+recent_writers = TTLCache(
+    maxsize=int(os.getenv("DB_RECENT_WRITERS_SIZE", "100000")),
+    ttl=READ_YOUR_WRITES_WINDOW,
+)
+
+def note_writes(user_ids: Iterable[int]):
+    for user_id in user_ids:
+        recent_writers.set(user_id, True)
+
+# USER_CHANGED from another worker: that user's row was just written there, so this
+# worker must not read it back from the replica within the window either
+def note_user_changed(data: dict):
+    note_writes([data["user_id"]])
+
+def reads_from_primary(user_id: int) -> bool:
+    return recent_writers.get(user_id) is not None
+
+# replica session for the current user, or the primary right after their own writes
+async def get_user_read_db(user: Annotated[User, Depends(get_current_user)]) -> AsyncIterator[AsyncSession]:
+    factory = async_session if reads_from_primary(user.id) else read_session
+    async for session in session_scope(factory):
+        yield session
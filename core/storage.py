@@ -0,0 +1,79 @@
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Optional
+from fastapi import HTTPException, status
+import anyio
+import os
+import uuid
+
+ATTACHMENT_STORAGE = os.getenv("ATTACHMENT_STORAGE", "local")
+ATTACHMENT_STORAGE_DIR = os.getenv("ATTACHMENT_STORAGE_DIR", "attachments")
+ATTACHMENT_MAX_BYTES = int(os.getenv("ATTACHMENT_MAX_BYTES", str(25 * 1024 * 1024)))
+
+# where encrypted attachment blobs live; the server never sees plaintext
+class StorageBackend(ABC):
+    def new_key(self) -> str:
+        return uuid.uuid4().hex
+
+    # writes the chunks under `key` as they arrive and returns the byte count
+    @abstractmethod
+    async def save(self, key: str, chunks: AsyncIterator[bytes], max_bytes: int) -> int:
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str):
+        ...
+
+    # a filesystem path lets downloads use sendfile and Range handling
+    def local_path(self, key: str) -> Optional[str]:
+        return None
+
+    # usually an async generator, so callers iterate it without awaiting
+    @abstractmethod
+    def iter_chunks(self, key: str) -> AsyncIterator[bytes]:
+        ...
+
+class LocalStorage(StorageBackend):
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, root: str) -> None:
+        self.root = os.path.abspath(root)
+
+    def local_path(self, key: str) -> str:
+        # two-level fan-out keeps directories small
+        return os.path.join(self.root, key[:2], key)
+
+    async def save(self, key: str, chunks: AsyncIterator[bytes], max_bytes: int) -> int:
+        path = self.local_path(key)
+        partial = f"{path}.part"
+        await anyio.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        size = 0
+        try:
+            async with await anyio.open_file(partial, "wb") as f:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise HTTPException(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail={"message": "attachment too large"})
+                    await f.write(chunk)
+            await anyio.Path(partial).rename(path)
+            return size
+        except BaseException:
+            await anyio.Path(partial).unlink(missing_ok=True)
+            raise
+
+    async def delete(self, key: str):
+        await anyio.Path(self.local_path(key)).unlink(missing_ok=True)
+
+    async def iter_chunks(self, key: str) -> AsyncIterator[bytes]:
+        async with await anyio.open_file(self.local_path(key), "rb") as f:
+            while chunk := await f.read(self.CHUNK_SIZE):
+                yield chunk
+
+def create_storage_backend() -> StorageBackend:
+    if ATTACHMENT_STORAGE == "local":
+        return LocalStorage(ATTACHMENT_STORAGE_DIR)
+    raise ValueError(f"Unknown ATTACHMENT_STORAGE: {ATTACHMENT_STORAGE}")
+
+storage = create_storage_backend()
+
+def get_storage():
+    return storage
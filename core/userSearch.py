@@ -0,0 +1,109 @@
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from fastapi import HTTPException, status
+from models.User import User
+from typing import Optional
+import base64
+import bisect
+import os
+import time
+
+USER_SEARCH_REFRESH = float(os.getenv("USER_SEARCH_REFRESH", "60"))
+
+# keyset cursor over (lower(user_name), id)
+def encode_user_cursor(user: User) -> str:
+    raw = f"{user.user_name.lower()}\0{user.id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_user_cursor(cursor: Optional[str]) -> Optional[tuple[str, int]]:
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        name, user_id = raw.rsplit("\0", 1)
+        return name, int(user_id)
+    except Exception:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail={"message": "invalid cursor"})
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+# Postgres: prefix and substring LIKE matches use the pg_trgm GIN index and keyset
+# order uses the (lower(user_name), id) btree, both from the add_user_search_indexes migration
+class PostgresUserSearch:
+    async def search(self, db: AsyncSession, term: str, mode: str, limit: int, after: Optional[tuple[str, int]]) -> list[User]:
+        name = func.lower(User.user_name)
+        query = select(User)
+        if term:
+            pattern = _escape_like(term.lower()) + "%"
+            if mode == "substring":
+                pattern = "%" + pattern
+            query = query.where(name.like(pattern, escape="\\"))
+        if after:
+            query = query.where((name > after[0]) | ((name == after[0]) & (User.id > after[1])))
+        result = await db.execute(query.order_by(name, User.id).limit(limit))
+        return list(result.scalars().all())
+
+# other backends: a sorted in-memory (lower(user_name), id) index, refreshed
+# periodically so users registered on other workers show up; prefix lookups bisect,
+# substring lookups scan names only and fetch just the page of rows
+class PrefixIndexUserSearch:
+    def __init__(self, refresh_interval: float = USER_SEARCH_REFRESH) -> None:
+        self.refresh_interval = refresh_interval
+        self._entries: list[tuple[str, int]] = []
+        self._loaded_at: Optional[float] = None
+
+    async def _ensure_loaded(self, db: AsyncSession):
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_interval:
+            return
+        result = await db.execute(select(User.user_name, User.id))
+        self._entries = sorted((name.lower(), user_id) for name, user_id in result.all())
+        self._loaded_at = time.monotonic()
+
+    def add_user(self, user: User):
+        if self._loaded_at is not None:
+            bisect.insort(self._entries, (user.user_name.lower(), user.id))
+
+    def _matches(self, term: str, mode: str, after: Optional[tuple[str, int]], limit: int) -> list[int]:
+        term = term.lower()
+        if mode == "prefix" or not term:
+            start = bisect.bisect_left(self._entries, (term, -1))
+            if after:
+                start = max(start, bisect.bisect_right(self._entries, after))
+            ids = []
+            for name, user_id in self._entries[start:]:
+                if not name.startswith(term) or len(ids) == limit:
+                    break
+                ids.append(user_id)
+            return ids
+
+        start = bisect.bisect_right(self._entries, after) if after else 0
+        ids = []
+        for name, user_id in self._entries[start:]:
+            if term in name:
+                ids.append(user_id)
+                if len(ids) == limit:
+                    break
+        return ids
+
+    async def search(self, db: AsyncSession, term: str, mode: str, limit: int, after: Optional[tuple[str, int]]) -> list[User]:
+        await self._ensure_loaded(db)
+        ids = self._matches(term, mode, after, limit)
+        if not ids:
+            return []
+        result = await db.execute(select(User).where(User.id.in_(ids)))
+        users = {user.id: user for user in result.scalars().all()}
+        return [users[user_id] for user_id in ids if user_id in users]
+
+postgres_user_search = PostgresUserSearch()
+prefix_index_user_search = PrefixIndexUserSearch()
+
+async def search_users(db: AsyncSession, term: str = "", mode: str = "substring", limit: int = 50, cursor: Optional[str] = None) -> list[User]:
+    after = decode_user_cursor(cursor)
+    backend = postgres_user_search if db.bind.dialect.name == "postgresql" else prefix_index_user_search
+    return await backend.search(db, term, mode, limit, after)
+
+# keeps this worker's in-memory index current without waiting for a refresh
+def user_added(user: User):
+    prefix_index_user_search.add_user(user)
@@ -0,0 +1,93 @@
+from fastapi import HTTPException, status
+from sqlalchemy import case, or_, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm.attributes import set_committed_value
+from models.Attachment import Attachment
+from models.Message import Message
+from typing import Iterable, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+async def create_attachment(db: AsyncSession, uploaderID: int, file_name: str, file_type: str, storage_key: str, size: int) -> Attachment:
+    try:
+        attachment = Attachment(
+            uploader_id=uploaderID,
+            file_name=file_name,
+            file_type=file_type,
+            storage_key=storage_key,
+            size=size,
+        )
+        db.add(attachment)
+        await db.flush()
+        attachment.file_url = f"/chat/attachments/{attachment.id}"
+        await db.commit()
+        return attachment
+    except Exception as e:
+        await db.rollback()
+        logger.error(e)
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail={"message": str(e)})
+
+# the uploader, or either side of the message it was sent with
+async def get_attachment_for_user(db: AsyncSession, attachmentID: int, userID: int) -> Optional[Attachment]:
+    result = await db.execute(
+        select(Attachment)
+        .outerjoin(Message, Message.id == Attachment.message_id)
+        .where(
+            Attachment.id == attachmentID,
+            or_(Attachment.uploader_id == userID, Message.sender_id == userID, Message.receiver_id == userID),
+        )
+    )
+    return result.scalar_one_or_none()
+
+# (attachment id, sender id) pairs that may be attached to a new message: uploaded
+# by that sender, not yet sent, and not claimed twice in the same batch. Only a
+# pre-check; link_attachments is what actually claims them
+async def claimable_attachments(db: AsyncSession, claims: Iterable[tuple[int, int]]) -> set[int]:
+    claims = list(claims)
+    if not claims:
+        return set()
+    result = await db.execute(
+        select(Attachment.id, Attachment.uploader_id)
+        .where(Attachment.id.in_({attachment_id for attachment_id, _ in claims}), Attachment.message_id.is_(None))
+    )
+    uploaders = dict(result.tuples().all())
+    claimable, seen = set(), set()
+    for attachment_id, senderID in claims:
+        if attachment_id in seen:
+            claimable.discard(attachment_id)
+            continue
+        seen.add(attachment_id)
+        if uploaders.get(attachment_id) == senderID:
+            claimable.add(attachment_id)
+    return claimable
+
+# claims (attachment id, sender id, message id) links in one UPDATE that only touches
+# attachments the sender uploaded and nobody has sent yet, so of two concurrent sends
+# only one wins; returns the attachment ids it linked, the caller fails the rest
+async def link_attachments(db: AsyncSession, links: list[tuple[int, int, int]]) -> set[int]:
+    if not links:
+        return set()
+    result = await db.execute(
+        update(Attachment)
+        .where(
+            tuple_(Attachment.id, Attachment.uploader_id).in_([(attachment_id, senderID) for attachment_id, senderID, _ in links]),
+            Attachment.message_id.is_(None),
+        )
+        .values(message_id=case({attachment_id: message_id for attachment_id, _, message_id in links}, value=Attachment.id))
+        .returning(Attachment.id)
+        .execution_options(synchronize_session=False)
+    )
+    return set(result.scalars().all())
+
+# fills Message.attachment for a page of messages, querying only when one of them
+# actually has an attachment
+async def load_attachments(db: AsyncSession, messages: list[Message]):
+    with_attachment = [msg.id for msg in messages if msg.has_attachment]
+    found = {}
+    if with_attachment:
+        result = await db.execute(select(Attachment).where(Attachment.message_id.in_(with_attachment)))
+        found = {attachment.message_id: attachment for attachment in result.scalars().all()}
+    for msg in messages:
+        set_committed_value(msg, "attachment", found.get(msg.id))
@@ -0,0 +1,135 @@
+from sqlalchemy import case, delete, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from models.Conversation import Conversation
+from models.Message import Message
+from models.User import User
+from database import insert_for
+from typing import Iterable, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# upsert the (sender -> receiver) and (receiver -> sender) rows for the given messages;
+# messages must already be flushed so they have ids, the caller commits
+async def record_messages(db: AsyncSession, messages: Iterable[Message]):
+    rows: dict[tuple[int, int], dict] = {}
+
+    def _touch(user_id: int, partner_id: int, msg: Message, unread: int):
+        row = rows.get((user_id, partner_id))
+        if row is None:
+            rows[(user_id, partner_id)] = {
+                "user_id": user_id,
+                "partner_id": partner_id,
+                "last_message_id": msg.id,
+                "last_message_at": msg.timestamp,
+                "unread_count": unread,
+            }
+            return
+        if msg.id > row["last_message_id"]:
+            row["last_message_id"] = msg.id
+            row["last_message_at"] = msg.timestamp
+        row["unread_count"] += unread
+
+    for msg in messages:
+        _touch(msg.sender_id, msg.receiver_id, msg, 0)
+        if msg.receiver_id != msg.sender_id:
+            _touch(msg.receiver_id, msg.sender_id, msg, 1)
+
+    if not rows:
+        return
+
+    stmt = insert_for(db)(Conversation).values(list(rows.values()))
+    is_newer = stmt.excluded.last_message_id > Conversation.last_message_id
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Conversation.user_id, Conversation.partner_id],
+        set_={
+            "last_message_id": case((is_newer, stmt.excluded.last_message_id), else_=Conversation.last_message_id),
+            "last_message_at": case((is_newer, stmt.excluded.last_message_at), else_=Conversation.last_message_at),
+            "unread_count": Conversation.unread_count + stmt.excluded.unread_count,
+        },
+    )
+    await db.execute(stmt)
+
+# one indexed range scan on (user_id, last_message_at) joined to the partner and last message
+async def get_conversations(db: AsyncSession, userID: int):
+    result = await db.execute(
+        select(User, Message, Conversation.unread_count)
+        .select_from(Conversation)
+        .join(User, User.id == Conversation.partner_id)
+        .join(Message, Message.id == Conversation.last_message_id)
+        .where(Conversation.user_id == userID)
+        .order_by(Conversation.last_message_at.desc())
+    )
+    return result.tuples().all()
+
+# takes `count` newly read messages off the (user -> partner) counter and returns what
+# is left; the caller commits
+async def mark_conversation_read(db: AsyncSession, user_id: int, partner_id: int, count: int) -> int:
+    where = (Conversation.user_id == user_id, Conversation.partner_id == partner_id)
+    if count:
+        result = await db.execute(
+            update(Conversation)
+            .where(*where)
+            .values(unread_count=case((Conversation.unread_count > count, Conversation.unread_count - count), else_=0))
+            .returning(Conversation.unread_count)
+        )
+    else:
+        result = await db.execute(select(Conversation.unread_count).where(*where))
+    return result.scalar_one_or_none() or 0
+
+# badge counts straight from the maintained counters, one row per conversation with unread messages
+async def get_unread_counts(db: AsyncSession, user_id: int, partner_id: Optional[int] = None) -> list[tuple[int, int]]:
+    query = select(Conversation.partner_id, Conversation.unread_count).where(
+        Conversation.user_id == user_id, Conversation.unread_count > 0
+    )
+    if partner_id is not None:
+        query = query.where(Conversation.partner_id == partner_id)
+    result = await db.execute(query)
+    return [tuple(row) for row in result.all()]
+
+# user id -> everyone they share a conversation with
+async def get_partner_ids(db: AsyncSession, user_ids: Iterable[int]) -> dict[int, list[int]]:
+    result = await db.execute(
+        select(Conversation.user_id, Conversation.partner_id).where(Conversation.user_id.in_(list(user_ids)))
+    )
+    partners: dict[int, list[int]] = {}
+    for user_id, partner_id in result.all():
+        if partner_id != user_id:
+            partners.setdefault(user_id, []).append(partner_id)
+    return partners
+
+# mirrors the backfill in migration 3f1a9c2d7b10 (add_conversations), which stays
+# frozen; keep this one in step with the messages table instead
+_REBUILD_SQL = text("""
+INSERT INTO conversations (user_id, partner_id, last_message_id, last_message_at, unread_count)
+SELECT p.user_id, p.partner_id, m.id, m.timestamp, p.unread_count
+FROM (
+    SELECT d.user_id, d.partner_id, MAX(d.id) AS last_id, SUM(d.unread) AS unread_count
+    FROM (
+        SELECT sender_id AS user_id, receiver_id AS partner_id, id, 0 AS unread
+        FROM messages
+        UNION ALL
+        SELECT receiver_id AS user_id, sender_id AS partner_id, id,
+            CASE WHEN is_read THEN 0 ELSE 1 END AS unread
+        FROM messages
+        WHERE receiver_id <> sender_id
+    ) d
+    GROUP BY d.user_id, d.partner_id
+) p
+JOIN messages m ON m.id = p.last_id
+-- SQLite cannot parse ON CONFLICT after INSERT ... SELECT unless the SELECT has a WHERE
+WHERE 1 = 1
+ON CONFLICT (user_id, partner_id) DO NOTHING
+""")
+
+# rebuilds every conversation row from the messages table
+async def rebuild_conversations(db: AsyncSession):
+    try:
+        await db.execute(delete(Conversation))
+        await db.execute(_REBUILD_SQL)
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Error rebuilding conversations: {e}")
+        raise
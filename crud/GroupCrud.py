@@ -0,0 +1,169 @@
+from fastapi import HTTPException, status
+from sqlalchemy import delete, insert, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from models.Group import Group, GroupMember
+from models.GroupMessage import GroupMessage, GroupMessagePayload
+from models.User import User
+from core.readRouting import note_writes
+from typing import Iterable, Optional
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+async def _check_users_exist(db: AsyncSession, user_ids: Iterable[int]):
+    user_ids = set(user_ids)
+    result = await db.execute(select(User.id).where(User.id.in_(user_ids)))
+    missing = user_ids - set(result.scalars().all())
+    if missing:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail={"message": "user does not exist", "user_ids": sorted(missing)})
+
+async def create_group(db: AsyncSession, creatorID: int, name: str, memberIDs: Iterable[int]) -> Group:
+    try:
+        member_ids = set(memberIDs) | {creatorID}
+        await _check_users_exist(db, member_ids)
+        group = Group(name=name, created_by=creatorID)
+        db.add(group)
+        await db.flush()
+        await db.execute(insert(GroupMember), [
+            {"group_id": group.id, "user_id": user_id, "role": "owner" if user_id == creatorID else "member"}
+            for user_id in member_ids
+        ])
+        await db.commit()
+        return group
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception as e:
+        await db.rollback()
+        logger.error(e)
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail={"message": str(e)})
+
+async def get_group(db: AsyncSession, groupID: int) -> Optional[Group]:
+    result = await db.execute(select(Group).filter_by(id=groupID))
+    return result.scalar_one_or_none()
+
+# Sends lock the group row FOR SHARE and membership changes FOR UPDATE, in the same
+# transaction as the member list they act on, so on Postgres a removal either commits
+# before a send reads the members or waits for the send to commit (and its fan-out to
+# be decided), and concurrent adds cannot both pass the size cap. SQLite has no row
+# locks and the clause is dropped there. Returns False when the group does not exist.
+async def lock_group(db: AsyncSession, groupID: int, exclusive: bool = False) -> bool:
+    result = await db.execute(select(Group.id).where(Group.id == groupID).with_for_update(read=not exclusive))
+    return result.scalar_one_or_none() is not None
+
+# user id -> role
+async def get_members(db: AsyncSession, groupID: int) -> dict[int, str]:
+    result = await db.execute(select(GroupMember.user_id, GroupMember.role).where(GroupMember.group_id == groupID))
+    return {user_id: role for user_id, role in result.all()}
+
+async def get_member_role(db: AsyncSession, groupID: int, userID: int) -> Optional[str]:
+    result = await db.execute(select(GroupMember.role).where(GroupMember.group_id == groupID, GroupMember.user_id == userID))
+    return result.scalar_one_or_none()
+
+# the user's groups with every member id, in two queries
+async def get_groups_for_user(db: AsyncSession, userID: int) -> list[tuple[Group, list[int]]]:
+    result = await db.execute(
+        select(Group).join(GroupMember, GroupMember.group_id == Group.id).where(GroupMember.user_id == userID).order_by(Group.id)
+    )
+    groups = list(result.scalars().all())
+    if not groups:
+        return []
+    members: dict[int, list[int]] = {}
+    result = await db.execute(
+        select(GroupMember.group_id, GroupMember.user_id).where(GroupMember.group_id.in_([group.id for group in groups]))
+    )
+    for group_id, user_id in result.all():
+        members.setdefault(group_id, []).append(user_id)
+    return [(group, sorted(members.get(group.id, []))) for group in groups]
+
+# returns every member id afterwards; the cap is checked under the group lock
+async def add_members(db: AsyncSession, groupID: int, memberIDs: Iterable[int], max_members: int) -> list[int]:
+    try:
+        if not await lock_group(db, groupID, exclusive=True):
+            raise HTTPException(status.HTTP_404_NOT_FOUND, detail={"message": "group not found"})
+        current = await get_members(db, groupID)
+        new_ids = sorted(set(memberIDs) - set(current))
+        if len(current) + len(new_ids) > max_members:
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, detail={"message": f"groups are limited to {max_members} members"})
+        if new_ids:
+            await _check_users_exist(db, new_ids)
+            await db.execute(insert(GroupMember), [{"group_id": groupID, "user_id": user_id, "role": "member"} for user_id in new_ids])
+        await db.commit()
+        return sorted(set(current) | set(new_ids))
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception as e:
+        await db.rollback()
+        logger.error(e)
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail={"message": str(e)})
+
+# the owner cannot be removed, which would leave nobody able to manage the group
+async def remove_member(db: AsyncSession, groupID: int, userID: int) -> bool:
+    try:
+        if not await lock_group(db, groupID, exclusive=True):
+            await db.rollback()
+            return False
+        role = await get_member_role(db, groupID, userID)
+        if role is None:
+            await db.rollback()
+            return False
+        if role == "owner":
+            raise HTTPException(status.HTTP_409_CONFLICT, detail={"message": "the group owner cannot be removed"})
+        await db.execute(delete(GroupMember).where(GroupMember.group_id == groupID, GroupMember.user_id == userID))
+        await db.commit()
+        return True
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception as e:
+        await db.rollback()
+        logger.error(e)
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail={"message": str(e)})
+
+# the message row once plus one payload row per recipient, in one transaction
+async def create_group_message(db: AsyncSession, groupID: int, senderID: int, payloads: dict[int, str], message_type: str) -> GroupMessage:
+    try:
+        message = GroupMessage(group_id=groupID, sender_id=senderID, message_type=message_type)
+        db.add(message)
+        await db.flush()
+        await db.execute(insert(GroupMessagePayload), [
+            {"message_id": message.id, "recipient_id": recipient_id, "content": content}
+            for recipient_id, content in payloads.items()
+        ])
+        await db.commit()
+        note_writes([senderID])
+        return message
+    except Exception as e:
+        await db.rollback()
+        logger.error(e)
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail={"message": str(e)})
+
+# one message with the user's copy, or None if they were not sent one
+async def get_group_message_copy(db: AsyncSession, messageID: int, userID: int) -> Optional[tuple[GroupMessage, str]]:
+    result = await db.execute(
+        select(GroupMessage, GroupMessagePayload.content)
+        .join(GroupMessagePayload, GroupMessagePayload.message_id == GroupMessage.id)
+        .where(GroupMessage.id == messageID, GroupMessagePayload.recipient_id == userID)
+    )
+    return result.tuples().one_or_none()
+
+# newest first along ix_group_messages_group_id_timestamp_id, each with the caller's copy
+async def get_group_messages(
+    db: AsyncSession,
+    groupID: int,
+    userID: int,
+    limit: int = 20,
+    cursor: Optional[tuple[datetime, int]] = None,
+) -> list[tuple[GroupMessage, str]]:
+    query = (
+        select(GroupMessage, GroupMessagePayload.content)
+        .join(GroupMessagePayload, (GroupMessagePayload.message_id == GroupMessage.id) & (GroupMessagePayload.recipient_id == userID))
+        .where(GroupMessage.group_id == groupID)
+    )
+    if cursor:
+        query = query.where(tuple_(GroupMessage.timestamp, GroupMessage.id) < tuple_(*cursor))
+    result = await db.execute(query.order_by(GroupMessage.timestamp.desc(), GroupMessage.id.desc()).limit(limit))
+    return result.tuples().all()
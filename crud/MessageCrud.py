@@ -1,13 +1,15 @@
 from sqlalchemy.future import select
 from fastapi import HTTPException, status
-from sqlalchemy import or_, and_
+from sqlalchemy import delete, insert, or_, tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import joinedload
-from models.Message import Message
+from models.Message import Message, make_conversation_key
 from models.User import User
 from schemas.MessageSchema import MessageCreate
+from crud.ConversationCrud import record_messages, get_conversations, mark_conversation_read
+from crud.AttachmentCrud import claimable_attachments, link_attachments, load_attachments
+from core.readRouting import note_writes
 import logging
-from typing import Optional
+from typing import Optional, Union
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -18,16 +20,24 @@ async def create_message(db: AsyncSession, payload:MessageCreate, senderID: int)
         receiver = result.scalar_one_or_none()
         if not receiver:
             raise HTTPException(status.HTTP_400_BAD_REQUEST, detail={"message": "receiver does not exist"})
+        if payload.attachmentID is not None and not await claimable_attachments(db, [(payload.attachmentID, senderID)]):
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, detail={"message": "attachment does not exist"})
         message = Message(
             sender_id=senderID,
             receiver_id=receiver.id,
             receiver_encrypted=payload.receiver_encrypted,
             sender_encrypted=payload.sender_encrypted,
             message_type=payload.messageType,
-            # attachment_id=payload.attachmentID if payload.attachmentID else None
+            has_attachment=payload.attachmentID is not None,
         )
         db.add(message)
+        await db.flush()
+        if payload.attachmentID is not None and not await link_attachments(db, [(payload.attachmentID, senderID, message.id)]):
+            # another send claimed it since the check above
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, detail={"message": "attachment does not exist"})
+        await record_messages(db, [message])
         await db.commit()
+        note_writes([senderID])
         await db.refresh(message)
 
         return message
@@ -36,12 +46,115 @@ async def create_message(db: AsyncSession, payload:MessageCreate, senderID: int)
         logger.error(e)
         raise HTTPException(status.HTTP_400_BAD_REQUEST, detail={"message":str(e)})
 
+# stores many messages with one receiver lookup, one multi-row INSERT ... RETURNING
+# and one commit; returns a Message or an HTTPException per item, in input order
+async def create_messages_bulk(db: AsyncSession, items: list[tuple[MessageCreate, int]]) -> list[Union[Message, HTTPException]]:
+    results: list[Union[Message, HTTPException, None]] = [None] * len(items)
+    try:
+        receiver_ids = {payload.receiverID for payload, _ in items}
+        result = await db.execute(select(User.id).where(User.id.in_(receiver_ids)))
+        existing = set(result.scalars().all())
+        attachments = await claimable_attachments(
+            db, [(payload.attachmentID, senderID) for payload, senderID in items if payload.attachmentID is not None]
+        )
+
+        rows, positions = [], []
+        for i, (payload, senderID) in enumerate(items):
+            if payload.receiverID not in existing:
+                results[i] = HTTPException(status.HTTP_400_BAD_REQUEST, detail={"message": "receiver does not exist"})
+                continue
+            if payload.attachmentID is not None and payload.attachmentID not in attachments:
+                results[i] = HTTPException(status.HTTP_400_BAD_REQUEST, detail={"message": "attachment does not exist"})
+                continue
+            rows.append({
+                "sender_id": senderID,
+                "receiver_id": payload.receiverID,
+                "receiver_encrypted": payload.receiver_encrypted,
+                "sender_encrypted": payload.sender_encrypted,
+                "message_type": payload.messageType,
+                "has_attachment": payload.attachmentID is not None,
+            })
+            positions.append(i)
+
+        if rows:
+            inserted = await db.scalars(insert(Message).returning(Message, sort_by_parameter_order=True), rows)
+            messages = inserted.all()
+            linked = await link_attachments(db, [
+                (items[i][0].attachmentID, message.sender_id, message.id)
+                for i, message in zip(positions, messages)
+                if items[i][0].attachmentID is not None
+            ])
+            # a concurrent send claimed the attachment since the check: fail just that item
+            lost = [
+                (i, message) for i, message in zip(positions, messages)
+                if items[i][0].attachmentID is not None and items[i][0].attachmentID not in linked
+            ]
+            if lost:
+                await db.execute(
+                    delete(Message)
+                    .where(Message.id.in_([message.id for _, message in lost]))
+                    .execution_options(synchronize_session=False)
+                )
+                for i, message in lost:
+                    db.expunge(message)
+                    results[i] = HTTPException(status.HTTP_400_BAD_REQUEST, detail={"message": "attachment does not exist"})
+                lost_ids = {message.id for _, message in lost}
+                kept = [(i, message) for i, message in zip(positions, messages) if message.id not in lost_ids]
+                positions, messages = [i for i, _ in kept], [message for _, message in kept]
+            await record_messages(db, messages)
+            await db.commit()
+            note_writes({message.sender_id for message in messages})
+            for i, message in zip(positions, messages):
+                results[i] = message
+        return results
+    except Exception as e:
+        await db.rollback()
+        logger.error(e)
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail={"message":str(e)})
+
+# everything the partner sent the user up to and including `cursor` becomes read in one
+# UPDATE along the conversation index; exactly the rows it changed come off the counter,
+# so overlapping calls never count a message twice. Returns (marked, unread left).
+async def mark_read(db: AsyncSession, userID: int, partnerID: int, cursor: tuple[datetime, int]) -> tuple[int, int]:
+    if userID == partnerID:
+        return 0, 0
+    try:
+        result = await db.execute(
+            update(Message)
+            .where(
+                Message.conversation_key == make_conversation_key(userID, partnerID),
+                Message.receiver_id == userID,
+                Message.is_read.is_not(True),
+                tuple_(Message.timestamp, Message.id) <= tuple_(*cursor),
+            )
+            .values(is_read=True)
+            .execution_options(synchronize_session=False)
+        )
+        marked = result.rowcount
+        unread = await mark_conversation_read(db, userID, partnerID, marked)
+        await db.commit()
+        if marked:
+            note_writes([userID])
+        return marked, unread
+    except Exception as e:
+        await db.rollback()
+        logger.error(e)
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail={"message": str(e)})
+
+# the given messages with their attachments, in id order
+async def get_messages_by_id(db: AsyncSession, messageIDs: list[int]) -> list[Message]:
+    result = await db.execute(select(Message).where(Message.id.in_(messageIDs)).order_by(Message.id))
+    messages = result.scalars().all()
+    await load_attachments(db, messages)
+    return messages
+
 async def get_messages(
     db:AsyncSession,
     userID: int,
     partnerID: int,
     before: Optional[datetime] = None,
     limit: int = 20,
+    cursor: Optional[tuple[datetime, int]] = None,
 ):
     try:
         result = await db.execute(select(User).filter_by(id=partnerID))
@@ -49,46 +162,68 @@ async def get_messages(
         if not partner:
             raise HTTPException(status.HTTP_400_BAD_REQUEST, detail={"message": "receiver does not exist"})
 
-        query = select(Message).where(
-            or_(
-                and_(Message.sender_id==userID, Message.receiver_id==partner.id),
-                and_(Message.sender_id==partner.id, Message.receiver_id==userID)
-            )
-        )
+        # newest first along ix_messages_conversation_key_timestamp_id
+        query = select(Message).where(Message.conversation_key == make_conversation_key(userID, partner.id))
 
-        if before:
+        if cursor:
+            query = query.where(tuple_(Message.timestamp, Message.id) < tuple_(*cursor))
+        elif before:
             query = query.where(Message.timestamp < before)
 
-        query = query.order_by(Message.timestamp.desc()).limit(limit).options(joinedload(Message.attachment))
+        query = query.order_by(Message.timestamp.desc(), Message.id.desc()).limit(limit)
 
         messagesResult = await db.execute(query)
         messages = messagesResult.scalars().all()
+        await load_attachments(db, messages)
         return messages
     except Exception as e:
         logger.error(e)
         raise HTTPException(status.HTTP_400_BAD_REQUEST, detail={"message": str(e)})
 
-async def get_latest_messages_per_partner(db:AsyncSession, userID: int):
+# messages sent to or by the user strictly after `cursor`, oldest first; one range scan
+# each on the sender and receiver (timestamp, id) indexes, merged here
+async def get_messages_since(db: AsyncSession, userID: int, cursor: tuple[datetime, int], limit: int = 200):
     try:
-        result = await db.execute(
-                select(Message)
-                .where(or_(Message.sender_id == userID, Message.receiver_id == userID))
-                .order_by(Message.timestamp.desc())
-                .options(joinedload(Message.attachment))
-            )
-        messages = result.scalars().all()
+        after = tuple_(Message.timestamp, Message.id) > tuple_(*cursor)
+        order = (Message.timestamp.asc(), Message.id.asc())
+        sent = await db.execute(select(Message).where(Message.sender_id == userID, after).order_by(*order).limit(limit))
+        received = await db.execute(select(Message).where(Message.receiver_id == userID, after).order_by(*order).limit(limit))
+
+        merged = {msg.id: msg for msg in [*sent.scalars().all(), *received.scalars().all()]}
+        messages = sorted(merged.values(), key=lambda msg: (msg.timestamp, msg.id))[:limit]
+        await load_attachments(db, messages)
+        return messages
+    except Exception as e:
+        logger.error(e)
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail={"message": str(e)})
 
-        latest_messages = {}
+# oldest-first rows over a server-side cursor, handed out `batch_size` at a time so
+# memory stays flat however long the history is; plain rows, no ORM identity map
+async def stream_messages(db: AsyncSession, userID: int, partnerID: Optional[int] = None, batch_size: int = 1000):
+    query = select(
+        Message.id,
+        Message.sender_id,
+        Message.receiver_id,
+        Message.sender_encrypted,
+        Message.receiver_encrypted,
+        Message.message_type,
+        Message.timestamp,
+    )
+    if partnerID is not None:
+        query = query.where(Message.conversation_key == make_conversation_key(userID, partnerID))
+    else:
+        query = query.where(or_(Message.sender_id == userID, Message.receiver_id == userID))
+    query = query.order_by(Message.timestamp.asc(), Message.id.asc()).execution_options(yield_per=batch_size)
 
-        for msg in messages:
-            partner_id = msg.receiver_id if msg.sender_id == userID else msg.sender_id
-            if partner_id not in latest_messages:
-                partner_result = await db.execute(select(User).where(User.id == partner_id))
-                partner = partner_result.scalars().first()
-                if partner:
-                    latest_messages[partner_id] = (partner, msg)
+    result = await db.stream(query)
+    async for rows in result.partitions():
+        yield rows
 
-        return list(latest_messages.values())
+async def get_latest_messages_per_partner(db:AsyncSession, userID: int):
+    try:
+        conversations = await get_conversations(db, userID)
+        await load_attachments(db, [msg for _, msg, _ in conversations])
+        return conversations
     except Exception as e:
         logger.error(e)
         raise HTTPException(status.HTTP_400_BAD_REQUEST, detail={"message": str(e)})
@@ -0,0 +1,32 @@
+from sqlalchemy import case, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from models.RateLimit import RateLimit
+from database import insert_for
+from typing import Optional
+
+# refills the bucket and takes `cost` tokens in one upsert; the row is only
+# updated (and returned) when enough tokens are left, so concurrent workers
+# can never overdraw it. Returns the tokens left, or None when throttled.
+async def take_tokens(db: AsyncSession, key: str, rate: float, burst: float, cost: float, now: float) -> Optional[float]:
+    stmt = insert_for(db)(RateLimit).values(key=key, tokens=burst - cost, updated_at=now)
+    refill = RateLimit.tokens + (now - RateLimit.updated_at) * rate
+    refilled = case((refill > burst, burst), else_=refill)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[RateLimit.key],
+        set_={"tokens": refilled - cost, "updated_at": now},
+        where=refilled >= cost,
+    ).returning(RateLimit.tokens)
+    result = await db.execute(stmt)
+    return result.scalar_one_or_none()
+
+# deletes buckets that have refilled to `burst`: a missing row is the same full bucket
+# to take_tokens. Returns how many went.
+async def prune_buckets(db: AsyncSession, rate: float, burst: float, now: float) -> int:
+    result = await db.execute(delete(RateLimit).where(RateLimit.tokens + (now - RateLimit.updated_at) * rate >= burst))
+    return result.rowcount
+
+async def get_bucket(db: AsyncSession, key: str) -> Optional[tuple[float, float]]:
+    result = await db.execute(select(RateLimit.tokens, RateLimit.updated_at).where(RateLimit.key == key))
+    row = result.first()
+    return (row.tokens, row.updated_at) if row else None
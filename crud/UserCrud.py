@@ -0,0 +1,64 @@
+from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from models.User import User
+from schemas.PartnerSchema import PartnerInfoResponse
+from core.authCache import public_key_cache, invalidate_user
+from core.readRouting import note_writes, reads_from_primary
+from database import async_session, engine
+from typing import Iterable
+import logging
+
+logger = logging.getLogger(__name__)
+
+async def _partner_rows(db: AsyncSession, userIDs: list[int]):
+    result = await db.execute(select(User.id, User.user_name, User.public_key).where(User.id.in_(userIDs)))
+    return result.all()
+
+# partner info for many users: cache hits cost nothing, the misses share one query
+# (plus one on the primary for just-changed users)
+async def get_partner_infos(db: AsyncSession, partnerIDs: Iterable[int]) -> dict[int, PartnerInfoResponse]:
+    partners: dict[int, PartnerInfoResponse] = {}
+    missing = []
+    for partner_id in dict.fromkeys(partnerIDs):
+        cached = public_key_cache.get(partner_id)
+        if cached is None:
+            missing.append(partner_id)
+        else:
+            partners[partner_id] = cached
+
+    # users changed within the replica-lag window (here or, via USER_CHANGED, on another
+    # worker) are read from the primary and not cached: a replica may still hold the
+    # key that was just replaced
+    changed = [partner_id for partner_id in missing if reads_from_primary(partner_id)]
+    unchanged = [partner_id for partner_id in missing if not reads_from_primary(partner_id)]
+    if unchanged:
+        for row in await _partner_rows(db, unchanged):
+            partners[row.id] = PartnerInfoResponse(id=row.id, user_name=row.user_name, public_key=row.public_key)
+            public_key_cache.set(row.id, partners[row.id])
+    if changed:
+        if db.bind is engine:
+            rows = await _partner_rows(db, changed)
+        else:
+            async with async_session() as primary:
+                rows = await _partner_rows(primary, changed)
+        for row in rows:
+            partners[row.id] = PartnerInfoResponse(id=row.id, user_name=row.user_name, public_key=row.public_key)
+    return partners
+
+async def update_public_key(db: AsyncSession, user: User, public_key: str) -> User:
+    try:
+        db_user = await db.get(User, user.id)
+        if db_user is None:
+            raise HTTPException(status.HTTP_404_NOT_FOUND, detail={"message": "user does not exist"})
+        db_user.public_key = public_key
+        await db.commit()
+        invalidate_user(db_user.id)
+        note_writes([db_user.id])
+        return db_user
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        logger.error(e)
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail={"message": str(e)})
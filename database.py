@@ -1,4 +1,7 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine
+from sqlalchemy.engine import make_url
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import declarative_base
 import os
 from dotenv import load_dotenv
@@ -10,12 +13,64 @@ load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
 if DATABASE_URL is None:
     raise ValueError("DATABASE_URL environment variable is not set")
+# optional read replica; read-only endpoints use it, everything else the primary
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
 
-engine = create_async_engine(DATABASE_URL, pool_size=10,
-    max_overflow=20, echo=True)
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+DB_ECHO = _env_bool("DB_ECHO", "false")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", "true")
+DB_REPLICA_POOL_SIZE = int(os.getenv("DB_REPLICA_POOL_SIZE", str(DB_POOL_SIZE)))
+DB_REPLICA_MAX_OVERFLOW = int(os.getenv("DB_REPLICA_MAX_OVERFLOW", str(DB_MAX_OVERFLOW)))
+# SQLAlchemy's compiled-statement cache, per engine
+DB_QUERY_CACHE_SIZE = int(os.getenv("DB_QUERY_CACHE_SIZE", "500"))
+# asyncpg's per-connection prepared statement cache; set 0 behind pgbouncer in transaction mode
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+
+def create_engine_for(url: str, pool_size: int, max_overflow: int) -> AsyncEngine:
+    connect_args = {}
+    if make_url(url).drivername == "postgresql+asyncpg":
+        # asyncpg's own cache and SQLAlchemy's adapter cache on top of it
+        connect_args["statement_cache_size"] = DB_STATEMENT_CACHE_SIZE
+        connect_args["prepared_statement_cache_size"] = DB_STATEMENT_CACHE_SIZE
+    return create_async_engine(
+        url,
+        echo=DB_ECHO,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        query_cache_size=DB_QUERY_CACHE_SIZE,
+        connect_args=connect_args,
+    )
+
+engine = create_engine_for(DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW)
+read_engine = (
+    create_engine_for(DATABASE_REPLICA_URL, DB_REPLICA_POOL_SIZE, DB_REPLICA_MAX_OVERFLOW)
+    if DATABASE_REPLICA_URL else engine
+)
 async_session = async_sessionmaker(bind=engine, expire_on_commit=False)
+read_session = async_sessionmaker(bind=read_engine, expire_on_commit=False)
 Base = declarative_base()
 
+# role -> engine, for instrumentation
+def engines() -> dict[str, AsyncEngine]:
+    if read_engine is engine:
+        return {"primary": engine}
+    return {"primary": engine, "replica": read_engine}
+
+# the dialect's insert(), for ON CONFLICT upserts on the session's database
+def insert_for(db: AsyncSession):
+    if db.bind.dialect.name == "postgresql":
+        return pg_insert
+    return sqlite_insert
+
 async def init_db():
     try:
         # async with engine.begin() as conn:
@@ -25,8 +80,8 @@ async def init_db():
         print(f"Error initializing database: {e}")
         raise
 
-async def get_db() -> AsyncIterator[AsyncSession]:
-    async with async_session() as session:
+async def session_scope(factory: async_sessionmaker) -> AsyncIterator[AsyncSession]:
+    async with factory() as session:
         try:
             yield session
         except Exception as e:
@@ -35,9 +90,19 @@ async def get_db() -> AsyncIterator[AsyncSession]:
         finally:
             await session.close()
 
+async def get_db() -> AsyncIterator[AsyncSession]:
+    async for session in session_scope(async_session):
+        yield session
+
+# replica session for reads that need not see the caller's own latest writes
+async def get_read_db() -> AsyncIterator[AsyncSession]:
+    async for session in session_scope(read_session):
+        yield session
+
 async def close_db():
     try:
-        await engine.dispose()
+        for db_engine in engines().values():
+            await db_engine.dispose()
         print("Database engine disposed")
     except Exception as e:
         print(f"Error closing database: {e}")
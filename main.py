@@ -1,28 +1,72 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Header, HTTPException, status
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from database import init_db, close_db
+from typing import Annotated, Optional
+from database import engines, init_db, close_db
 from routes.authRoutes import router as auth_router
 from routes.messageRoutes import router as message_router
+from routes.attachmentRoutes import router as attachment_router
+from routes.groupRoutes import router as group_router
+from routes.adminRoutes import router as admin_router
+from core.authCache import USER_CHANGED, on_user_changed
+from core.chatHub import chatHub
+from core.readRouting import note_user_changed
+from core.messageBatcher import messageBatcher
+from core.presence import presenceService
+from core.rateLimiter import rateLimiter
+from core.metrics import MetricsMiddleware, instrument_chat_hub, instrument_engines, is_metrics_scraper, render_metrics
+from core import profiling
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    await chatHub.start()
+    await messageBatcher.start()
+    await presenceService.start()
+    await rateLimiter.start()
     yield
+    await rateLimiter.stop()
+    await presenceService.stop()
+    await messageBatcher.stop()
+    await chatHub.stop()
     await close_db()
 
 app = FastAPI(lifespan=lifespan)
 
+instrument_engines(engines())
+instrument_chat_hub(chatHub)
+chatHub.subscribe(USER_CHANGED, on_user_changed)
+chatHub.subscribe(USER_CHANGED, note_user_changed)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+app.add_middleware(MetricsMiddleware)
+
+# nothing is installed unless profiling is switched on
+if profiling.PROFILE_ENABLED:
+    profiling.instrument_engines(engines())
+    app.add_middleware(profiling.ProfilingMiddleware)
+    app.include_router(admin_router)
 
 app.include_router(auth_router)
 app.include_router(message_router)
+app.include_router(attachment_router)
+app.include_router(group_router)
+
+def require_metrics_scraper(authorization: Annotated[Optional[str], Header()] = None):
+    if not is_metrics_scraper(authorization):
+        raise HTTPException(status.HTTP_403_FORBIDDEN, detail={"message": "Not allowed"})
+
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(require_metrics_scraper)])
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 @app.get("/root")
 async def root_page():
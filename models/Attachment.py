@@ -1,15 +1,20 @@
 from database import Base
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, DateTime
 from sqlalchemy.orm import relationship
+from datetime import datetime, timezone
 
 class Attachment(Base):
     __tablename__ = "attachments"
 
     id = Column(Integer, primary_key=True, index=True)
-    message_id = Column(Integer, ForeignKey("messages.id"))
+    message_id = Column(Integer, ForeignKey("messages.id"), index=True)
+    uploader_id = Column(Integer, ForeignKey("users.id"))
     file_name = Column(String)
     file_type = Column(String)  # "image/png", "application/pdf", etc.
     file_url = Column(String)  # Or `ipfs_hash` if using IPFS
     encryption_key = Column(String, nullable=True)  # if using hybrid encryption
+    storage_key = Column(String)  # blob key in core.storage
+    size = Column(BigInteger)
+    created_at = Column(DateTime(timezone=True), default=lambda:datetime.now(timezone.utc))
 
     message = relationship("Message", back_populates="attachment")
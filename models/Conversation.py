@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, UniqueConstraint, Index
+from sqlalchemy.orm import relationship
+from database import Base
+
+# one row per (user, partner) pair, kept up to date by crud.ConversationCrud
+# whenever a message is stored, so the chat list never has to scan `messages`
+class Conversation(Base):
+    __tablename__ = "conversations"
+    __table_args__ = (
+        UniqueConstraint("user_id", "partner_id", name="uq_conversations_user_partner"),
+        Index("ix_conversations_user_last_message_at", "user_id", "last_message_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    partner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    last_message_id = Column(Integer, ForeignKey("messages.id"), nullable=False)
+    last_message_at = Column(DateTime(timezone=True), nullable=False)
+    unread_count = Column(Integer, default=0, nullable=False)
+
+    partner = relationship("User", foreign_keys=[partner_id])
+    last_message = relationship("Message", foreign_keys=[last_message_id])
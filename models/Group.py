@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, PrimaryKeyConstraint
+from datetime import datetime, timezone
+from database import Base
+
+class Group(Base):
+    __tablename__ = "groups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
+    created_at = Column(DateTime(timezone=True), default=lambda:datetime.now(timezone.utc))
+
+# role is "owner" or "member"; only owners change membership, anyone may leave
+class GroupMember(Base):
+    __tablename__ = "group_members"
+    __table_args__ = (
+        PrimaryKeyConstraint("group_id", "user_id"),
+    )
+
+    group_id = Column(Integer, ForeignKey("groups.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    role = Column(String, nullable=False, default="member")
+    joined_at = Column(DateTime(timezone=True), default=lambda:datetime.now(timezone.utc))
@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index, PrimaryKeyConstraint
+from datetime import datetime, timezone
+from database import Base
+
+# one row per group message; the ciphertext lives in group_message_payloads, one
+# row per recipient, since each member's copy is encrypted to their own key
+class GroupMessage(Base):
+    __tablename__ = "group_messages"
+    __table_args__ = (
+        Index("ix_group_messages_group_id_timestamp_id", "group_id", "timestamp", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    group_id = Column(Integer, ForeignKey("groups.id"), nullable=False)
+    sender_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    message_type = Column(String, default="text")
+    timestamp = Column(DateTime(timezone=True), default=lambda:datetime.now(timezone.utc))
+
+class GroupMessagePayload(Base):
+    __tablename__ = "group_message_payloads"
+    __table_args__ = (
+        PrimaryKeyConstraint("message_id", "recipient_id"),
+    )
+
+    message_id = Column(Integer, ForeignKey("group_messages.id"), nullable=False)
+    recipient_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    content = Column(String, nullable=False)
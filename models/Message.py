@@ -1,10 +1,24 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 from database import Base
 
+# same key for both directions of a one-to-one conversation
+def make_conversation_key(user_a: int, user_b: int) -> str:
+    low, high = sorted((user_a, user_b))
+    return f"{low}:{high}"
+
+def _conversation_key_default(context):
+    params = context.get_current_parameters()
+    return make_conversation_key(params["sender_id"], params["receiver_id"])
+
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        Index("ix_messages_conversation_key_timestamp_id", "conversation_key", "timestamp", "id"),
+        Index("ix_messages_sender_id_timestamp_id", "sender_id", "timestamp", "id"),
+        Index("ix_messages_receiver_id_timestamp_id", "receiver_id", "timestamp", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     sender_id = Column(Integer, ForeignKey("users.id"))
@@ -14,6 +28,9 @@ class Message(Base):
     message_type = Column(String, default="text")
     timestamp = Column(DateTime(timezone=True), default=lambda:datetime.now(timezone.utc))
     is_read = Column(Boolean, default=False)
+    # lets history queries skip the attachments lookup for plain messages
+    has_attachment = Column(Boolean, default=False, nullable=False)
+    conversation_key = Column(String, default=_conversation_key_default)
 
     sender = relationship("User", foreign_keys=[sender_id])
     receiver = relationship("User", foreign_keys=[receiver_id])
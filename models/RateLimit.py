@@ -0,0 +1,10 @@
+from sqlalchemy import Column, String, Float
+from database import Base
+
+# token buckets shared by every worker (see core.rateLimiter); updated_at is epoch seconds
+class RateLimit(Base):
+    __tablename__ = "rate_limits"
+
+    key = Column(String, primary_key=True)
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False)
@@ -1,3 +1,7 @@
 from models.User import User
 from models.Message import Message
 from models.Attachment import Attachment
+from models.Conversation import Conversation
+from models.RateLimit import RateLimit
+from models.Group import Group, GroupMember
+from models.GroupMessage import GroupMessage, GroupMessagePayload
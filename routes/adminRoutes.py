@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from fastapi.responses import JSONResponse
+from typing import Annotated, Optional
+from core.profiling import is_profile_admin, profile_store
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+)
+
+def require_profile_admin(x_profile_token: Annotated[Optional[str], Header()] = None):
+    if not is_profile_admin(x_profile_token):
+        raise HTTPException(status.HTTP_403_FORBIDDEN, detail={"message": "Not allowed"})
+
+@router.get("/profiles", dependencies=[Depends(require_profile_admin)])
+async def download_profiles():
+    return JSONResponse(
+        profile_store.report(),
+        headers={"Content-Disposition": 'attachment; filename="profiles.json"'},
+    )
+
+@router.delete("/profiles", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(require_profile_admin)])
+async def reset_profiles():
+    profile_store.reset()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
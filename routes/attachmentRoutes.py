@@ -0,0 +1,66 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from typing import Annotated
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db
+from core.authentication import get_current_user
+from core.fileResponse import ZeroCopyFileResponse
+from core.storage import ATTACHMENT_MAX_BYTES, StorageBackend, get_storage
+from crud.AttachmentCrud import create_attachment, get_attachment_for_user
+from schemas.AttachmentSchema import AttachmentResponse
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/chat/attachments",
+    tags=["attachments"],
+)
+
+# the body is the client-encrypted blob itself, written to storage as it arrives
+# rather than buffered into memory or a multipart spool file
+@router.post("", response_model=AttachmentResponse, status_code=status.HTTP_201_CREATED)
+async def upload_attachment(
+    user: Annotated[object, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db)],
+    storage: Annotated[StorageBackend, Depends(get_storage)],
+    request: Request,
+    file_name: str = Query(..., min_length=1, max_length=255),
+    file_type: str = Query(default="application/octet-stream", max_length=255),
+):
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > ATTACHMENT_MAX_BYTES:
+        raise HTTPException(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail={"message": "attachment too large"})
+
+    key = storage.new_key()
+    size = await storage.save(key, request.stream(), ATTACHMENT_MAX_BYTES)
+    try:
+        return await create_attachment(db, user.id, file_name, file_type, key, size)
+    except Exception:
+        await storage.delete(key)
+        raise
+
+@router.api_route("/{attachmentID}", methods=["GET", "HEAD"])
+async def download_attachment(
+    user: Annotated[object, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db)],
+    storage: Annotated[StorageBackend, Depends(get_storage)],
+    attachmentID: int,
+):
+    attachment = await get_attachment_for_user(db, attachmentID, user.id)
+    if attachment is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail={"message": "Attachment does not exist"})
+
+    path = storage.local_path(attachment.storage_key)
+    if path is not None and os.path.exists(path):
+        # Range, If-Range and HEAD come from FileResponse; resumable and seekable
+        return ZeroCopyFileResponse(path, media_type=attachment.file_type, filename=attachment.file_name)
+    if path is not None:
+        logger.error(f"attachment {attachment.id} missing from storage")
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail={"message": "Attachment does not exist"})
+    return StreamingResponse(
+        storage.iter_chunks(attachment.storage_key),
+        media_type=attachment.file_type,
+        headers={"Content-Length": str(attachment.size)},
+    )
@@ -1,17 +1,19 @@
-from fastapi import APIRouter, Depends, status, HTTPException, Query
+from fastapi import APIRouter, Depends, status, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordRequestForm
 import logging
-from typing import Annotated
+from typing import Annotated, Literal, Optional
 
-from sqlalchemy.future import select
-from core.encryption import verify_password, create_access_token, create_refresh_token, get_new_access_token_from_refresh_token
-from database import get_db
-from models import User
-from schemas.UserSchema import UserCreate, UserLogin
+from core.encryption import verify_password_async, create_access_token, create_refresh_token, get_new_access_token_from_refresh_token
+from database import get_db, get_read_db
+from schemas.UserSchema import UserCreate, UserLogin, PublicKeyUpdate
 from schemas.PartnerSchema import PartnerInfoResponse
 from schemas.TokenSchema import TokenResponse, RefreshRequest
 from core.authentication import create_new_user, get_current_user, get_user_by_username
+from core.authCache import USER_CHANGED
+from core.chatHub import get_chatHub, ChatHub
+from crud.UserCrud import update_public_key
+from core.userSearch import search_users, encode_user_cursor, user_added
 
 logger = logging.getLogger(__name__)
 
@@ -27,7 +29,13 @@ async def register_user(payload: UserCreate, db:AsyncSession = Depends(get_db)):
         user = await create_new_user(db, payload)
         if not user:
             raise HTTPException(status_code=500, detail="Failed to create user")
+        user_added(user)
         return {"id": user.id, "username": user.user_name, "email": user.email}
+    except HTTPException as e:
+        if e.status_code == status.HTTP_503_SERVICE_UNAVAILABLE:
+            raise
+        logger.error(f"Error creating a new user: {e}")
+        raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR, detail={"message":str(e)})
     except Exception as e:
         logger.error(f"Error creating a new user: {e}")
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR, detail={"message":str(e)})
@@ -36,7 +44,7 @@ async def register_user(payload: UserCreate, db:AsyncSession = Depends(get_db)):
 async def login_user(form_data: UserLogin, db: AsyncSession = Depends(get_db)):
     try:
         db_user = await get_user_by_username(db, form_data.username)
-        if not db_user or not verify_password(form_data.password, db_user.password):
+        if not db_user or not await verify_password_async(form_data.password, db_user.password):
             raise HTTPException(status.HTTP_401_UNAUTHORIZED, detail={"message": "invalid username"})
         access_token = create_access_token({
             "sub":db_user.user_name,
@@ -51,6 +59,11 @@ async def login_user(form_data: UserLogin, db: AsyncSession = Depends(get_db)):
             "refresh_token": refresh_token,
             "token_type": "Bearer"
         }
+    except HTTPException as e:
+        if e.status_code == status.HTTP_503_SERVICE_UNAVAILABLE:
+            raise
+        logger.error(f"Login failed: {e.detail}")
+        raise HTTPException(status.HTTP_401_UNAUTHORIZED, detail="Invalid username or password")
     except Exception as e:
         logger.error(f"Login failed: {str(e)}")
         raise HTTPException(status.HTTP_401_UNAUTHORIZED, detail="Invalid username or password")
@@ -71,12 +84,28 @@ async def get_new_access_token(request: RefreshRequest):
         logger.error(f"Refresh failed: {str(e)}")
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Refresh failed")
 
-@router.get("/get_all_users", response_model=list[PartnerInfoResponse])
-async def get_all_users(db:Annotated[AsyncSession, Depends(get_db)], search: str = Query(default="")):
-    stmt = select(User)
-    if search:
-        stmt = stmt.where(User.user_name.ilike(f"%{search}%"))
+# clients rotate keys on reinstall; cached partner info is dropped with the old key
+@router.put("/public_key", response_model=PartnerInfoResponse)
+async def change_public_key(
+    payload: PublicKeyUpdate,
+    user: Annotated[object, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db)],
+    chat_hub: Annotated[ChatHub, Depends(get_chatHub)],
+):
+    updated = await update_public_key(db, user, payload.public_key)
+    await chat_hub.broadcast(USER_CHANGED, {"user_id": updated.id})
+    return updated
 
-    result = await db.execute(stmt)
-    users = result.scalars().all()
+@router.get("/get_all_users", response_model=list[PartnerInfoResponse])
+async def get_all_users(
+    db:Annotated[AsyncSession, Depends(get_read_db)],
+    response: Response,
+    search: str = Query(default=""),
+    mode: Literal["substring", "prefix"] = Query(default="substring"),
+    limit: int = Query(default=50, ge=1, le=100),
+    cursor: Optional[str] = None,
+):
+    users = await search_users(db, search, mode, limit, cursor)
+    if len(users) == limit:
+        response.headers["X-Next-Cursor"] = encode_user_cursor(users[-1])
     return users
@@ -0,0 +1,122 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import Annotated, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db
+from core.rateLimiter import get_rateLimiter, RateLimiter
+from core.authentication import get_current_user
+from core.chatHub import ChatHub, get_chatHub
+from core.groupChat import GROUP_MAX_MEMBERS, require_member, send_group_message
+from core.messageCursor import decode_cursor, encode_cursor
+from core.messageSerializer import JSON_OPTIONS, RawJSONResponse
+from core.profiling import section
+from core.readRouting import get_user_read_db
+from crud.GroupCrud import add_members, create_group, get_group, get_group_messages, get_groups_for_user, remove_member
+from schemas.GroupSchema import GroupCreate, GroupMembersAdd, GroupMessageCreate, GroupMessageResponse, GroupMessageSent, GroupResponse
+import logging
+import math
+import orjson
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/groups",
+    tags=["groups"],
+)
+
+def group_response(group, member_ids: list[int]) -> GroupResponse:
+    return GroupResponse(id=group.id, name=group.name, created_by=group.created_by, member_ids=member_ids)
+
+@router.post("", response_model=GroupResponse, status_code=status.HTTP_201_CREATED)
+async def create_new_group(
+    user: Annotated[object, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db)],
+    body: GroupCreate,
+):
+    member_ids = set(body.memberIDs) | {user.id}
+    if len(member_ids) > GROUP_MAX_MEMBERS:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail={"message": f"groups are limited to {GROUP_MAX_MEMBERS} members"})
+    group = await create_group(db, user.id, body.name, member_ids)
+    return group_response(group, sorted(member_ids))
+
+@router.get("", response_model=list[GroupResponse])
+async def list_groups(
+    user: Annotated[object, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_user_read_db)],
+):
+    return [group_response(group, member_ids) for group, member_ids in await get_groups_for_user(db, user.id)]
+
+@router.post("/{groupID}/members", response_model=GroupResponse)
+async def add_group_members(
+    user: Annotated[object, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db)],
+    groupID: int,
+    body: GroupMembersAdd,
+):
+    if await require_member(db, groupID, user.id) != "owner":
+        raise HTTPException(status.HTTP_403_FORBIDDEN, detail={"message": "only the group owner can add members"})
+    member_ids = await add_members(db, groupID, body.memberIDs, GROUP_MAX_MEMBERS)
+    group = await get_group(db, groupID)
+    return group_response(group, member_ids)
+
+# owners remove anyone but themselves, members only themselves
+@router.delete("/{groupID}/members/{userID}", status_code=status.HTTP_204_NO_CONTENT)
+async def remove_group_member(
+    user: Annotated[object, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db)],
+    groupID: int,
+    userID: int,
+):
+    role = await require_member(db, groupID, user.id)
+    if userID != user.id and role != "owner":
+        raise HTTPException(status.HTTP_403_FORBIDDEN, detail={"message": "only the group owner can remove members"})
+    if not await remove_member(db, groupID, userID):
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail={"message": "not a member"})
+
+@router.post("/{groupID}/messages", response_model=GroupMessageSent, status_code=status.HTTP_201_CREATED)
+async def send_to_group(
+    user: Annotated[object, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db)],
+    chat_hub: Annotated[ChatHub, Depends(get_chatHub)],
+    rate_limiter: Annotated[RateLimiter, Depends(get_rateLimiter)],
+    groupID: int,
+    body: GroupMessageCreate,
+):
+    # the same budget as a group_message frame on /chat/ws
+    retry_after = await rate_limiter.acquire(user.id)
+    if retry_after:
+        raise HTTPException(
+            status.HTTP_429_TOO_MANY_REQUESTS,
+            detail={"message": "rate limited", "retry_after": round(retry_after, 3)},
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+    message = await send_group_message(db, chat_hub, groupID, user.id, body)
+    return GroupMessageSent(id=message.id, group_id=message.group_id, timestamp=message.timestamp)
+
+# membership is checked on the primary, a lagging replica could still list a removed
+# member; the page itself may come from the replica
+@router.get("/{groupID}/messages", response_model=list[GroupMessageResponse])
+async def get_group_history(
+    user: Annotated[object, Depends(get_current_user)],
+    primary: Annotated[AsyncSession, Depends(get_db)],
+    db: Annotated[AsyncSession, Depends(get_user_read_db)],
+    groupID: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(default=20, ge=1, le=100),
+):
+    page_cursor = decode_cursor(cursor)
+    await require_member(primary, groupID, user.id)
+    rows = await get_group_messages(db, groupID, user.id, limit=limit, cursor=page_cursor)
+    with section("serialization"):
+        response = RawJSONResponse(orjson.dumps([
+            {
+                "id": message.id,
+                "group_id": message.group_id,
+                "sender_id": message.sender_id,
+                "content": content,
+                "message_type": message.message_type,
+                "timestamp": message.timestamp,
+            } for message, content in rows
+        ], option=JSON_OPTIONS))
+    if len(rows) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(rows[-1][0].timestamp, rows[-1][0].id)
+    return response
@@ -4,4 +4,8 @@ class AttachmentResponse(BaseModel):
     id: int
     file_name: str
     file_type: str
-    file_url: str
\ No newline at end of file
+    file_url: str
+    size: int
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,37 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+
+class GroupCreate(BaseModel):
+    name: str = Field(..., min_length=1, max_length=100)
+    memberIDs: list[int] = []
+
+class GroupMembersAdd(BaseModel):
+    memberIDs: list[int] = Field(..., min_length=1)
+
+class GroupResponse(BaseModel):
+    id: int
+    name: str
+    created_by: int
+    member_ids: list[int]
+
+# one ciphertext per current member (the sender included), keyed by user id
+class GroupMessageCreate(BaseModel):
+    payloads: dict[int, str] = Field(..., min_length=1)
+    messageType: str = "text"
+
+# the same over /chat/ws: {"type": "group_message", "groupID": ..., "payloads": {...}}
+class GroupMessageFrame(GroupMessageCreate):
+    groupID: int
+
+class GroupMessageResponse(BaseModel):
+    id: int
+    group_id: int
+    sender_id: int
+    content: str
+    message_type: str
+    timestamp: datetime
+
+class GroupMessageSent(BaseModel):
+    id: int
+    group_id: int
+    timestamp: datetime
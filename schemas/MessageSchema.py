@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Any, Optional
 from datetime import datetime
 
 from schemas.PartnerSchema import PartnerInfoResponse
@@ -9,14 +9,14 @@ class MessageCreate(BaseModel):
     receiver_encrypted: str
     sender_encrypted: str
     messageType: str
-    # attachmentID: Optional[int] = None
+    attachmentID: Optional[int] = None
 
 class MessageResponse(BaseModel):
     senderID: int = Field(...,alias="sender_id")
     receiverID: int = Field(...,alias="receiver_id")
     content: str
     messageType: str = Field(...,alias="message_type")
-    # attachmentID: Optional[int] = None
+    attachmentID: Optional[int] = Field(default=None, alias="attachment_id")
     timestamp: datetime
 
     class Config:
@@ -26,3 +26,34 @@ class MessageResponse(BaseModel):
 class MessageChatList(BaseModel):
     partner: PartnerInfoResponse
     message: MessageResponse
+    unread_count: int = 0
+
+# one per message of a bulk send, in request order; only the fields for its status are set
+class MessageAck(BaseModel):
+    index: int
+    client_id: Optional[Any] = None
+    status: str
+    id: Optional[int] = None
+    timestamp: Optional[datetime] = None
+    error: Optional[str] = None
+    details: Optional[list[dict]] = None
+
+class BulkSendResponse(BaseModel):
+    results: list[MessageAck]
+
+class MarkReadRequest(BaseModel):
+    partnerID: int
+    # a message cursor, or the timestamp of the newest message the user has seen
+    up_to: str = Field(..., min_length=1)
+
+class MarkReadResponse(BaseModel):
+    marked: int
+    unread_count: int
+
+class UnreadCount(BaseModel):
+    partner_id: int
+    unread_count: int
+
+class UnreadResponse(BaseModel):
+    total: int
+    conversations: list[UnreadCount]
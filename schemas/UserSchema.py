@@ -8,4 +8,7 @@ class UserCreate(BaseModel):
 
 class UserLogin(BaseModel):
     username: str
-    password: str
\ No newline at end of file
+    password: str
+
+class PublicKeyUpdate(BaseModel):
+    public_key: str
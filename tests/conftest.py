@@ -0,0 +1,51 @@
+# Runs against a throwaway SQLite file; the settings must be in place before anything
+# imports `database`. pytest-asyncio is not needed: tests drive coroutines with run().
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+workdir = tempfile.mkdtemp(prefix="fluent-test-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{workdir}/test.db"
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("ATTACHMENT_STORAGE_DIR", os.path.join(workdir, "attachments"))
+
+# a fresh schema per test; run(coro) runs it on its own event loop and disposes the
+# engine afterwards, since pooled aiosqlite connections cannot cross loops
+@pytest.fixture
+def run():
+    import models  # noqa: F401
+    from database import Base, engine
+
+    def run(coro):
+        async def main():
+            try:
+                return await coro
+            finally:
+                await engine.dispose()
+        return asyncio.run(main())
+
+    async def reset():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+
+    run(reset())
+    return run
+
+# (alice id, bob id)
+@pytest.fixture
+def users(run) -> tuple[int, int]:
+    import models
+    from database import async_session
+
+    async def seed():
+        async with async_session() as db:
+            alice = models.User(user_name="alice", email="alice@test.local", password="x", public_key="pk-alice")
+            bob = models.User(user_name="bob", email="bob@test.local", password="x", public_key="pk-bob")
+            db.add_all([alice, bob])
+            await db.commit()
+            return alice.id, bob.id
+
+    return run(seed())
@@ -0,0 +1,94 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from crud.AttachmentCrud import create_attachment, link_attachments
+from crud.MessageCrud import create_message, create_messages_bulk
+from database import async_session
+from models.Attachment import Attachment
+from models.Message import Message
+from schemas.MessageSchema import MessageCreate
+
+def payload(receiver_id: int, attachment_id: int) -> MessageCreate:
+    return MessageCreate(receiverID=receiver_id, receiver_encrypted="cg==", sender_encrypted="cw==", messageType="file", attachmentID=attachment_id)
+
+async def upload(uploader_id: int) -> int:
+    async with async_session() as db:
+        return (await create_attachment(db, uploader_id, "a.bin", "application/octet-stream", "key", 3)).id
+
+async def attached_to(attachment_id: int):
+    async with async_session() as db:
+        return await db.scalar(select(Attachment.message_id).where(Attachment.id == attachment_id))
+
+def test_second_link_loses(run, users):
+    alice, bob = users
+
+    async def scenario():
+        attachment_id = await upload(alice)
+        async with async_session() as db:
+            first, second = Message(sender_id=alice, receiver_id=bob), Message(sender_id=alice, receiver_id=bob)
+            db.add_all([first, second])
+            await db.flush()
+            won = await link_attachments(db, [(attachment_id, alice, first.id)])
+            lost = await link_attachments(db, [(attachment_id, alice, second.id)])
+            await db.commit()
+        return attachment_id, first.id, won, lost
+
+    attachment_id, first_id, won, lost = run(scenario())
+    assert won == {attachment_id}
+    assert lost == set()
+    assert run(attached_to(attachment_id)) == first_id
+
+def test_only_the_uploader_can_link(run, users):
+    alice, bob = users
+
+    async def scenario():
+        attachment_id = await upload(alice)
+        async with async_session() as db:
+            message = Message(sender_id=bob, receiver_id=alice)
+            db.add(message)
+            await db.flush()
+            return attachment_id, await link_attachments(db, [(attachment_id, bob, message.id)])
+
+    attachment_id, linked = run(scenario())
+    assert linked == set()
+    assert run(attached_to(attachment_id)) is None
+
+def test_create_message_cannot_reuse_a_sent_attachment(run, users):
+    alice, bob = users
+
+    async def scenario():
+        attachment_id = await upload(alice)
+        async with async_session() as db:
+            sent = await create_message(db, payload(bob, attachment_id), alice)
+        async with async_session() as db:
+            with pytest.raises(HTTPException) as error:
+                await create_message(db, payload(bob, attachment_id), alice)
+        async with async_session() as db:
+            count = len((await db.scalars(select(Message.id))).all())
+        return attachment_id, sent.id, error.value, count
+
+    attachment_id, sent_id, error, count = run(scenario())
+    assert error.status_code == 400
+    assert "attachment does not exist" in str(error.detail)
+    assert count == 1
+    assert run(attached_to(attachment_id)) == sent_id
+
+def test_bulk_fails_only_the_items_that_reuse_an_attachment(run, users):
+    alice, bob = users
+
+    async def scenario():
+        attachment_id = await upload(alice)
+        async with async_session() as db:
+            results = await create_messages_bulk(db, [
+                (payload(bob, attachment_id), alice),
+                (payload(bob, attachment_id), alice),
+                (MessageCreate(receiverID=bob, receiver_encrypted="cg==", sender_encrypted="cw==", messageType="text"), alice),
+            ])
+        return attachment_id, results
+
+    attachment_id, results = run(scenario())
+    # the same attachment twice in one batch: neither copy may claim it
+    assert all(isinstance(result, HTTPException) for result in results[:2])
+    assert isinstance(results[2], Message)
+    assert run(attached_to(attachment_id)) is None
@@ -0,0 +1,71 @@
+import base64
+from datetime import datetime, timezone
+
+import orjson
+import pytest
+
+from core.binaryFrames import BinaryFrameError, binary_frame, pack_send, to_binary, unpack_messages, unpack_send, unpack_sends
+from schemas.MessageSchema import MessageCreate
+
+def delivered(message_id: int, content: bytes, attachment_id=None) -> dict:
+    return {
+        "id": message_id,
+        "sender_id": 1,
+        "receiver_id": 2,
+        "content": base64.b64encode(content).decode(),
+        "message_type": "text",
+        "attachment_id": attachment_id,
+        "timestamp": "2026-10-18T10:00:00.123456+00:00",
+    }
+
+def test_send_round_trip_matches_json():
+    receiver_ct, sender_ct = b"\x00\xff to bob", b"\x00\xff to alice"
+    fields = unpack_send(pack_send(2, receiver_ct, sender_ct, "text", attachment_id=7))
+    assert MessageCreate(**fields) == MessageCreate(
+        receiverID=2,
+        receiver_encrypted=base64.b64encode(receiver_ct).decode(),
+        sender_encrypted=base64.b64encode(sender_ct).decode(),
+        messageType="text",
+        attachmentID=7,
+    )
+
+def test_batch_of_sends():
+    frame = pack_send(2, b"a", b"b", "text") + pack_send(3, b"c", b"d", "file")
+    assert [(item["receiverID"], item["messageType"]) for item in unpack_sends(frame)] == [(2, "text"), (3, "file")]
+
+def test_message_round_trip():
+    content = bytes(range(256))
+    (message,) = unpack_messages(binary_frame(delivered(42, content, attachment_id=9)))
+    assert message["id"] == 42
+    assert message["content"] == content
+    assert message["attachment_id"] == 9
+    assert message["timestamp"] == int(datetime(2026, 10, 18, 10, 0, 0, 123456, tzinfo=timezone.utc).timestamp() * 1_000_000)
+
+def test_grouped_messages_and_remote_payloads():
+    grouped = {"type": "messages", "messages": [delivered(1, b"one"), delivered(2, b"two")]}
+    frame = binary_frame(grouped)
+    assert [(message["id"], message["content"]) for message in unpack_messages(frame)] == [(1, b"one"), (2, b"two")]
+    # another worker's JSON payload packs to the same bytes
+    assert to_binary(orjson.dumps(grouped).decode()) == frame
+
+def test_other_frames_stay_json():
+    payload = orjson.dumps({"type": "presence", "users": []}).decode()
+    assert binary_frame(orjson.loads(payload)) is None
+    assert to_binary(payload) == payload
+
+def test_truncated_frames_are_rejected():
+    with pytest.raises(BinaryFrameError):
+        unpack_send(pack_send(2, b"abc", b"def", "text")[:-1])
+    with pytest.raises(BinaryFrameError):
+        unpack_messages(binary_frame(delivered(1, b"abc"))[:-1])
+
+# older JSON clients may send line-wrapped base64 (or anything else); it is stored as
+# sent and binary sockets get the JSON text rather than guessed bytes
+@pytest.mark.parametrize("ciphertext", ["not base64!", "aGk", "aGk=\n", "YWJj\nZGVm"])
+def test_non_base64_ciphertext_falls_back_to_json(ciphertext):
+    message = MessageCreate(receiverID=2, receiver_encrypted=ciphertext, sender_encrypted="aGk=", messageType="text")
+    data = {**delivered(1, b""), "content": message.receiver_encrypted}
+    assert binary_frame(data) is None
+    assert binary_frame({"type": "messages", "messages": [delivered(2, b"ok"), data]}) is None
+    payload = orjson.dumps(data).decode()
+    assert to_binary(payload) == payload
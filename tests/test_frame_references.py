@@ -0,0 +1,39 @@
+import orjson
+
+from core.frameReferences import frame_reference, load_frame
+from core.messageSerializer import live_frame
+from crud.MessageCrud import create_message
+from database import async_session
+from schemas.MessageSchema import MessageCreate
+
+# SQLite hands timestamps back without their offset; Postgres, the only database the
+# NOTIFY fan-out runs on, returns them as stored
+def without_timestamps(payload: str) -> dict:
+    data = orjson.loads(payload)
+    for message in data.get("messages", [data]):
+        message.pop("timestamp")
+    return data
+
+# an oversized frame is rebuilt on the receiving worker with each user's own copy
+def test_reference_rebuilds_each_users_frame(run, users):
+    alice, bob = users
+
+    async def scenario():
+        async with async_session() as db:
+            message = await create_message(db, MessageCreate(receiverID=bob, receiver_encrypted="Ym9i", sender_encrypted="YWxpY2U=", messageType="text"), alice)
+        sent = {
+            bob: orjson.dumps(live_frame(message, message.receiver_encrypted, None)).decode(),
+            alice: orjson.dumps({"type": "messages", "messages": [live_frame(message, message.sender_encrypted, None)]}).decode(),
+        }
+        loaded = {user_id: await load_frame(user_id, frame_reference(payload)) for user_id, payload in sent.items()}
+        stranger = await load_frame(bob + 1, frame_reference(sent[bob]))
+        return sent, loaded, stranger
+
+    sent, loaded, stranger = run(scenario())
+    assert {user_id: without_timestamps(payload) for user_id, payload in loaded.items()} == {
+        user_id: without_timestamps(payload) for user_id, payload in sent.items()
+    }
+    assert stranger is None
+
+def test_other_frames_have_no_reference():
+    assert frame_reference(orjson.dumps({"type": "presence", "users": []}).decode()) is None
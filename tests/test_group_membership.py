@@ -0,0 +1,38 @@
+import pytest
+from fastapi import HTTPException
+
+from crud.GroupCrud import add_members, create_group, get_members, remove_member
+from database import async_session
+
+# the owner cannot leave the group ownerless; other members can still leave
+def test_owner_cannot_be_removed(run, users):
+    alice, bob = users
+
+    async def scenario():
+        async with async_session() as db:
+            group_id = (await create_group(db, alice, "pair", [bob])).id
+            with pytest.raises(HTTPException) as rejected:
+                await remove_member(db, group_id, alice)
+            removed = await remove_member(db, group_id, bob)
+            return rejected.value.status_code, removed, await get_members(db, group_id)
+
+    status_code, removed, members = run(scenario())
+    assert status_code == 409
+    assert removed
+    assert members == {alice: "owner"}
+
+# the size cap is checked against the members read under the group lock
+def test_add_members_enforces_the_cap(run, users):
+    alice, bob = users
+
+    async def scenario():
+        async with async_session() as db:
+            group_id = (await create_group(db, alice, "solo", [])).id
+            with pytest.raises(HTTPException) as rejected:
+                await add_members(db, group_id, [bob], max_members=1)
+            added = await add_members(db, group_id, [bob], max_members=2)
+            return rejected.value.status_code, added
+
+    status_code, added = run(scenario())
+    assert status_code == 400
+    assert added == sorted([alice, bob])
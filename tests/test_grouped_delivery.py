@@ -0,0 +1,72 @@
+import asyncio
+import base64
+
+import orjson
+
+from core.binaryFrames import unpack_messages
+from core.chatHub import ChatHub
+from core.fanoutBackend import LocalFanout
+
+class RecordingSocket:
+    def __init__(self) -> None:
+        self.frames: list = []
+
+    async def send_text(self, text: str):
+        self.frames.append(orjson.loads(text))
+
+    async def send_bytes(self, data: bytes):
+        self.frames.append(unpack_messages(data))
+
+def message(message_id: int) -> dict:
+    return {
+        "id": message_id,
+        "sender_id": 1,
+        "receiver_id": 2,
+        "content": base64.b64encode(b"m%d" % message_id).decode(),
+        "message_type": "text",
+        "attachment_id": None,
+        "timestamp": "2026-10-18T10:00:00+00:00",
+    }
+
+# only sockets that asked for grouped frames get one; older clients keep getting one
+# message dict per frame, binary ones one record per frame
+def test_grouped_frames_are_split_for_sockets_without_the_feature():
+    async def scenario():
+        hub = ChatHub(backend=LocalFanout())
+        legacy, grouped, binary = RecordingSocket(), RecordingSocket(), RecordingSocket()
+        conns = [
+            await hub.connect(legacy, 2),
+            await hub.connect(grouped, 2, grouped=True),
+            await hub.connect(binary, 2, binary=True),
+        ]
+        await hub.send_to(2, {"type": "messages", "messages": [message(1), message(2)]})
+        while any(not conn.queue.empty() for conn in conns):
+            await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        for socket in (legacy, grouped, binary):
+            await hub.disconnect(socket, 2)
+        return legacy.frames, grouped.frames, binary.frames
+
+    legacy, grouped, binary = asyncio.run(scenario())
+    assert legacy == [message(1), message(2)]
+    assert grouped == [{"type": "messages", "messages": [message(1), message(2)]}]
+    assert [[record["id"] for record in frame] for frame in binary] == [[1], [2]]
+
+# read receipts and badge counts only reach sockets connected with features=receipts
+def test_receipts_only_reach_sockets_that_opt_in():
+    async def scenario():
+        hub = ChatHub(backend=LocalFanout())
+        legacy, receipts = RecordingSocket(), RecordingSocket()
+        conns = [await hub.connect(legacy, 2), await hub.connect(receipts, 2, receipts=True)]
+        await hub.send_to(2, {"type": "read", "reader_id": 1, "up_to": "c", "count": 1})
+        await hub.send_to(2, message(1))
+        while any(not conn.queue.empty() for conn in conns):
+            await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        for socket in (legacy, receipts):
+            await hub.disconnect(socket, 2)
+        return legacy.frames, receipts.frames
+
+    legacy, receipts = asyncio.run(scenario())
+    assert legacy == [message(1)]
+    assert receipts == [{"type": "read", "reader_id": 1, "up_to": "c", "count": 1}, message(1)]
@@ -0,0 +1,51 @@
+from crud.ConversationCrud import get_unread_counts
+from crud.MessageCrud import create_message, mark_read
+from database import async_session
+from schemas.MessageSchema import MessageCreate
+
+async def send(sender_id: int, receiver_id: int, count: int):
+    messages = []
+    for _ in range(count):
+        async with async_session() as db:
+            messages.append(await create_message(db, MessageCreate(receiverID=receiver_id, receiver_encrypted="cg==", sender_encrypted="cw==", messageType="text"), sender_id))
+    return [(message.timestamp, message.id) for message in messages]
+
+async def read(user_id: int, partner_id: int, cursor):
+    async with async_session() as db:
+        return await mark_read(db, user_id, partner_id, cursor)
+
+async def unread(user_id: int):
+    async with async_session() as db:
+        return await get_unread_counts(db, user_id)
+
+def test_counter_follows_the_rows_marked(run, users):
+    alice, bob = users
+
+    async def scenario():
+        cursors = await send(alice, bob, 3)
+        await send(bob, alice, 1)
+        steps = [
+            await read(bob, alice, cursors[1]),
+            # the same cursor again marks nothing and takes nothing off
+            await read(bob, alice, cursors[1]),
+            await read(bob, alice, cursors[2]),
+        ]
+        return steps, await unread(bob), await unread(alice)
+
+    steps, bob_unread, alice_unread = run(scenario())
+    assert steps == [(2, 1), (0, 1), (1, 0)]
+    assert bob_unread == []
+    # reading bob's side leaves alice's counter alone
+    assert alice_unread == [(bob, 1)]
+
+def test_own_messages_never_count(run, users):
+    alice, bob = users
+
+    async def scenario():
+        cursors = await send(alice, bob, 2)
+        return await read(alice, bob, cursors[-1]), await read(alice, alice, cursors[-1]), await unread(bob)
+
+    own, self_chat, bob_unread = run(scenario())
+    assert own == (0, 0)
+    assert self_chat == (0, 0)
+    assert bob_unread == [(alice, 2)]
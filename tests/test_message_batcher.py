@@ -0,0 +1,25 @@
+import asyncio
+
+import pytest
+
+from core.messageBatcher import MessageBatcher
+
+class HangingSession:
+    async def __aenter__(self):
+        await asyncio.sleep(60)
+
+    async def __aexit__(self, *exc):
+        pass
+
+# stop() cancelling a write in progress fails that batch's submitters instead of
+# leaving them waiting
+def test_stop_fails_the_batch_being_written():
+    async def scenario():
+        batcher = MessageBatcher(HangingSession, window=0)
+        submitted = asyncio.create_task(batcher.submit(None, 1))
+        await asyncio.sleep(0.05)
+        await batcher.stop()
+        return await asyncio.wait_for(submitted, timeout=1)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(scenario())
@@ -0,0 +1,31 @@
+import time
+
+from sqlalchemy import func, select
+
+from core.rateLimiter import DatabaseRateLimiter
+from crud.RateLimitCrud import prune_buckets
+from database import async_session
+from models.RateLimit import RateLimit
+
+# only buckets that have refilled to the burst are deleted; the rest keep their debt
+def test_full_buckets_are_pruned(run):
+    async def scenario():
+        limiter = DatabaseRateLimiter(async_session, rate=1, burst=10)
+        await limiter.acquire(1, cost=1)
+        await limiter.acquire(2, cost=10)
+        async with async_session() as db:
+            pruned = await prune_buckets(db, limiter.rate, limiter.burst, time.time() + 2)
+            await db.commit()
+            left = await db.execute(select(RateLimit.key))
+            remaining = sorted(left.scalars().all())
+        # a pruned user starts over with a full bucket
+        allowed = await limiter.acquire(1, cost=10)
+        async with async_session() as db:
+            count = await db.scalar(select(func.count()).select_from(RateLimit))
+        return pruned, remaining, allowed, count
+
+    pruned, remaining, allowed, count = run(scenario())
+    assert pruned == 1
+    assert remaining == ["ws:2"]
+    assert allowed == 0
+    assert count == 2
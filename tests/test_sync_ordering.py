@@ -0,0 +1,65 @@
+import asyncio
+from datetime import datetime, timezone
+
+import orjson
+
+from core.chatHub import ChatHub
+from core.fanoutBackend import LocalFanout
+from core.messageSerializer import live_frame
+from crud.MessageCrud import create_message
+from database import async_session
+from routes.messageRoutes import sync_missed_messages
+from schemas.MessageSchema import MessageCreate
+
+class RecordingSocket:
+    def __init__(self) -> None:
+        self.frames: list[dict] = []
+
+    async def send_text(self, text: str):
+        self.frames.append(orjson.loads(text))
+
+    async def send_bytes(self, data: bytes):
+        raise AssertionError("JSON socket got a binary frame")
+
+async def send(sender_id: int, receiver_id: int, text: str):
+    async with async_session() as db:
+        return await create_message(db, MessageCreate(receiverID=receiver_id, receiver_encrypted=text, sender_encrypted=text, messageType="text"), sender_id)
+
+# a message that commits while the reconnect is syncing reaches the socket twice: in
+# the sync batch and as a live frame queued behind it; the shared id lets the client
+# drop the second copy, and nothing live may overtake the backlog
+def test_live_frames_wait_for_sync_and_carry_ids(run, users):
+    alice, bob = users
+
+    async def scenario():
+        hub = ChatHub(backend=LocalFanout())
+        socket = RecordingSocket()
+        since = (datetime(2000, 1, 1, tzinfo=timezone.utc), 0)
+        missed = await send(alice, bob, "b2xk")
+        conn = await hub.connect(socket, bob, paused=True)
+        during = await send(alice, bob, "ZHVyaW5n")
+        await hub.send_to(bob, live_frame(during, during.receiver_encrypted, None))
+
+        await sync_missed_messages(socket, bob, since)
+        await hub.resume(socket, bob)
+        after = await send(alice, bob, "YWZ0ZXI=")
+        await hub.send_to(bob, live_frame(after, after.receiver_encrypted, None))
+        while not conn.queue.empty():
+            await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        await hub.disconnect(socket, bob)
+        return socket.frames, (missed.id, during.id, after.id)
+
+    frames, (missed_id, during_id, after_id) = run(scenario())
+    assert [frame.get("type") for frame in frames] == ["sync", "sync_done", None, None]
+    assert [message["id"] for message in frames[0]["messages"]] == [missed_id, during_id]
+    assert [frame["id"] for frame in frames[2:]] == [during_id, after_id]
+    assert frames[0]["messages"][1] == frames[2]
+
+    seen, delivered = set(), []
+    for frame in frames:
+        for message in frame.get("messages", [frame] if "id" in frame else []):
+            if message["id"] not in seen:
+                seen.add(message["id"])
+                delivered.append(message["content"])
+    assert delivered == ["b2xk", "ZHVyaW5n", "YWZ0ZXI="]